@@ -33,6 +33,17 @@ app.use((req: Request, _res: Response, next: NextFunction) => {
     next();
 });
 
+const GESTOR_ALGORITMOS_URL = process.env.GESTOR_ALGORITMOS_URL || 'http://localhost:3014';
+
+// Avisa a GestorAlgoritmos de que la tabla Preguntas ha cambiado para que recargue su catálogo.
+const invalidarCatalogoAlgoritmos = async () => {
+    try {
+        await fetch(`${GESTOR_ALGORITMOS_URL}/catalogo/invalidar`, { method: 'POST' });
+    } catch (error) {
+        console.error('No se pudo invalidar el catálogo de GestorAlgoritmos:', error);
+    }
+};
+
 // Función para actualizar el archivo categorias.txt
 const actualizarArchivoCategorias = async (pool: Pool) => {
     try {
@@ -315,6 +326,10 @@ const eliminarCategoriaHandler: express.RequestHandler = async (req, res) => {
         await connection.commit();
         connection.release();
 
+        if (preguntasEliminadas > 0) {
+            await invalidarCatalogoAlgoritmos();
+        }
+
         // Eliminar la carpeta asociada a la categoría.
         const carpetaEliminada = eliminarCarpetaCategoria(categoriaParaEliminar.nombreCategoria);
         
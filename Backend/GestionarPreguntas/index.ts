@@ -4,6 +4,7 @@ import mysql, { Pool } from 'mysql2/promise';
 import cors from 'cors';
 import multer from 'multer';
 import fs from 'fs';
+import crypto from 'crypto';
 import path from 'path';
 
 const app = express();
@@ -18,7 +19,47 @@ app.use((req, res, next) => {
 });
 app.use(express.json());
 
-app.use('/audio', express.static(path.join(process.cwd(), 'Audios')));
+const directorioAudios = path.join(process.cwd(), 'Audios');
+
+// Hash SHA-256 de cada audio, recalculado solo si cambia su tamaño o fecha de modificación
+const hashesAudios = new Map<string, { tamano: number; modificado: number; hash: string }>();
+
+const hashAudio = async (rutaCompleta: string): Promise<string> => {
+    const estado = await fs.promises.stat(rutaCompleta);
+    const guardado = hashesAudios.get(rutaCompleta);
+    if (guardado && guardado.tamano === estado.size && guardado.modificado === estado.mtimeMs) {
+        return guardado.hash;
+    }
+    const hash = await new Promise<string>((resolve, reject) => {
+        const sha = crypto.createHash('sha256');
+        fs.createReadStream(rutaCompleta)
+            .on('data', bloque => sha.update(bloque))
+            .on('end', () => resolve(sha.digest('hex')))
+            .on('error', reject);
+    });
+    hashesAudios.set(rutaCompleta, { tamano: estado.size, modificado: estado.mtimeMs, hash });
+    return hash;
+};
+
+// Las URLs versionadas por contenido (?v=<inicio del hash>, las genera GestorAlgoritmos) no cambian nunca de
+// contenido, pero solo se marcan como immutable si la versión coincide con el fichero actual: una versión
+// antigua o inventada dejaría en caché durante un año un contenido que no le corresponde
+app.use('/audio', async (req, res, next) => {
+    const version = req.query.v;
+    if (typeof version === 'string' && version) {
+        try {
+            const rutaCompleta = path.resolve(directorioAudios, '.' + decodeURIComponent(req.path));
+            if (rutaCompleta.startsWith(directorioAudios + path.sep)
+                && (await hashAudio(rutaCompleta)).slice(0, 16) === version) {
+                res.setHeader('Cache-Control', 'public, max-age=31536000, immutable');
+            }
+        } catch (error) {
+            // Fichero inexistente o ruta mal formada: express.static responde como sin versión
+        }
+    }
+    next();
+});
+app.use('/audio', express.static(directorioAudios));
 
 const pool = mysql.createPool({
     host: process.env.DB_HOST || 'localhost',
@@ -36,6 +77,17 @@ app.use((req: Request, _res: Response, next: NextFunction) => {
     next();
 });
 
+const GESTOR_ALGORITMOS_URL = process.env.GESTOR_ALGORITMOS_URL || 'http://localhost:3014';
+
+// Avisa a GestorAlgoritmos de que la tabla Preguntas ha cambiado para que recargue su catálogo.
+const invalidarCatalogoAlgoritmos = async () => {
+    try {
+        await fetch(`${GESTOR_ALGORITMOS_URL}/catalogo/invalidar`, { method: 'POST' });
+    } catch (error) {
+        console.error('No se pudo invalidar el catálogo de GestorAlgoritmos:', error);
+    }
+};
+
 const storage = multer.memoryStorage();
 const upload = multer({
     storage: storage,
@@ -194,6 +246,7 @@ const crearPreguntaHandler: express.RequestHandler = async (req, res) => {
         );
 
         await actualizarArchivoRutasAudios(rutaRelativa);
+        await invalidarCatalogoAlgoritmos();
 
         res.status(201).json({
             mensaje: 'Pregunta creada correctamente',
@@ -335,6 +388,7 @@ const eliminarPreguntaHandler: express.RequestHandler = async (req, res) => {
 
         await connection.commit();
         connection.release();
+        await invalidarCatalogoAlgoritmos();
 
         let archivoEliminado = false;
         
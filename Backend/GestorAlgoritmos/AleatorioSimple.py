@@ -1,36 +1,22 @@
 import random
 import mysql.connector
-import os
+from CatalogoPreguntas import obtener_catalogo
+from GeneradorDistractores import obtener_generador_distractores
 
 class AleatorioSimple:
+    slug = 'aleatorio-simple'
+    criterio = 1
+    resumen = 'Algoritmo aleatorio simple'
+
     def __init__(self):
         self.nombre = "AleatorioSimple"
         self.descripcion = "Elige aleatoriamente las preguntas sin tomar en cuenta datos de otros usuarios o datos personales."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
-    
-    def get_db_connection(self):
-
-        return mysql.connector.connect(**self.db_config)
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
     
     def ejecutar(self, data):
         try:
-
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-
-            query = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas"
-            cursor.execute(query)
-            todas_las_preguntas = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
+            todas_las_preguntas = self.catalogo.obtener().preguntas
             
             if not todas_las_preguntas:
                 return {
@@ -48,24 +34,13 @@ class AleatorioSimple:
             for i in range(10):
                 pregunta_principal = random.choice(todas_las_preguntas)
                 
-                respuestas_incorrectas = set()
-                otras_preguntas = [p for p in todas_las_preguntas if p['idPregunta'] != pregunta_principal['idPregunta']]
-                
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas.remove(pregunta_incorrecta)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias']
                 }
                 
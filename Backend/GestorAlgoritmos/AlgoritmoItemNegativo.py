@@ -1,282 +1,212 @@
-import random
 import mysql.connector
-import os
-from collections import defaultdict
-import math
+from PoolConexiones import obtener_conexion, ejecutar_consultas
+from CatalogoPreguntas import obtener_catalogo
+from GeneradorDistractores import obtener_generador_distractores
+from SimilitudItems import obtener_indice_similitud_items, similitudes_coocurrencia
+from EstadisticasRespuestas import obtener_estadisticas
+from CacheRankings import obtener_cache_rankings, muestrear_ranking
+from ResumenesUsuario import obtener_resumenes
+from BitmapsRespondidas import obtener_bitmaps_respondidas
+from PartesQuiz import recoger_partes
 
 class AlgoritmoItemNegativo:
+    slug = 'item-negativo'
+    criterio = 11
+    resumen = 'Te recomienda preguntas basándose en la similitud entre preguntas que otros usuarios han acertado juntas'
+
     def __init__(self):
         self.nombre = "AlgoritmoItemNegativo"
         self.descripcion = "Te recomienda preguntas basándose en la similitud entre preguntas que otros usuarios han acertado juntas."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
+        self.indice_similitud = obtener_indice_similitud_items()
+        self.estadisticas = obtener_estadisticas()
+        self.rankings = obtener_cache_rankings()
+        self.resumenes = obtener_resumenes()
+        self.respondidas = obtener_bitmaps_respondidas()
+        self._precargadas = {}
     
     def get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return obtener_conexion()
     
-    def obtener_preguntas_acertadas_usuario(self, usuario_id):
-        """Obtiene las preguntas que el usuario ha acertado"""
-        try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            query = """
-                SELECT DISTINCT Preguntas_idPregunta
+    def consultas_precarga(self, usuarios_ids):
+        """Consulta de las preguntas acertadas de varios usuarios (/algoritmos/batch y ServidorAsync); las respondidas
+        salen del bitmap en memoria"""
+        marcadores = ','.join(['%s'] * len(usuarios_ids))
+        if self.resumenes.disponible():
+            # Una fila por usuario y pregunta, incluidas las respuestas ya archivadas
+            query_acertadas = """
+                SELECT Usuarios_idUsuario, Preguntas_idPregunta
+                FROM ResumenUsuarioPregunta
+                WHERE Usuarios_idUsuario IN ({})
+                AND aciertos > 0
+            """.format(marcadores)
+        else:
+            query_acertadas = """
+                SELECT DISTINCT Usuarios_idUsuario, Preguntas_idPregunta
                 FROM Usuarios_has_Preguntas 
-                WHERE Usuarios_idUsuario = %s 
+                WHERE Usuarios_idUsuario IN ({})
                 AND respuestaCorrecta = 1
-            """
-            cursor.execute(query, (usuario_id,))
-            preguntas_acertadas = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            return [p['Preguntas_idPregunta'] for p in preguntas_acertadas]
-            
-        except mysql.connector.Error as db_error:
-            raise Exception(f'Error de base de datos al obtener preguntas acertadas: {str(db_error)}')
+            """.format(marcadores)
+        return {'acertadas': (query_acertadas, list(usuarios_ids))}
+    
+    def agrupar_precarga(self, resultados, usuarios_ids):
+        """Reparte por usuario las preguntas acertadas obtenidas por consultas_precarga"""
+        # Las filas traen el id como entero aunque se haya pedido como texto
+        claves = {str(usuario_id): usuario_id for usuario_id in usuarios_ids}
+        precargadas = {usuario_id: [] for usuario_id in usuarios_ids}
+        for fila in resultados['acertadas']:
+            precargadas[claves[str(fila['Usuarios_idUsuario'])]].append(fila['Preguntas_idPregunta'])
+        return precargadas
+    
+    def guardar_precarga(self, resultados, usuarios_ids):
+        """Guarda lo obtenido por consultas_precarga para que las siguientes ejecuciones no consulten la base de datos"""
+        self._precargadas = self.agrupar_precarga(resultados, usuarios_ids)
     
-    def calcular_similitud_items(self, pregunta1_id, pregunta2_id):
-        """Calcula la similitud entre dos preguntas basada en patrones de aciertos de usuarios"""
+    def precargar(self, usuarios_ids):
+        """Obtiene de una vez las preguntas acertadas de varios usuarios y carga sus bitmaps de respondidas"""
         try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Obtener usuarios que han respondido ambas preguntas
-            query_usuarios_comunes = """
-                SELECT DISTINCT uhp1.Usuarios_idUsuario
-                FROM Usuarios_has_Preguntas uhp1
-                INNER JOIN Usuarios_has_Preguntas uhp2 ON uhp1.Usuarios_idUsuario = uhp2.Usuarios_idUsuario
-                WHERE uhp1.Preguntas_idPregunta = %s 
-                AND uhp2.Preguntas_idPregunta = %s
-            """
-            cursor.execute(query_usuarios_comunes, (pregunta1_id, pregunta2_id))
-            usuarios_comunes = cursor.fetchall()
-            
-            if len(usuarios_comunes) < 3:  # Necesitamos al menos 3 usuarios comunes
-                cursor.close()
-                connection.close()
-                return 0
-            
-            # Obtener patrones de respuesta para ambas preguntas
-            usuarios_ids = [u['Usuarios_idUsuario'] for u in usuarios_comunes]
-            placeholders = ','.join(['%s'] * len(usuarios_ids))
-            
-            query_respuestas = """
-                SELECT Usuarios_idUsuario, Preguntas_idPregunta, respuestaCorrecta
-                FROM Usuarios_has_Preguntas 
-                WHERE Usuarios_idUsuario IN ({})
-                AND Preguntas_idPregunta IN (%s, %s)
-                ORDER BY Usuarios_idUsuario, Preguntas_idPregunta
-            """.format(placeholders)
-            
-            params = usuarios_ids + [pregunta1_id, pregunta2_id]
-            cursor.execute(query_respuestas, params)
-            respuestas = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            # Organizar respuestas por usuario
-            respuestas_por_usuario = defaultdict(dict)
-            for respuesta in respuestas:
-                usuario_id = respuesta['Usuarios_idUsuario']
-                pregunta_id = respuesta['Preguntas_idPregunta']
-                es_correcta = respuesta['respuestaCorrecta']
-                respuestas_por_usuario[usuario_id][pregunta_id] = es_correcta
-            
-            # Calcular similitud usando correlación de Pearson enfocada en aciertos
-            return self.calcular_correlacion_aciertos(respuestas_por_usuario, pregunta1_id, pregunta2_id)
-            
+            self.guardar_precarga(ejecutar_consultas(self.consultas_precarga(usuarios_ids)), usuarios_ids)
         except mysql.connector.Error as db_error:
-            raise Exception(f'Error de base de datos al calcular similitud: {str(db_error)}')
+            raise Exception(f'Error de base de datos al precargar preguntas acertadas: {str(db_error)}')
+        self.respondidas.obtener_varios(usuarios_ids)
     
-    def calcular_correlacion_aciertos(self, respuestas_por_usuario, pregunta1_id, pregunta2_id):
-        """Calcula correlación basada en patrones de aciertos"""
-        aciertos_pregunta1 = []
-        aciertos_pregunta2 = []
-        
-        for usuario_id, respuestas in respuestas_por_usuario.items():
-            if pregunta1_id in respuestas and pregunta2_id in respuestas:
-                # Usar valores directos para enfocarse en aciertos (1 = acierto, 0 = fallo)
-                acierto1 = respuestas[pregunta1_id]
-                acierto2 = respuestas[pregunta2_id]
-                aciertos_pregunta1.append(acierto1)
-                aciertos_pregunta2.append(acierto2)
-        
-        if len(aciertos_pregunta1) < 3:
-            return 0
-        
-        # Calcular correlación de Pearson
-        media1 = sum(aciertos_pregunta1) / len(aciertos_pregunta1)
-        media2 = sum(aciertos_pregunta2) / len(aciertos_pregunta2)
-        
-        numerador = 0
-        suma_cuadrados1 = 0
-        suma_cuadrados2 = 0
-        
-        for i in range(len(aciertos_pregunta1)):
-            diff1 = aciertos_pregunta1[i] - media1
-            diff2 = aciertos_pregunta2[i] - media2
-            
-            numerador += diff1 * diff2
-            suma_cuadrados1 += diff1 ** 2
-            suma_cuadrados2 += diff2 ** 2
-        
-        denominador = math.sqrt(suma_cuadrados1 * suma_cuadrados2)
-        
-        if denominador == 0:
-            return 0
-        
-        correlacion = numerador / denominador
-        return max(0, correlacion)  # Solo correlaciones positivas
+    def datos_usuario(self, usuario_id):
+        """Preguntas acertadas y respondidas del usuario. Las acertadas precargadas o, si no, consultadas sin guardarlas,
+        porque la instancia es compartida entre peticiones; las respondidas salen del bitmap en memoria"""
+        if usuario_id in self._precargadas:
+            preguntas_acertadas = self._precargadas[usuario_id]
+        else:
+            try:
+                resultados = ejecutar_consultas(self.consultas_precarga([usuario_id]))
+            except mysql.connector.Error as db_error:
+                raise Exception(f'Error de base de datos al obtener preguntas acertadas: {str(db_error)}')
+            preguntas_acertadas = self.agrupar_precarga(resultados, [usuario_id])[usuario_id]
+        return preguntas_acertadas, self.respondidas.obtener(usuario_id)
     
-    def encontrar_preguntas_similares(self, preguntas_acertadas, usuario_id, limite_similares=50):
+    def obtener_preguntas_acertadas_usuario(self, usuario_id):
+        """Obtiene las preguntas que el usuario ha acertado"""
+        return self.datos_usuario(usuario_id)[0]
+    
+    def obtener_preguntas_respondidas(self, usuario_id):
+        """Preguntas que el usuario ya ha respondido"""
+        return self.datos_usuario(usuario_id)[1]
+    
+    def precalentar(self):
+        """Carga el índice de similitud entre preguntas antes de la primera petición"""
+        self.indice_similitud.disponible()
+    
+    def encontrar_preguntas_similares(self, preguntas_acertadas, usuario_id, limite_similares=50, preguntas_respondidas=None):
         """Encuentra preguntas similares a las que el usuario ha acertado"""
         try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
             # Obtener preguntas que el usuario ya ha respondido
-            query_respondidas = """
-                SELECT DISTINCT Preguntas_idPregunta
-                FROM Usuarios_has_Preguntas 
-                WHERE Usuarios_idUsuario = %s
-            """
-            cursor.execute(query_respondidas, (usuario_id,))
-            preguntas_respondidas = {r['Preguntas_idPregunta'] for r in cursor.fetchall()}
-            
-            # Obtener todas las preguntas disponibles
-            query_todas = """
-                SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias
-                FROM Preguntas 
-                WHERE idPregunta NOT IN ({})
-            """.format(','.join(['%s'] * len(preguntas_respondidas)) if preguntas_respondidas else '%s')
-            
-            params = list(preguntas_respondidas) if preguntas_respondidas else [-1]
-            cursor.execute(query_todas, params)
-            preguntas_candidatas = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
-            
-            if not preguntas_candidatas:
-                return []
-            
-            # Calcular similitudes
-            similitudes_preguntas = []
-            
-            for pregunta_candidata in preguntas_candidatas:
-                pregunta_candidata_id = pregunta_candidata['idPregunta']
-                similitud_maxima = 0
-                
-                # Calcular similitud máxima con cualquiera de las preguntas acertadas
-                for pregunta_acertada_id in preguntas_acertadas:
-                    similitud = self.calcular_similitud_items(pregunta_acertada_id, pregunta_candidata_id)
-                    similitud_maxima = max(similitud_maxima, similitud)
-                
-                if similitud_maxima > 0.1:  # Umbral mínimo de similitud
-                    similitudes_preguntas.append({
-                        'pregunta': pregunta_candidata,
-                        'similitud': similitud_maxima
-                    })
-            
-            # Ordenar por similitud descendente
+            if preguntas_respondidas is None:
+                preguntas_respondidas = self.obtener_preguntas_respondidas(usuario_id)
+            
+            # Los contadores de co-ocurrencia en memoria dan la similitud exacta y al día; si no
+            # están disponibles basta con fusionar las listas de vecinos del índice precalculado,
+            # mientras no sea demasiado antiguo
+            similitudes = self.estadisticas.preguntas_similares(preguntas_acertadas, preguntas_respondidas)
+            if similitudes is None and self.indice_similitud.vigente():
+                similitudes = self.indice_similitud.preguntas_similares(preguntas_acertadas, preguntas_respondidas)
+            
+            if similitudes is None:
+                # Sin contadores ni índice al día: recuentos conjuntos de todos los pares en una sola consulta
+                similitudes = similitudes_coocurrencia(preguntas_acertadas, preguntas_respondidas)
+            
+            preguntas_por_id = self.catalogo.obtener().por_id
+            similitudes_preguntas = [
+                {'pregunta': preguntas_por_id[pregunta_id], 'similitud': similitud}
+                for pregunta_id, similitud in similitudes.items()
+                if similitud > 0.1 and pregunta_id in preguntas_por_id
+            ]
             similitudes_preguntas.sort(key=lambda x: x['similitud'], reverse=True)
-            
             return similitudes_preguntas[:limite_similares]
             
         except mysql.connector.Error as db_error:
             raise Exception(f'Error de base de datos al encontrar preguntas similares: {str(db_error)}')
     
+    def calcular_ranking(self, usuario_id):
+        """Número de preguntas acertadas y preguntas similares ordenadas; es lo que se guarda en la caché de rankings"""
+        preguntas_acertadas, preguntas_respondidas = self.datos_usuario(usuario_id)
+        if len(preguntas_acertadas) < 2:
+            return len(preguntas_acertadas), []
+        return len(preguntas_acertadas), self.encontrar_preguntas_similares(
+            preguntas_acertadas, usuario_id, preguntas_respondidas=preguntas_respondidas)
+    
     def ejecutar(self, data):
+        return recoger_partes(self.ejecutar_por_partes(data))
+    
+    def ejecutar_por_partes(self, data):
+        """Genera cada pregunta en cuanto está lista y al final el resumen (respuestas NDJSON)"""
         try:
             if not data or 'usuario_id' not in data:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'Se debe proporcionar usuario_id en los datos de entrada'
                 }
+                return
             
             usuario_id = data['usuario_id']
             
-            # Obtener preguntas que el usuario ha acertado
-            preguntas_acertadas = self.obtener_preguntas_acertadas_usuario(usuario_id)
+            # Preguntas similares a las que el usuario ha acertado, desde la caché si el ranking sigue vigente
+            total_acertadas, preguntas_similares = self.rankings.obtener(
+                self.slug, usuario_id, lambda: self.calcular_ranking(usuario_id))
             
-            if len(preguntas_acertadas) < 2:
-                return {
+            if total_acertadas < 2:
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'El usuario debe haber acertado al menos 2 preguntas para usar este algoritmo'
                 }
+                return
             
-            # Encontrar preguntas similares a las acertadas
-            preguntas_similares = self.encontrar_preguntas_similares(preguntas_acertadas, usuario_id)
+            # Un ranking servido desde la caché puede incluir preguntas respondidas después de calcularlo
+            respondidas = self.estadisticas.respuestas_usuario(usuario_id)
+            preguntas_similares = [p for p in preguntas_similares if p['pregunta']['idPregunta'] not in respondidas]
             
             if not preguntas_similares:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'No se encontraron preguntas similares a las que has acertado'
                 }
+                return
             
             # Obtener todas las preguntas para generar opciones incorrectas
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            query_todas = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas"
-            cursor.execute(query_todas)
-            todas_las_preguntas = cursor.fetchall()
-            cursor.close()
-            connection.close()
+            todas_las_preguntas = self.catalogo.obtener().preguntas
             
             if len(todas_las_preguntas) < 4:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'Se necesitan al menos 4 preguntas en la base de datos para generar opciones'
                 }
+                return
             
-            # Seleccionar las 10 mejores preguntas recomendadas
+            # Seleccionar 10 preguntas entre las mejores recomendadas
             preguntas_seleccionadas = []
-            num_preguntas = min(10, len(preguntas_similares))
             
-            for i in range(num_preguntas):
-                item_similar = preguntas_similares[i]
+            for item_similar in muestrear_ranking(preguntas_similares):
                 pregunta_principal = item_similar['pregunta']
                 similitud = item_similar['similitud']
                 
                 # Generar respuestas incorrectas
-                respuestas_incorrectas = set()
-                otras_preguntas = [p for p in todas_las_preguntas if p['idPregunta'] != pregunta_principal['idPregunta']]
-                
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas.remove(pregunta_incorrecta)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias'],
                     'similitud_maxima': round(similitud, 3),
-                    'preguntas_acertadas_base': len(preguntas_acertadas)
+                    'preguntas_acertadas_base': total_acertadas
                 }
                 
                 preguntas_seleccionadas.append(pregunta_formateada)
+                yield 'pregunta', pregunta_formateada
             
             resultado = {
-                'preguntas': preguntas_seleccionadas,
                 'total_preguntas': len(preguntas_seleccionadas),
-                'preguntas_acertadas_usuario': len(preguntas_acertadas),
+                'preguntas_acertadas_usuario': total_acertadas,
                 'preguntas_similares_encontradas': len(preguntas_similares),
                 'usuario_id': usuario_id,
                 'estado': 'completado',
@@ -286,15 +216,15 @@ class AlgoritmoItemNegativo:
             if data:
                 resultado['datos_entrada'] = data
             
-            return resultado
+            yield 'resumen', resultado
         
         except mysql.connector.Error as db_error:
-            return {
+            yield 'resumen', {
                 'estado': 'error',
                 'mensaje': f'Error de base de datos: {str(db_error)}'
             }
         except Exception as e:
-            return {
+            yield 'resumen', {
                 'estado': 'error',
                 'mensaje': f'Error en el algoritmo: {str(e)}'
             }
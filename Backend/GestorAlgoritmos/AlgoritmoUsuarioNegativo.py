@@ -1,133 +1,66 @@
-import random
 import mysql.connector
-import os
-from collections import defaultdict
-import math
+from PoolConexiones import obtener_conexion
+from CatalogoPreguntas import obtener_catalogo
+from GeneradorDistractores import obtener_generador_distractores
+from EstadisticasRespuestas import obtener_estadisticas
+from SimilitudUsuarios import obtener_motor_similitud_usuarios
+from CacheRankings import obtener_cache_rankings, muestrear_ranking
+from ResumenesUsuario import obtener_resumenes
+from BitmapsRespondidas import obtener_bitmaps_respondidas
+from PartesQuiz import recoger_partes
 
 class AlgoritmoUsuarioNegativo:
+    slug = 'usuario-negativo'
+    criterio = 9
+    resumen = 'Te pone preguntas que otros usuarios similares a ti han acertado'
+
     def __init__(self):
         self.nombre = "AlgoritmoUsuarioNegativo"
         self.descripcion = "Te pone preguntas que otros usuarios similares a ti han acertado."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
+        self.estadisticas = obtener_estadisticas()
+        self.motor_similitud = obtener_motor_similitud_usuarios()
+        self.rankings = obtener_cache_rankings()
+        self.resumenes = obtener_resumenes()
+        self.respondidas = obtener_bitmaps_respondidas()
     
     def get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return obtener_conexion()
+    
+    def precargar(self, usuarios_ids):
+        """Carga con una sola consulta los bitmaps de preguntas respondidas de varios usuarios (/algoritmos/batch)"""
+        self.respondidas.obtener_varios(usuarios_ids)
+    
+    def obtener_preguntas_respondidas(self, usuario_id):
+        """Preguntas que el usuario ya ha respondido, desde su bitmap en memoria"""
+        return self.respondidas.obtener(usuario_id)
+    
+    def precalentar(self):
+        """Construye el índice de usuarios similares antes de la primera petición"""
+        self.motor_similitud.preparar()
     
     def obtener_usuarios_similares(self, usuario_id, limite_usuarios=10):
         """Encuentra usuarios similares basado en patrones de respuesta"""
         try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Obtener todas las respuestas del usuario objetivo
-            query_usuario_actual = """
-                SELECT Preguntas_idPregunta, respuestaCorrecta
-                FROM Usuarios_has_Preguntas 
-                WHERE Usuarios_idUsuario = %s
-            """
-            cursor.execute(query_usuario_actual, (usuario_id,))
-            respuestas_usuario_actual = cursor.fetchall()
+            # Respuestas del usuario objetivo por pregunta: (intentos, fallos, última respuesta)
+            respuestas_usuario_actual = self.estadisticas.respuestas_usuario(usuario_id)
             
-            if len(respuestas_usuario_actual) < 5:
-                cursor.close()
-                connection.close()
+            if sum(intentos for intentos, _, _ in respuestas_usuario_actual.values()) < 5:
                 return []
             
-            # Crear diccionario de respuestas del usuario actual
-            respuestas_actual = {r['Preguntas_idPregunta']: r['respuestaCorrecta'] for r in respuestas_usuario_actual}
-            preguntas_comunes = set(respuestas_actual.keys())
-            
-            # Obtener todos los otros usuarios con sus respuestas
-            query_otros_usuarios = """
-                SELECT DISTINCT Usuarios_idUsuario
-                FROM Usuarios_has_Preguntas 
-                WHERE Usuarios_idUsuario != %s
-                AND Preguntas_idPregunta IN ({})
-                GROUP BY Usuarios_idUsuario
-                HAVING COUNT(*) >= 5
-            """.format(','.join(['%s'] * len(preguntas_comunes)))
+            # Crear diccionario con la última respuesta del usuario actual a cada pregunta
+            respuestas_actual = {p: ultima for p, (_, _, ultima) in respuestas_usuario_actual.items()}
             
-            params = [usuario_id] + list(preguntas_comunes)
-            cursor.execute(query_otros_usuarios, params)
-            otros_usuarios = cursor.fetchall()
-            
-            similaridades = []
-            
-            for otro_usuario in otros_usuarios:
-                otro_id = otro_usuario['Usuarios_idUsuario']
-                
-                # Obtener respuestas del otro usuario
-                query_respuestas_otro = """
-                    SELECT Preguntas_idPregunta, respuestaCorrecta
-                    FROM Usuarios_has_Preguntas 
-                    WHERE Usuarios_idUsuario = %s
-                    AND Preguntas_idPregunta IN ({})
-                """.format(','.join(['%s'] * len(preguntas_comunes)))
-                
-                params_otro = [otro_id] + list(preguntas_comunes)
-                cursor.execute(query_respuestas_otro, params_otro)
-                respuestas_otro = cursor.fetchall()
-                
-                respuestas_otro_dict = {r['Preguntas_idPregunta']: r['respuestaCorrecta'] for r in respuestas_otro}
-                
-                # Calcular similitud usando coeficiente de correlación de Pearson
-                similitud = self.calcular_similitud_pearson(respuestas_actual, respuestas_otro_dict)
-                
-                if similitud > 0:  # Solo usuarios con similitud positiva
-                    similaridades.append((otro_id, similitud))
-            
-            # Ordenar por similitud descendente y tomar los más similares
-            similaridades.sort(key=lambda x: x[1], reverse=True)
-            usuarios_similares = [user_id for user_id, _ in similaridades[:limite_usuarios]]
-            
-            cursor.close()
-            connection.close()
+            # Correlación de Pearson contra todos los usuarios en una sola pasada sobre la matriz de respuestas
+            similaridades = self.motor_similitud.usuarios_similares(usuario_id, respuestas_actual, limite_usuarios)
+            usuarios_similares = [user_id for user_id, _ in similaridades]
             
             return usuarios_similares
             
         except mysql.connector.Error as db_error:
             raise Exception(f'Error de base de datos al obtener usuarios similares: {str(db_error)}')
     
-    def calcular_similitud_pearson(self, respuestas1, respuestas2):
-        """Calcula la correlación de Pearson entre dos conjuntos de respuestas"""
-        preguntas_comunes = set(respuestas1.keys()) & set(respuestas2.keys())
-        
-        if len(preguntas_comunes) < 3:
-            return 0
-        
-        # Calcular medias
-        suma1 = sum([respuestas1[p] for p in preguntas_comunes])
-        suma2 = sum([respuestas2[p] for p in preguntas_comunes])
-        
-        media1 = suma1 / len(preguntas_comunes)
-        media2 = suma2 / len(preguntas_comunes)
-        
-        # Calcular correlación
-        numerador = 0
-        suma_cuadrados1 = 0
-        suma_cuadrados2 = 0
-        
-        for pregunta in preguntas_comunes:
-            diff1 = respuestas1[pregunta] - media1
-            diff2 = respuestas2[pregunta] - media2
-            
-            numerador += diff1 * diff2
-            suma_cuadrados1 += diff1 ** 2
-            suma_cuadrados2 += diff2 ** 2
-        
-        denominador = math.sqrt(suma_cuadrados1 * suma_cuadrados2)
-        
-        if denominador == 0:
-            return 0
-        
-        return numerador / denominador
-    
     def obtener_preguntas_acertadas_usuarios_similares(self, usuarios_similares, usuario_id):
         """Obtiene preguntas que usuarios similares han acertado frecuentemente"""
         try:
@@ -140,13 +73,13 @@ class AlgoritmoUsuarioNegativo:
                 return []
             
             # Obtener preguntas que el usuario actual ya ha respondido
-            query_respondidas = """
-                SELECT DISTINCT Preguntas_idPregunta
-                FROM Usuarios_has_Preguntas 
-                WHERE Usuarios_idUsuario = %s
-            """
-            cursor.execute(query_respondidas, (usuario_id,))
-            preguntas_respondidas = {r['Preguntas_idPregunta'] for r in cursor.fetchall()}
+            preguntas_respondidas = self.obtener_preguntas_respondidas(usuario_id)
+            
+            # Los resúmenes ya traen intentos y aciertos por usuario y pregunta, archivadas incluidas
+            if self.resumenes.disponible():
+                origen, intentos, aciertos = 'ResumenUsuarioPregunta', 'SUM(uhp.intentos)', 'SUM(uhp.aciertos)'
+            else:
+                origen, intentos, aciertos = 'Usuarios_has_Preguntas', 'COUNT(*)', 'SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END)'
             
             # Obtener preguntas acertadas por usuarios similares
             query_acertadas = """
@@ -156,25 +89,26 @@ class AlgoritmoUsuarioNegativo:
                     p.urlAudio,
                     p.respuestaCorrecta,
                     p.Categorias_idCategorias,
-                    COUNT(*) as total_intentos,
-                    SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END) as total_aciertos,
-                    (SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END) / COUNT(*)) as tasa_acierto
-                FROM Usuarios_has_Preguntas uhp
+                    {intentos} as total_intentos,
+                    {aciertos} as total_aciertos,
+                    ({aciertos} / {intentos}) as tasa_acierto
+                FROM {origen} uhp
                 INNER JOIN Preguntas p ON uhp.Preguntas_idPregunta = p.idPregunta
                 WHERE uhp.Usuarios_idUsuario IN ({})
-                AND uhp.Preguntas_idPregunta NOT IN ({})
                 GROUP BY uhp.Preguntas_idPregunta, p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias
                 HAVING total_intentos >= 2 AND tasa_acierto >= 0.6
                 ORDER BY tasa_acierto DESC, total_aciertos DESC
-                LIMIT 50
+                LIMIT %s
             """.format(
                 ','.join(['%s'] * len(usuarios_similares)),
-                ','.join(['%s'] * len(preguntas_respondidas)) if preguntas_respondidas else '%s'
+                origen=origen, intentos=intentos, aciertos=aciertos
             )
             
-            params = usuarios_similares + (list(preguntas_respondidas) if preguntas_respondidas else [-1])
-            cursor.execute(query_acertadas, params)
-            preguntas_acertadas = cursor.fetchall()
+            # Las respondidas se descartan aquí en lugar de enviarlas en un NOT IN (...); el LIMIT deja sitio
+            # para ellas, así que siguen quedando hasta 50 candidatas
+            cursor.execute(query_acertadas, usuarios_similares + [50 + len(preguntas_respondidas)])
+            preguntas_acertadas = [fila for fila in cursor.fetchall()
+                                   if fila['idPregunta'] not in preguntas_respondidas][:50]
             
             cursor.close()
             connection.close()
@@ -184,84 +118,81 @@ class AlgoritmoUsuarioNegativo:
         except mysql.connector.Error as db_error:
             raise Exception(f'Error de base de datos al obtener preguntas acertadas: {str(db_error)}')
     
+    def calcular_ranking(self, usuario_id):
+        """Usuarios similares y preguntas candidatas ordenadas; es lo que se guarda en la caché de rankings"""
+        usuarios_similares = self.obtener_usuarios_similares(usuario_id)
+        if not usuarios_similares:
+            return [], []
+        return usuarios_similares, self.obtener_preguntas_acertadas_usuarios_similares(usuarios_similares, usuario_id)
+    
     def ejecutar(self, data):
+        return recoger_partes(self.ejecutar_por_partes(data))
+    
+    def ejecutar_por_partes(self, data):
+        """Genera cada pregunta en cuanto está lista y al final el resumen (respuestas NDJSON)"""
         try:
             if not data or 'usuario_id' not in data:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'Se debe proporcionar usuario_id en los datos de entrada'
                 }
+                return
             
             usuario_id = data['usuario_id']
             
-            # Encontrar usuarios similares
-            usuarios_similares = self.obtener_usuarios_similares(usuario_id)
+            # Usuarios similares y preguntas que han acertado, desde la caché si el ranking sigue vigente
+            usuarios_similares, preguntas_candidatas = self.rankings.obtener(
+                self.slug, usuario_id, lambda: self.calcular_ranking(usuario_id))
             
             if not usuarios_similares:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'No se encontraron usuarios similares. El usuario debe haber respondido al menos 5 preguntas.'
                 }
+                return
             
-            # Obtener preguntas que usuarios similares han acertado
-            preguntas_candidatas = self.obtener_preguntas_acertadas_usuarios_similares(usuarios_similares, usuario_id)
+            # Un ranking servido desde la caché puede incluir preguntas respondidas después de calcularlo
+            respondidas = self.estadisticas.respuestas_usuario(usuario_id)
+            preguntas_candidatas = [p for p in preguntas_candidatas if p['idPregunta'] not in respondidas]
             
             if not preguntas_candidatas:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'No se encontraron preguntas recomendadas basadas en usuarios similares.'
                 }
+                return
             
             # Obtener todas las preguntas para generar opciones incorrectas
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            query_todas = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas"
-            cursor.execute(query_todas)
-            todas_las_preguntas = cursor.fetchall()
-            cursor.close()
-            connection.close()
+            todas_las_preguntas = self.catalogo.obtener().preguntas
             
             if len(todas_las_preguntas) < 4:
-                return {
+                yield 'resumen', {
                     'estado': 'error',
                     'mensaje': 'Se necesitan al menos 4 preguntas en la base de datos para generar opciones'
                 }
+                return
             
-            # Seleccionar las 10 mejores preguntas recomendadas
+            # Seleccionar 10 preguntas entre las mejores recomendadas
             preguntas_seleccionadas = []
-            num_preguntas = min(10, len(preguntas_candidatas))
             
-            for i in range(num_preguntas):
-                pregunta_principal = preguntas_candidatas[i]
-                
+            for pregunta_principal in muestrear_ranking(preguntas_candidatas):
                 # Generar respuestas incorrectas
-                respuestas_incorrectas = set()
-                otras_preguntas = [p for p in todas_las_preguntas if p['idPregunta'] != pregunta_principal['idPregunta']]
-                
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas.remove(pregunta_incorrecta)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias'],
                     'tasa_acierto_similares': round(pregunta_principal['tasa_acierto'], 2),
                     'total_usuarios_similares': len(usuarios_similares)
                 }
                 
                 preguntas_seleccionadas.append(pregunta_formateada)
+                yield 'pregunta', pregunta_formateada
             
             resultado = {
-                'preguntas': preguntas_seleccionadas,
                 'total_preguntas': len(preguntas_seleccionadas),
                 'usuarios_similares_encontrados': len(usuarios_similares),
                 'usuario_id': usuario_id,
@@ -272,15 +203,15 @@ class AlgoritmoUsuarioNegativo:
             if data:
                 resultado['datos_entrada'] = data
             
-            return resultado
+            yield 'resumen', resultado
         
         except mysql.connector.Error as db_error:
-            return {
+            yield 'resumen', {
                 'estado': 'error',
                 'mensaje': f'Error de base de datos: {str(db_error)}'
             }
         except Exception as e:
-            return {
+            yield 'resumen', {
                 'estado': 'error',
                 'mensaje': f'Error en el algoritmo: {str(e)}'
             }
@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import mysql.connector
+from PoolConexiones import configuracion_db
+
+# Campos que se comparan entre informes: una subida mayor que la tolerancia es una regresión
+METRICAS_COMPARADAS = ['p50_ms', 'p95_ms', 'consultas_por_peticion']
+
+
+class ContadorConsultas:
+    """Cuenta las sentencias que recibe el servidor MySQL (variable de estado global Questions).
+
+    No distingue de dónde vienen, así que el servidor debe estar dedicado al benchmark. La propia
+    consulta SHOW STATUS también cuenta y se descuenta.
+    """
+
+    def __init__(self, db_config=None):
+        self.connection = mysql.connector.connect(**(db_config or configuracion_db()))
+
+    def leer(self):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+            return int(cursor.fetchone()[1])
+        finally:
+            cursor.close()
+
+    def cerrar(self):
+        self.connection.close()
+
+
+def percentil(valores, p):
+    return round(float(np.percentile(valores, p)), 3) if valores else None
+
+
+def muestrear_datos(n_usuarios, semilla, db_config=None):
+    """Usuarios con respuestas (más probables cuanto más activos) y categorías con preguntas"""
+    connection = mysql.connector.connect(**(db_config or configuracion_db()))
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT idUsuario, totalPreguntasContestadas FROM Usuarios WHERE totalPreguntasContestadas > 0")
+        filas = cursor.fetchall()
+        cursor.execute("SELECT DISTINCT Categorias_idCategorias FROM Preguntas")
+        categorias = [fila[0] for fila in cursor.fetchall()]
+        tamanos = {}
+        for tabla in ('Categorias', 'Preguntas', 'Usuarios', 'Usuarios_has_Preguntas'):
+            cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+            tamanos[tabla] = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        connection.close()
+
+    if not filas or not categorias:
+        raise RuntimeError('No hay datos: carga antes un conjunto con DatosSinteticos.py')
+    rng = random.Random(semilla)
+    # La mitad de la muestra ponderada por actividad (usuarios habituales) y la otra mitad uniforme
+    ids = [fila[0] for fila in filas]
+    pesos = [fila[1] for fila in filas]
+    usuarios = rng.choices(ids, weights=pesos, k=n_usuarios // 2) + rng.choices(ids, k=n_usuarios - n_usuarios // 2)
+    rng.shuffle(usuarios)
+    return usuarios, categorias, tamanos
+
+
+class BenchmarkAlgoritmos:
+    """Mide latencia, consultas SQL y memoria de cada endpoint de app.py contra la base de datos configurada"""
+
+    def __init__(self, peticiones=200, calentamiento=20, muestras_memoria=10, tamano_lote=50,
+                 usuarios=1000, semilla=0, con_precarga=False):
+        self.peticiones = peticiones
+        self.calentamiento = calentamiento
+        self.muestras_memoria = muestras_memoria
+        self.tamano_lote = tamano_lote
+        self.n_usuarios = usuarios
+        self.semilla = semilla
+        self.con_precarga = con_precarga
+
+    def _cuerpos(self, slug, usuarios, categorias, rng):
+        if slug == 'algoritmos/batch':
+            algoritmos = self.registro.slugs()
+            return [{'trabajos': [{'algoritmo': rng.choice(algoritmos), 'usuario_id': rng.choice(usuarios),
+                                   'params': {'categoria_id': rng.choice(categorias)}}
+                                  for _ in range(self.tamano_lote)]}
+                    for _ in range(self.peticiones)]
+        cuerpos = []
+        for _ in range(self.peticiones):
+            cuerpo = {'usuario_id': rng.choice(usuarios)}
+            if slug == 'categoria-concreta':
+                cuerpo['categoria_id'] = rng.choice(categorias)
+            cuerpos.append(cuerpo)
+        return cuerpos
+
+    def _medir(self, cliente, ruta, cuerpos, contador):
+        def llamar(cuerpo):
+            if cuerpo is None:
+                return cliente.get(ruta)
+            return cliente.post(ruta, json=cuerpo)
+
+        for cuerpo in cuerpos[:self.calentamiento]:
+            llamar(cuerpo)
+
+        latencias = []
+        errores_http = 0
+        errores_algoritmo = 0
+        consultas_antes = contador.leer()
+        for cuerpo in cuerpos:
+            inicio = time.perf_counter()
+            respuesta = llamar(cuerpo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != 200:
+                errores_http += 1
+            elif (respuesta.get_json() or {}).get('resultado', {}).get('estado') == 'error':
+                errores_algoritmo += 1
+        consultas = contador.leer() - consultas_antes - 1
+
+        # Memoria en una pasada aparte: tracemalloc ralentiza y falsearía las latencias
+        picos = []
+        for cuerpo in cuerpos[:self.muestras_memoria]:
+            tracemalloc.start()
+            llamar(cuerpo)
+            picos.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        return {
+            'peticiones': len(cuerpos),
+            'errores_http': errores_http,
+            'errores_algoritmo': errores_algoritmo,
+            'media_ms': round(float(np.mean(latencias)), 3),
+            'p50_ms': percentil(latencias, 50),
+            'p90_ms': percentil(latencias, 90),
+            'p95_ms': percentil(latencias, 95),
+            'p99_ms': percentil(latencias, 99),
+            'max_ms': round(max(latencias), 3),
+            'consultas_por_peticion': round(consultas / len(cuerpos), 2),
+            'memoria_pico_kb': round(max(picos) / 1024, 1) if picos else None
+        }
+
+    def ejecutar(self, algoritmos=None):
+        from app import app
+        from RegistroAlgoritmos import obtener_registro
+        from PrecargaQuizzes import obtener_precarga
+        from Precalentamiento import precalentar
+
+        if not self.con_precarga:
+            # Sin la cola de quizzes pregenerados se mide el coste real de cada algoritmo
+            obtener_precarga().activa = False
+
+        self.registro = obtener_registro()
+        inicio = time.monotonic()
+        estado_precalentamiento = precalentar()
+        tiempo_precalentamiento = round(time.monotonic() - inicio, 3)
+
+        usuarios, categorias, tamanos = muestrear_datos(self.n_usuarios, self.semilla)
+        rng = random.Random(self.semilla)
+        rutas = {slug: f'/algoritmos/{slug}' for slug in self.registro.slugs()}
+        rutas['algoritmos/batch'] = '/algoritmos/batch'
+        if algoritmos:
+            rutas = {slug: ruta for slug, ruta in rutas.items() if slug in algoritmos}
+
+        cliente = app.test_client()
+        contador = ContadorConsultas()
+        endpoints = {}
+        try:
+            for slug, ruta in rutas.items():
+                endpoints[slug] = self._medir(cliente, ruta, self._cuerpos(slug, usuarios, categorias, rng), contador)
+                print(f"{slug:35} p50 {endpoints[slug]['p50_ms']:>9} ms  p95 {endpoints[slug]['p95_ms']:>9} ms  "
+                      f"{endpoints[slug]['consultas_por_peticion']:>6} consultas", file=sys.stderr)
+            endpoints['algoritmos/disponibles'] = self._medir(
+                cliente, '/algoritmos/disponibles', [None] * self.peticiones, contador)
+        finally:
+            contador.cerrar()
+
+        return {
+            'version': 1,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'entorno': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'plataforma': platform.platform(),
+                'cpus': os.cpu_count()
+            },
+            'configuracion': {
+                'peticiones': self.peticiones,
+                'calentamiento': self.calentamiento,
+                'usuarios_muestreados': self.n_usuarios,
+                'tamano_lote': self.tamano_lote,
+                'semilla': self.semilla,
+                'con_precarga': self.con_precarga
+            },
+            'datos': tamanos,
+            'precalentamiento': {
+                'segundos': tiempo_precalentamiento,
+                'pasos': dict(estado_precalentamiento['precalentado']),
+                'errores': dict(estado_precalentamiento['errores'])
+            },
+            'endpoints': endpoints,
+            # ru_maxrss va en KB en Linux
+            'rss_max_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        }
+
+
+def comparar(informe, base, tolerancia):
+    """Regresiones del informe respecto a uno anterior: [(endpoint, métrica, antes, ahora)]"""
+    regresiones = []
+    for slug, actual in informe['endpoints'].items():
+        anterior = base.get('endpoints', {}).get(slug)
+        if anterior is None:
+            continue
+        for metrica in METRICAS_COMPARADAS:
+            antes, ahora = anterior.get(metrica), actual.get(metrica)
+            if antes is None or ahora is None:
+                continue
+            # Margen absoluto mínimo para que el ruido en endpoints de microsegundos no cuente
+            margen = max(antes * tolerancia, 0.5 if metrica.endswith('_ms') else 0.0)
+            if ahora > antes + margen:
+                regresiones.append((slug, metrica, antes, ahora))
+    return regresiones
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de los endpoints de GestorAlgoritmos')
+    parser.add_argument('--peticiones', type=int, default=200, help='peticiones medidas por endpoint')
+    parser.add_argument('--calentamiento', type=int, default=20, help='peticiones previas sin medir')
+    parser.add_argument('--usuarios', type=int, default=1000, help='usuarios muestreados de la base de datos')
+    parser.add_argument('--tamano-lote', type=int, default=50, help='trabajos por petición a /algoritmos/batch')
+    parser.add_argument('--algoritmos', nargs='*', help='solo estos endpoints (slugs)')
+    parser.add_argument('--con-precarga', action='store_true',
+                        help='mide con la cola de quizzes pregenerados activa')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', default='informe_benchmark.json', help='fichero JSON del informe')
+    parser.add_argument('--comparar', help='informe anterior con el que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help='subida relativa admitida antes de considerar una regresión')
+    args = parser.parse_args()
+
+    benchmark = BenchmarkAlgoritmos(peticiones=args.peticiones, calentamiento=args.calentamiento,
+                                    tamano_lote=args.tamano_lote, usuarios=args.usuarios,
+                                    semilla=args.semilla, con_precarga=args.con_precarga)
+    informe = benchmark.ejecutar(args.algoritmos)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(informe, json.load(f), args.tolerancia)
+        informe['regresiones'] = [
+            {'endpoint': slug, 'metrica': metrica, 'antes': antes, 'ahora': ahora}
+            for slug, metrica, antes, ahora in regresiones
+        ]
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f'Informe guardado en {args.salida}', file=sys.stderr)
+
+    if informe.get('regresiones'):
+        for regresion in informe['regresiones']:
+            print(f"Regresión en {regresion['endpoint']}: {regresion['metrica']} "
+                  f"{regresion['antes']} -> {regresion['ahora']}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,287 @@
+import os
+import time
+import threading
+from collections import OrderedDict, Counter
+import numpy as np
+import mysql.connector
+from PoolConexiones import obtener_conexion
+from ResumenesUsuario import obtener_resumenes
+
+
+class BitmapPreguntas:
+    """Conjunto de ids de pregunta comprimido al estilo roaring.
+
+    Los ids se reparten por sus 16 bits altos en contenedores de 2^16 valores: un contenedor con pocos
+    ids es un array ordenado de uint16 y, a partir de LIMITE_ARRAY, un mapa de 65536 bits (8 KB), que es
+    lo que ocupa menos en cada caso. Las consultas de pertenencia de muchos ids a la vez son vectoriales.
+    """
+
+    LIMITE_ARRAY = 4096
+
+    def __init__(self):
+        # clave alta -> (es_mapa, datos): datos es un array ordenado de uint16 o 8192 bytes de bits
+        self._contenedores = {}
+        self._total = 0
+
+    @classmethod
+    def desde_ids(cls, ids):
+        bitmap = cls()
+        bitmap.actualizar(ids)
+        return bitmap
+
+    @staticmethod
+    def _a_mapa(valores):
+        bits = np.zeros(1 << 16, dtype=bool)
+        bits[valores] = True
+        return np.packbits(bits, bitorder='little')
+
+    def actualizar(self, ids):
+        """Añade varios ids de una vez"""
+        ids = np.unique(np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64))
+        if not len(ids):
+            return
+        altos = ids >> 16
+        cortes = np.flatnonzero(np.diff(altos)) + 1
+        for grupo in np.split(ids, cortes):
+            alto = int(grupo[0] >> 16)
+            bajos = (grupo & 0xFFFF).astype(np.uint16)
+            es_mapa, datos = self._contenedores.get(alto, (False, np.empty(0, dtype=np.uint16)))
+            if es_mapa:
+                bits = np.unpackbits(datos, bitorder='little').astype(bool)
+                antes = int(bits.sum())
+                bits[bajos] = True
+                datos = np.packbits(bits, bitorder='little')
+                self._total += int(bits.sum()) - antes
+            else:
+                unidos = np.union1d(datos, bajos)
+                self._total += len(unidos) - len(datos)
+                if len(unidos) > self.LIMITE_ARRAY:
+                    es_mapa, datos = True, self._a_mapa(unidos)
+                else:
+                    datos = unidos
+            self._contenedores[alto] = (es_mapa, datos)
+
+    def anadir(self, pregunta_id):
+        pregunta_id = int(pregunta_id)
+        if pregunta_id in self:
+            return
+        alto, bajo = pregunta_id >> 16, pregunta_id & 0xFFFF
+        es_mapa, datos = self._contenedores.get(alto, (False, np.empty(0, dtype=np.uint16)))
+        if es_mapa:
+            datos = datos.copy()
+            datos[bajo >> 3] |= np.uint8(1 << (bajo & 7))
+        else:
+            datos = np.insert(datos, np.searchsorted(datos, bajo), np.uint16(bajo))
+            if len(datos) > self.LIMITE_ARRAY:
+                es_mapa, datos = True, self._a_mapa(datos)
+        self._contenedores[alto] = (es_mapa, datos)
+        self._total += 1
+
+    def copia(self):
+        """Bitmap independiente con los mismos ids (los contenedores no se modifican nunca en el sitio)"""
+        bitmap = BitmapPreguntas()
+        bitmap._contenedores = dict(self._contenedores)
+        bitmap._total = self._total
+        return bitmap
+
+    def contiene(self, ids):
+        """Máscara booleana: qué ids del array están en el conjunto"""
+        ids = np.asarray(ids, dtype=np.int64)
+        resultado = np.zeros(len(ids), dtype=bool)
+        if not self._contenedores or not len(ids):
+            return resultado
+        altos = ids >> 16
+        bajos = ids & 0xFFFF
+        for alto, (es_mapa, datos) in self._contenedores.items():
+            posiciones = np.flatnonzero(altos == alto)
+            if not len(posiciones):
+                continue
+            valores = bajos[posiciones]
+            if es_mapa:
+                resultado[posiciones] = (datos[valores >> 3] >> (valores & 7)) & 1 == 1
+            else:
+                indices = np.minimum(np.searchsorted(datos, valores), len(datos) - 1)
+                resultado[posiciones] = datos[indices] == valores
+        return resultado
+
+    def ids(self):
+        """Ids del conjunto, ordenados"""
+        partes = []
+        for alto in sorted(self._contenedores):
+            es_mapa, datos = self._contenedores[alto]
+            bajos = np.flatnonzero(np.unpackbits(datos, bitorder='little')) if es_mapa else datos
+            partes.append((np.int64(alto) << 16) | bajos.astype(np.int64))
+        return np.concatenate(partes) if partes else np.empty(0, dtype=np.int64)
+
+    def __contains__(self, pregunta_id):
+        try:
+            pregunta_id = int(pregunta_id)
+        except (TypeError, ValueError):
+            return False
+        contenedor = self._contenedores.get(pregunta_id >> 16)
+        if contenedor is None:
+            return False
+        es_mapa, datos = contenedor
+        bajo = pregunta_id & 0xFFFF
+        if es_mapa:
+            return bool((datos[bajo >> 3] >> (bajo & 7)) & 1)
+        indice = np.searchsorted(datos, bajo)
+        return indice < len(datos) and datos[indice] == bajo
+
+    def __iter__(self):
+        return iter(self.ids().tolist())
+
+    def __len__(self):
+        return self._total
+
+    @property
+    def nbytes(self):
+        return sum(datos.nbytes for _, datos in self._contenedores.values())
+
+
+class BitmapsRespondidas:
+    """Preguntas respondidas por cada usuario, como BitmapPreguntas en memoria.
+
+    Sustituyen a los anti-joins y a las listas NOT IN (...) con todo lo respondido: el algoritmo obtiene
+    el bitmap (una consulta por la clave primaria la primera vez) y filtra sus candidatas localmente.
+    Las respuestas que llegan a /respuestas se añaden al bitmap en el momento; las que registre otro
+    proceso aparecen al recargarlo, pasados `ttl` segundos.
+    """
+
+    def __init__(self, capacidad=None, ttl=None):
+        self.capacidad = capacidad or int(os.getenv('RESPONDIDAS_MAX_USUARIOS', 50000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESPONDIDAS_TTL', 60))
+        self.resumenes = obtener_resumenes()
+
+        # usuario -> (bitmap, instante); en orden de uso para expulsar el más antiguo
+        self._bitmaps = OrderedDict()
+        # Generación por usuario: una carga que empezó antes de registrar respuestas no se guarda
+        self._generaciones = {}
+        self._cargando = Counter()
+        self._lock = threading.Lock()
+
+        self.metricas = {
+            'aciertos': 0,
+            'fallos': 0,
+            'registradas': 0,
+            'descartados': 0
+        }
+
+    def _consultar(self, usuarios):
+        marcadores = ','.join(['%s'] * len(usuarios))
+        if self.resumenes.disponible():
+            query = f"""
+                SELECT Usuarios_idUsuario, Preguntas_idPregunta
+                FROM ResumenUsuarioPregunta
+                WHERE Usuarios_idUsuario IN ({marcadores})
+            """
+        else:
+            query = f"""
+                SELECT DISTINCT Usuarios_idUsuario, Preguntas_idPregunta
+                FROM Usuarios_has_Preguntas
+                WHERE Usuarios_idUsuario IN ({marcadores})
+            """
+        connection = obtener_conexion()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, list(usuarios))
+            filas = cursor.fetchall()
+        except mysql.connector.Error as db_error:
+            raise Exception(f'Error de base de datos al obtener preguntas respondidas: {str(db_error)}')
+        finally:
+            cursor.close()
+            connection.close()
+        return np.array(filas, dtype=np.int64).reshape(-1, 2)
+
+    def obtener_varios(self, usuarios_ids):
+        """Bitmap de cada usuario; los que no están en memoria (o caducaron) se cargan con una sola consulta"""
+        claves = {usuario_id: str(usuario_id) for usuario_id in usuarios_ids}
+        resultado = {}
+        faltan = {}
+        ahora = time.monotonic()
+        with self._lock:
+            for usuario_id, clave in claves.items():
+                entrada = self._bitmaps.get(clave)
+                if entrada is not None and ahora - entrada[1] <= self.ttl:
+                    self._bitmaps.move_to_end(clave)
+                    resultado[usuario_id] = entrada[0]
+                    self.metricas['aciertos'] += 1
+                else:
+                    faltan[usuario_id] = self._generaciones.get(clave, 0)
+                    self._cargando[clave] += 1
+                    self.metricas['fallos'] += 1
+        if not faltan:
+            return resultado
+
+        try:
+            filas = self._consultar([int(usuario_id) for usuario_id in faltan])
+        finally:
+            with self._lock:
+                for usuario_id in faltan:
+                    clave = claves[usuario_id]
+                    self._cargando[clave] -= 1
+                    if not self._cargando[clave]:
+                        del self._cargando[clave]
+        instante = time.monotonic()
+        with self._lock:
+            for usuario_id, generacion in faltan.items():
+                clave = claves[usuario_id]
+                bitmap = BitmapPreguntas.desde_ids(filas[filas[:, 0] == int(usuario_id), 1])
+                resultado[usuario_id] = bitmap
+                if self._generaciones.get(clave, 0) != generacion:
+                    # Han llegado respuestas mientras se consultaba: se usa, pero no se guarda
+                    self.metricas['descartados'] += 1
+                    continue
+                self._bitmaps[clave] = (bitmap, instante)
+                self._bitmaps.move_to_end(clave)
+            while len(self._bitmaps) > self.capacidad:
+                self._bitmaps.popitem(last=False)
+        return resultado
+
+    def obtener(self, usuario_id):
+        """Bitmap de preguntas respondidas por el usuario"""
+        return self.obtener_varios([usuario_id])[usuario_id]
+
+    def registrar(self, respuestas):
+        """Añade respuestas (idRespuesta, usuario, pregunta, correcta) a los bitmaps en memoria"""
+        with self._lock:
+            for _, usuario_id, pregunta_id, _ in respuestas:
+                clave = str(usuario_id)
+                self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+                entrada = self._bitmaps.get(clave)
+                if entrada is not None:
+                    # Copia: quien esté usando el bitmap anterior no lo ve cambiar a medias
+                    bitmap = entrada[0].copia()
+                    bitmap.anadir(pregunta_id)
+                    self._bitmaps[clave] = (bitmap, entrada[1])
+                    self.metricas['registradas'] += 1
+            # Evita que el diccionario de generaciones crezca sin límite
+            if len(self._generaciones) > 4 * self.capacidad:
+                self._generaciones = {u: g for u, g in self._generaciones.items() if u in self._cargando}
+
+    def invalidar(self, usuarios_ids):
+        """Olvida los bitmaps de los usuarios; se recargan en su siguiente petición"""
+        with self._lock:
+            for usuario_id in usuarios_ids:
+                clave = str(usuario_id)
+                self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+                self._bitmaps.pop(clave, None)
+
+    def estado(self):
+        """Usuarios en memoria, bytes ocupados y contadores para monitorización"""
+        with self._lock:
+            return {
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+                'usuarios': len(self._bitmaps),
+                'bytes': sum(bitmap.nbytes for bitmap, _ in self._bitmaps.values()),
+                **self.metricas
+            }
+
+
+_bitmaps_respondidas = BitmapsRespondidas()
+
+
+def obtener_bitmaps_respondidas():
+    """Bitmaps de preguntas respondidas del proceso"""
+    return _bitmaps_respondidas
@@ -0,0 +1,154 @@
+import os
+import time
+import random
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from PoolConexiones import obtener_pool
+from CatalogoPreguntas import obtener_catalogo
+
+
+class CacheRankings:
+    """Ranking de preguntas candidatas por usuario y algoritmo, servido con stale-while-revalidate.
+
+    Los algoritmos colaborativos (usuario-* e item-*) guardan aquí la lista ordenada de candidatas y en
+    cada petición eligen de ella las preguntas del quiz, de modo que el cálculo pesado (usuarios o
+    preguntas similares) solo se hace cuando cambian sus datos. Un ranking con más de `ttl` segundos se
+    sigue sirviendo mientras se recalcula en segundo plano; pasado `max_obsoleto`, tras un cambio de
+    catálogo o cuando el usuario registra respuestas nuevas se recalcula en el momento.
+    """
+
+    def __init__(self, capacidad=None, ttl=None, max_obsoleto=None, hilos=None):
+        self.capacidad = capacidad or int(os.getenv('RANKINGS_MAX_ENTRADAS', 20000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('RANKINGS_TTL', 300))
+        self.max_obsoleto = max_obsoleto if max_obsoleto is not None else float(os.getenv('RANKINGS_MAX_OBSOLETO', 3600))
+        self.hilos = hilos or int(os.getenv('RANKINGS_HILOS', 2))
+        self.activa = os.getenv('RANKINGS_ACTIVA', '1') != '0'
+
+        # (slug, usuario) -> (ranking, version_catalogo, instante); en orden de uso para expulsar el más antiguo
+        self._rankings = OrderedDict()
+        self._slugs = set()
+        # Generación por usuario: un cálculo que empezó antes de una invalidación no se guarda
+        self._generaciones = {}
+        self._calculando = Counter()
+        self._refrescando = set()
+        self._ejecutor = None
+        self._lock = threading.Lock()
+
+        self.metricas = {
+            'aciertos': 0,
+            'obsoletos': 0,
+            'fallos': 0,
+            'refrescos': 0,
+            'invalidados': 0,
+            'descartados': 0,
+            'errores': 0
+        }
+
+    def obtener(self, slug, usuario_id, calcular):
+        """Ranking del usuario para el algoritmo; calcular() lo obtiene cuando no hay uno utilizable"""
+        if not self.activa:
+            return calcular()
+        clave = (slug, str(usuario_id))
+        version = obtener_catalogo().obtener().version
+        with self._lock:
+            self._slugs.add(slug)
+            entrada = self._rankings.get(clave)
+            if entrada is not None:
+                ranking, version_entrada, instante = entrada
+                edad = time.monotonic() - instante
+                if version_entrada == version and edad <= self.max_obsoleto:
+                    self._rankings.move_to_end(clave)
+                    if edad <= self.ttl:
+                        self.metricas['aciertos'] += 1
+                        return ranking
+                    self.metricas['obsoletos'] += 1
+                    if clave in self._refrescando:
+                        return ranking
+                    self._refrescando.add(clave)
+                    if self._ejecutor is None:
+                        self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='rankings')
+                    self._ejecutor.submit(self._refrescar, clave, calcular, version)
+                    return ranking
+            self.metricas['fallos'] += 1
+        return self._calcular(clave, calcular, version)
+
+    def _calcular(self, clave, calcular, version):
+        usuario = clave[1]
+        with self._lock:
+            generacion = self._generaciones.get(usuario, 0)
+            self._calculando[usuario] += 1
+        try:
+            ranking = calcular()
+        finally:
+            with self._lock:
+                self._calculando[usuario] -= 1
+                if not self._calculando[usuario]:
+                    del self._calculando[usuario]
+
+        with self._lock:
+            if self._generaciones.get(usuario, 0) != generacion:
+                # Han llegado respuestas mientras se calculaba: se sirve, pero no se guarda
+                self.metricas['descartados'] += 1
+                return ranking
+            self._rankings[clave] = (ranking, version, time.monotonic())
+            self._rankings.move_to_end(clave)
+            while len(self._rankings) > self.capacidad:
+                self._rankings.popitem(last=False)
+        return ranking
+
+    def _refrescar(self, clave, calcular, version):
+        try:
+            with obtener_pool().ambito():
+                self._calcular(clave, calcular, version)
+            with self._lock:
+                self.metricas['refrescos'] += 1
+        except Exception:
+            with self._lock:
+                self.metricas['errores'] += 1
+        finally:
+            with self._lock:
+                self._refrescando.discard(clave)
+
+    def invalidar(self, usuarios_ids):
+        """Descarta los rankings de usuarios con respuestas nuevas; se recalculan en su siguiente petición"""
+        with self._lock:
+            for usuario_id in usuarios_ids:
+                usuario = str(usuario_id)
+                self._generaciones[usuario] = self._generaciones.get(usuario, 0) + 1
+                for slug in self._slugs:
+                    if self._rankings.pop((slug, usuario), None) is not None:
+                        self.metricas['invalidados'] += 1
+            # Evita que el diccionario de generaciones crezca sin límite
+            if len(self._generaciones) > 4 * self.capacidad:
+                self._generaciones = {u: g for u, g in self._generaciones.items() if u in self._calculando}
+
+    def estado(self):
+        """Tamaño de la caché y contadores de aciertos/fallos para monitorización"""
+        with self._lock:
+            return {
+                'activa': self.activa,
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+                'rankings': len(self._rankings),
+                'refrescando': len(self._refrescando),
+                **self.metricas
+            }
+
+
+def muestrear_ranking(ranking, cantidad=10, amplitud=2):
+    """Elige al azar `cantidad` elementos entre los cantidad * amplitud primeros del ranking, en su orden.
+
+    Así dos quizzes seguidos servidos desde el mismo ranking no repiten exactamente las mismas preguntas.
+    """
+    candidatos = ranking[:cantidad * amplitud]
+    indices = sorted(random.sample(range(len(candidatos)), min(cantidad, len(candidatos))))
+    return [candidatos[i] for i in indices]
+
+
+_cache_rankings = CacheRankings()
+
+
+def obtener_cache_rankings():
+    """Caché de rankings del proceso"""
+    return _cache_rankings
@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+import numpy as np
+from PoolConexiones import obtener_conexion
+
+
+class InstantaneaCatalogo:
+    """Versión inmutable del catálogo de preguntas con sus índices"""
+
+    def __init__(self, version, preguntas, marca):
+        self.version = version
+        self.marca = marca
+        self.preguntas = preguntas
+        self.por_id = {p['idPregunta']: p for p in preguntas}
+        # Ids en el orden de `preguntas`, para filtrarlas de una vez con máscaras
+        self.ids = np.array([p['idPregunta'] for p in preguntas], dtype=np.int64)
+        self.por_categoria = {}
+        for pregunta in preguntas:
+            self.por_categoria.setdefault(pregunta['Categorias_idCategorias'], []).append(pregunta)
+
+    def de_categoria(self, categoria_id):
+        """Preguntas de una categoría (lista vacía si no existe)"""
+        try:
+            categoria_id = int(categoria_id)
+        except (TypeError, ValueError):
+            return []
+        return self.por_categoria.get(categoria_id, [])
+
+    def __len__(self):
+        return len(self.preguntas)
+
+
+class CatalogoPreguntas:
+    """Caché en memoria de la tabla Preguntas compartida por todos los algoritmos del proceso"""
+
+    def __init__(self, intervalo_verificacion=None):
+        self.intervalo_verificacion = (intervalo_verificacion if intervalo_verificacion is not None
+                                       else float(os.getenv('CATALOGO_CHECK_INTERVAL', 30)))
+        self._instantanea = None
+        self._invalidado = True
+        self._ultima_verificacion = 0
+        self._lock = threading.Lock()
+
+        self.metricas = {
+            'verificaciones': 0,
+            'recargas': 0
+        }
+
+    def _consultar_marca(self, cursor):
+        """Marca de cambios del catálogo: número de preguntas, id máximo y suma de CRC32 del contenido"""
+        cursor.execute("""
+            SELECT
+                COUNT(*) as total,
+                COALESCE(MAX(idPregunta), 0) as maximo,
+                COALESCE(SUM(CRC32(CONCAT_WS('|', idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias))), 0) as suma
+            FROM Preguntas
+        """)
+        fila = cursor.fetchone()
+        return (int(fila['total']), int(fila['maximo']), int(fila['suma']))
+
+    def _cargar(self, cursor, marca):
+        cursor.execute("SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas")
+        preguntas = cursor.fetchall()
+        version = self._instantanea.version + 1 if self._instantanea else 1
+        return InstantaneaCatalogo(version, preguntas, marca)
+
+    def obtener(self):
+        """Devuelve la instantánea vigente, recargándola si se invalidó o cambió la marca en base de datos"""
+        ahora = time.monotonic()
+        if (self._instantanea is not None and not self._invalidado
+                and ahora - self._ultima_verificacion < self.intervalo_verificacion):
+            return self._instantanea
+
+        with self._lock:
+            # Otro hilo pudo recargar mientras esperábamos el lock
+            if (self._instantanea is not None and not self._invalidado
+                    and time.monotonic() - self._ultima_verificacion < self.intervalo_verificacion):
+                return self._instantanea
+
+            # Una invalidación que llegue durante la recarga se atiende en la siguiente petición
+            forzar = self._invalidado
+            self._invalidado = False
+
+            connection = obtener_conexion()
+            cursor = connection.cursor(dictionary=True)
+            try:
+                marca = self._consultar_marca(cursor)
+                self.metricas['verificaciones'] += 1
+                if self._instantanea is None or forzar or marca != self._instantanea.marca:
+                    self._instantanea = self._cargar(cursor, marca)
+                    self.metricas['recargas'] += 1
+                self._ultima_verificacion = time.monotonic()
+            except Exception:
+                self._invalidado = self._invalidado or forzar
+                raise
+            finally:
+                cursor.close()
+                connection.close()
+
+        return self._instantanea
+
+    def invalidar(self):
+        """Fuerza la recarga del catálogo en la siguiente petición"""
+        self._invalidado = True
+
+    def estado(self):
+        instantanea = self._instantanea
+        return {
+            'version': instantanea.version if instantanea else 0,
+            'total_preguntas': len(instantanea) if instantanea else 0,
+            'invalidado': self._invalidado,
+            **self.metricas
+        }
+
+
+_catalogo = CatalogoPreguntas()
+
+
+def obtener_catalogo():
+    """Catálogo de preguntas del proceso"""
+    return _catalogo
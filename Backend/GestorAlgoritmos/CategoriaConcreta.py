@@ -1,21 +1,18 @@
 import random
 import mysql.connector
-import os
+from CatalogoPreguntas import obtener_catalogo
+from GeneradorDistractores import obtener_generador_distractores, POLITICA_CATEGORIA_GLOBAL
 
 class CategoriaConcreta:
+    slug = 'categoria-concreta'
+    criterio = 3
+    resumen = 'Elige aleatoriamente una pregunta de una categoria en concreto'
+
     def __init__(self):
         self.nombre = "CategoriaConcreta"
         self.descripcion = "Elige aleatoriamente una pregunta de una categoria en concreto."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
-    
-    def get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
     
     def ejecutar(self, data):
         try:
@@ -27,19 +24,9 @@ class CategoriaConcreta:
             
             categoria_id = data['categoria_id']
             
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            query = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas WHERE Categorias_idCategorias = %s"
-            cursor.execute(query, (categoria_id,))
-            preguntas_categoria = cursor.fetchall()
-            
-            query_todas = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas"
-            cursor.execute(query_todas)
-            todas_las_preguntas = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
+            catalogo = self.catalogo.obtener()
+            preguntas_categoria = catalogo.de_categoria(categoria_id)
+            todas_las_preguntas = catalogo.preguntas
             
             if not preguntas_categoria:
                 return {
@@ -61,39 +48,13 @@ class CategoriaConcreta:
                 preguntas_a_usar.append(pregunta_seleccionada)
             
             for pregunta_principal in preguntas_a_usar:
-                respuestas_incorrectas = set()
-                otras_preguntas_categoria = [p for p in preguntas_categoria if p['idPregunta'] != pregunta_principal['idPregunta']]
-                
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas_categoria) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas_categoria)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas_categoria.remove(pregunta_incorrecta)
-                
-                if len(respuestas_incorrectas) < 3:
-                    otras_preguntas_otras_categorias = [p for p in todas_las_preguntas 
-                                                       if p['idPregunta'] != pregunta_principal['idPregunta'] 
-                                                       and p['Categorias_idCategorias'] != categoria_id]
-                    
-                    while len(respuestas_incorrectas) < 3 and len(otras_preguntas_otras_categorias) > 0:
-                        pregunta_incorrecta = random.choice(otras_preguntas_otras_categorias)
-                        respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                        
-                        if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                            respuesta_incorrecta not in respuestas_incorrectas):
-                            respuestas_incorrectas.add(respuesta_incorrecta)
-                        
-                        otras_preguntas_otras_categorias.remove(pregunta_incorrecta)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal, POLITICA_CATEGORIA_GLOBAL)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias']
                 }
                 
@@ -1,43 +1,114 @@
 import random
 import mysql.connector
-import os
+from PoolConexiones import obtener_conexion, ejecutar_consultas
+from CatalogoPreguntas import obtener_catalogo
+from ResumenesUsuario import obtener_resumenes
+from GeneradorDistractores import obtener_generador_distractores, POLITICA_CATEGORIA
 from AleatorioSimple import AleatorioSimple
 
 class CategoriaPeor:
+    slug = 'categoria-peor'
+    criterio = 4
+    resumen = 'Te pone automaticamente preguntas de la categoria que peor se te da'
+
     def __init__(self):
         self.nombre = "CategoriaPeor"
         self.descripcion = "Te pone automaticamente preguntas de la categoria que peor se te da."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
+        self.resumenes = obtener_resumenes()
+        self._precargadas = {}
     
     def get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return obtener_conexion()
     
-    def obtener_categoria_peor(self, usuario_id):
-        """Obtiene la categoría con peor porcentaje de aciertos para el usuario"""
-        try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
+    def consultas_precarga(self, usuarios_ids):
+        """Consultas para obtener de una vez la categoría peor de varios usuarios (/algoritmos/batch y ServidorAsync)"""
+        if self.resumenes.disponible():
             query = """
                 SELECT 
+                    Usuarios_idUsuario,
+                    Categorias_idCategorias,
+                    intentos as total_respondidas,
+                    aciertos as total_correctas,
+                    (aciertos / intentos) * 100 as porcentaje_aciertos
+                FROM ResumenUsuarioCategoria
+                WHERE Usuarios_idUsuario IN ({}) AND intentos >= 3
+                ORDER BY Usuarios_idUsuario, porcentaje_aciertos ASC
+            """.format(','.join(['%s'] * len(usuarios_ids)))
+        else:
+            query = """
+                SELECT 
+                    uhp.Usuarios_idUsuario,
                     p.Categorias_idCategorias,
                     COUNT(*) as total_respondidas,
                     SUM(uhp.respuestaCorrecta) as total_correctas,
                     (SUM(uhp.respuestaCorrecta) / COUNT(*)) * 100 as porcentaje_aciertos
                 FROM Usuarios_has_Preguntas uhp
                 INNER JOIN Preguntas p ON uhp.Preguntas_idPregunta = p.idPregunta
-                WHERE uhp.Usuarios_idUsuario = %s
-                GROUP BY p.Categorias_idCategorias
+                WHERE uhp.Usuarios_idUsuario IN ({})
+                GROUP BY uhp.Usuarios_idUsuario, p.Categorias_idCategorias
                 HAVING COUNT(*) >= 3
-                ORDER BY porcentaje_aciertos ASC
-                LIMIT 1
-            """
+                ORDER BY uhp.Usuarios_idUsuario, porcentaje_aciertos ASC
+            """.format(','.join(['%s'] * len(usuarios_ids)))
+        return {'categorias': (query, list(usuarios_ids))}
+    
+    def guardar_precarga(self, resultados, usuarios_ids):
+        """Guarda lo obtenido por consultas_precarga para que las siguientes ejecuciones no consulten la base de datos"""
+        filas = resultados['categorias']
+        # Las filas traen el id como entero aunque se haya pedido como texto
+        claves = {str(usuario_id): usuario_id for usuario_id in usuarios_ids}
+        precargadas = {usuario_id: None for usuario_id in usuarios_ids}
+        for fila in filas:
+            usuario_id = claves[str(fila.pop('Usuarios_idUsuario'))]
+            # La primera fila de cada usuario es la de su categoría peor
+            if precargadas.get(usuario_id) is None:
+                precargadas[usuario_id] = fila
+        self._precargadas = precargadas
+    
+    def precargar(self, usuarios_ids):
+        """Obtiene en una sola consulta la categoría peor de varios usuarios"""
+        try:
+            self.guardar_precarga(ejecutar_consultas(self.consultas_precarga(usuarios_ids)), usuarios_ids)
+        except mysql.connector.Error as db_error:
+            raise Exception(f'Error de base de datos al precargar categorías: {str(db_error)}')
+    
+    def obtener_categoria_peor(self, usuario_id):
+        """Obtiene la categoría con peor porcentaje de aciertos para el usuario"""
+        if usuario_id in self._precargadas:
+            return self._precargadas[usuario_id]
+        
+        try:
+            connection = self.get_db_connection()
+            cursor = connection.cursor(dictionary=True)
+            
+            if self.resumenes.disponible():
+                query = """
+                    SELECT 
+                        Categorias_idCategorias,
+                        intentos as total_respondidas,
+                        aciertos as total_correctas,
+                        (aciertos / intentos) * 100 as porcentaje_aciertos
+                    FROM ResumenUsuarioCategoria
+                    WHERE Usuarios_idUsuario = %s AND intentos >= 3
+                    ORDER BY porcentaje_aciertos ASC
+                    LIMIT 1
+                """
+            else:
+                query = """
+                    SELECT 
+                        p.Categorias_idCategorias,
+                        COUNT(*) as total_respondidas,
+                        SUM(uhp.respuestaCorrecta) as total_correctas,
+                        (SUM(uhp.respuestaCorrecta) / COUNT(*)) * 100 as porcentaje_aciertos
+                    FROM Usuarios_has_Preguntas uhp
+                    INNER JOIN Preguntas p ON uhp.Preguntas_idPregunta = p.idPregunta
+                    WHERE uhp.Usuarios_idUsuario = %s
+                    GROUP BY p.Categorias_idCategorias
+                    HAVING COUNT(*) >= 3
+                    ORDER BY porcentaje_aciertos ASC
+                    LIMIT 1
+                """
             cursor.execute(query, (usuario_id,))
             categoria_peor = cursor.fetchone()
             
@@ -69,15 +140,7 @@ class CategoriaPeor:
             
             categoria_id = categoria_peor['Categorias_idCategorias']
             
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            query = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas WHERE Categorias_idCategorias = %s"
-            cursor.execute(query, (categoria_id,))
-            preguntas_categoria = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
+            preguntas_categoria = self.catalogo.obtener().de_categoria(categoria_id)
             
             if not preguntas_categoria:
                 return {
@@ -99,34 +162,13 @@ class CategoriaPeor:
                 preguntas_a_usar.append(pregunta_seleccionada)
 
             for pregunta_principal in preguntas_a_usar:
-                respuestas_incorrectas = set()
-                otras_preguntas_categoria = [p for p in preguntas_categoria if p['idPregunta'] != pregunta_principal['idPregunta']]
-
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas_categoria) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas_categoria)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas_categoria.remove(pregunta_incorrecta)
-
-                if len(respuestas_incorrectas) < 3:
-                    todas_otras_respuestas = [p['respuestaCorrecta'] for p in preguntas_categoria 
-                                            if p['idPregunta'] != pregunta_principal['idPregunta'] 
-                                            and p['respuestaCorrecta'] != pregunta_principal['respuestaCorrecta']
-                                            and p['respuestaCorrecta'] not in respuestas_incorrectas]
-
-                    respuestas_faltantes = min(3 - len(respuestas_incorrectas), len(todas_otras_respuestas))
-                    respuestas_adicionales = random.sample(todas_otras_respuestas, respuestas_faltantes)
-                    respuestas_incorrectas.update(respuestas_adicionales)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal, POLITICA_CATEGORIA)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias']
                 }
                 
@@ -0,0 +1,234 @@
+import os
+import heapq
+import threading
+from datetime import date, timedelta
+from collections import OrderedDict, Counter
+import mysql.connector
+from PoolConexiones import obtener_conexion
+from ResumenesUsuario import obtener_resumenes
+from EstadisticasRespuestas import obtener_estadisticas
+
+FACILIDAD_INICIAL = 2.5
+FACILIDAD_MINIMA = 1.3
+# Las respuestas solo son acierto o fallo: se traducen a la calidad 0-5 de SM-2
+CALIDAD_ACIERTO = 4
+CALIDAD_FALLO = 1
+
+
+def repasar(tarjeta, correcta, fecha):
+    """Aplica SM-2 a una tarjeta (repeticiones, facilidad, intervalo, próxima fecha) tras responderla en `fecha`"""
+    repeticiones, facilidad, intervalo, _ = tarjeta or (0, FACILIDAD_INICIAL, 0, None)
+    calidad = CALIDAD_ACIERTO if correcta else CALIDAD_FALLO
+    if calidad >= 3:
+        if repeticiones == 0:
+            intervalo = 1
+        elif repeticiones == 1:
+            intervalo = 6
+        else:
+            intervalo = round(intervalo * facilidad)
+        repeticiones += 1
+    else:
+        # Fallo: se vuelve a empezar con la pregunta al día siguiente
+        repeticiones = 0
+        intervalo = 1
+    facilidad = max(FACILIDAD_MINIMA, facilidad + 0.1 - (5 - calidad) * (0.08 + (5 - calidad) * 0.02))
+    return repeticiones, facilidad, intervalo, fecha + timedelta(days=intervalo)
+
+
+class PlanRepasos:
+    """Tarjetas SM-2 de un usuario con un montículo por próxima fecha de repaso.
+
+    Cada respuesta actualiza su tarjeta y añade una entrada al montículo; las entradas que dejan de
+    coincidir con la tarjeta se descartan al salir, así que las próximas k preguntas cuestan O(k log n).
+    """
+
+    def __init__(self):
+        # pregunta -> (repeticiones, facilidad, intervalo, proxima)
+        self.tarjetas = {}
+        self._monticulo = []
+        self.ultimo_id = 0
+
+    def responder(self, pregunta_id, correcta, fecha, respuesta_id=None):
+        tarjeta = repasar(self.tarjetas.get(pregunta_id), correcta, fecha)
+        self.tarjetas[pregunta_id] = tarjeta
+        heapq.heappush(self._monticulo, (tarjeta[3], pregunta_id))
+        if respuesta_id is not None:
+            self.ultimo_id = max(self.ultimo_id, respuesta_id)
+        if len(self._monticulo) > 2 * len(self.tarjetas) + 64:
+            # Demasiadas entradas obsoletas: se reconstruye con una por tarjeta
+            self._monticulo = [(tarjeta[3], pregunta) for pregunta, tarjeta in self.tarjetas.items()]
+            heapq.heapify(self._monticulo)
+
+    def proximas(self, cantidad, valida=None):
+        """Las `cantidad` preguntas con el repaso más próximo: [(pregunta, tarjeta)], de la más atrasada en adelante"""
+        elegidas = []
+        sacadas = []
+        vistas = set()
+        while self._monticulo and len(elegidas) < cantidad:
+            entrada = heapq.heappop(self._monticulo)
+            proxima, pregunta = entrada
+            tarjeta = self.tarjetas.get(pregunta)
+            if tarjeta is None or tarjeta[3] != proxima or pregunta in vistas:
+                # Entrada obsoleta: la tarjeta se ha vuelto a responder después
+                continue
+            vistas.add(pregunta)
+            sacadas.append(entrada)
+            if valida is None or valida(pregunta):
+                elegidas.append((pregunta, tarjeta))
+        # Siguen pendientes hasta que se respondan
+        for entrada in sacadas:
+            heapq.heappush(self._monticulo, entrada)
+        return elegidas
+
+    def __len__(self):
+        return len(self.tarjetas)
+
+
+class ColaRepasos:
+    """Planes de repaso espaciado de los usuarios activos, en memoria.
+
+    El plan de un usuario se construye la primera vez reproduciendo su historial de respuestas en orden
+    (una consulta) y después se mantiene con las respuestas nuevas que aplica EstadisticasRespuestas: las
+    que llegan a /respuestas y las que registra otro proceso, que aparecen en la siguiente sincronización
+    por idRespuesta. Solo se vuelve a reproducir el historial si el plan se expulsa de memoria o si las
+    estadísticas se recargan por completo (p. ej. porque se han borrado respuestas).
+    """
+
+    def __init__(self, capacidad=None, estadisticas=None):
+        self.capacidad = capacidad or int(os.getenv('REPASOS_MAX_USUARIOS', 20000))
+        self.resumenes = obtener_resumenes()
+        self.estadisticas = estadisticas or obtener_estadisticas()
+        self.estadisticas.suscribir(self.registrar)
+        # Cargas completas de las estadísticas con las que se construyeron los planes en memoria
+        self._cargas = None
+
+        # usuario -> plan; en orden de uso para expulsar el más antiguo
+        self._planes = OrderedDict()
+        # Generación por usuario: una carga que empezó antes de registrar respuestas no se guarda
+        self._generaciones = {}
+        self._cargando = Counter()
+        self._lock = threading.Lock()
+
+        self.metricas = {
+            'aciertos': 0,
+            'fallos': 0,
+            'registradas': 0,
+            'descartados': 0
+        }
+
+    def _consultar(self, usuario_id):
+        if self.resumenes.disponible():
+            # El historial archivado también cuenta para el plan
+            query = """
+                SELECT idRespuesta, Preguntas_idPregunta, fechaDeContestacion, respuestaCorrecta
+                FROM Usuarios_has_PreguntasArchivo
+                WHERE Usuarios_idUsuario = %s
+                UNION ALL
+                SELECT idRespuesta, Preguntas_idPregunta, fechaDeContestacion, respuestaCorrecta
+                FROM Usuarios_has_Preguntas
+                WHERE Usuarios_idUsuario = %s
+                ORDER BY fechaDeContestacion, idRespuesta
+            """
+            params = (usuario_id, usuario_id)
+        else:
+            query = """
+                SELECT idRespuesta, Preguntas_idPregunta, fechaDeContestacion, respuestaCorrecta
+                FROM Usuarios_has_Preguntas
+                WHERE Usuarios_idUsuario = %s
+                ORDER BY fechaDeContestacion, idRespuesta
+            """
+            params = (usuario_id,)
+        connection = obtener_conexion()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except mysql.connector.Error as db_error:
+            raise Exception(f'Error de base de datos al obtener el historial de repasos: {str(db_error)}')
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _plan(self, usuario_id):
+        """Plan del usuario, cargándolo si no está en memoria; se llama sin el lock"""
+        clave = str(usuario_id)
+        # Sincroniza las estadísticas, que aplican a los planes las respuestas registradas por otros procesos
+        self.estadisticas.actualizar()
+        with self._lock:
+            cargas = self.estadisticas.metricas['cargas_completas']
+            if cargas != self._cargas:
+                # Una carga completa no avisa de respuestas nuevas: los planes anteriores pueden estar desfasados
+                self._planes.clear()
+                self._cargas = cargas
+            entrada = self._planes.get(clave)
+            if entrada is not None:
+                self._planes.move_to_end(clave)
+                self.metricas['aciertos'] += 1
+                return entrada
+            generacion = (cargas, self._generaciones.get(clave, 0))
+            self._cargando[clave] += 1
+            self.metricas['fallos'] += 1
+
+        try:
+            filas = self._consultar(usuario_id)
+        finally:
+            with self._lock:
+                self._cargando[clave] -= 1
+                if not self._cargando[clave]:
+                    del self._cargando[clave]
+
+        plan = PlanRepasos()
+        hoy = date.today()
+        for respuesta_id, pregunta_id, fecha, correcta in filas:
+            plan.responder(pregunta_id, bool(correcta), fecha or hoy, respuesta_id)
+        with self._lock:
+            if (self._cargas, self._generaciones.get(clave, 0)) != generacion:
+                # Han llegado respuestas mientras se consultaba: se usa, pero no se guarda
+                self.metricas['descartados'] += 1
+                return plan
+            self._planes[clave] = plan
+            self._planes.move_to_end(clave)
+            while len(self._planes) > self.capacidad:
+                self._planes.popitem(last=False)
+        return plan
+
+    def proximas(self, usuario_id, cantidad=10, valida=None):
+        """Preguntas que toca repasar al usuario, [(pregunta, tarjeta)], y cuántas preguntas tiene en su plan"""
+        plan = self._plan(usuario_id)
+        with self._lock:
+            return plan.proximas(cantidad, valida), len(plan)
+
+    def registrar(self, respuestas):
+        """Aplica respuestas (idRespuesta, usuario, pregunta, correcta) a los planes en memoria; lo llama
+        EstadisticasRespuestas con cada respuesta nueva"""
+        hoy = date.today()
+        with self._lock:
+            for respuesta_id, usuario_id, pregunta_id, correcta in sorted(respuestas):
+                clave = str(usuario_id)
+                self._generaciones[clave] = self._generaciones.get(clave, 0) + 1
+                plan = self._planes.get(clave)
+                # Una respuesta ya incluida en la carga del plan no se vuelve a aplicar
+                if plan is not None and respuesta_id > plan.ultimo_id:
+                    plan.responder(pregunta_id, correcta, hoy, respuesta_id)
+                    self.metricas['registradas'] += 1
+            # Evita que el diccionario de generaciones crezca sin límite
+            if len(self._generaciones) > 4 * self.capacidad:
+                self._generaciones = {u: g for u, g in self._generaciones.items() if u in self._cargando}
+
+    def estado(self):
+        """Usuarios en memoria, tarjetas y contadores para monitorización"""
+        with self._lock:
+            return {
+                'capacidad': self.capacidad,
+                'usuarios': len(self._planes),
+                'tarjetas': sum(len(plan) for plan in self._planes.values()),
+                **self.metricas
+            }
+
+
+_cola_repasos = ColaRepasos()
+
+
+def obtener_cola_repasos():
+    """Planes de repaso espaciado del proceso"""
+    return _cola_repasos
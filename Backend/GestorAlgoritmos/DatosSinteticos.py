@@ -0,0 +1,182 @@
+import time
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import mysql.connector
+from PoolConexiones import configuracion_db
+
+# Tablas que rellena el generador, en el orden en que se vacían
+TABLAS_SINTETICAS = ['Usuarios_has_Preguntas', 'Usuarios', 'Preguntas', 'Categorias']
+TABLAS_DERIVADAS = ['ResumenUsuarioPregunta', 'ResumenUsuarioCategoria', 'ResumenUsuarioDia', 'Usuarios_has_PreguntasArchivo',
+                    'CompactacionRespuestas', 'SimilitudPreguntas', 'PreguntasServidas']
+
+
+class GeneradorDatosSinteticos:
+    """Genera Categorias, Preguntas, Usuarios y Usuarios_has_Preguntas con una forma parecida a la real.
+
+    La actividad de los usuarios y la popularidad de las preguntas siguen una ley de Zipf (pocos usuarios
+    responden muchísimo, la mayoría casi nada), y cada respuesta acierta con una probabilidad que depende
+    de la habilidad del usuario, de su afinidad con la categoría y de la dificultad de la pregunta, de modo
+    que los algoritmos de categoría peor/mejor y de similitud encuentran patrones y no solo ruido.
+    """
+
+    def __init__(self, categorias=20, preguntas=10000, usuarios=100000, respuestas=1000000,
+                 sesgo_usuarios=1.1, sesgo_preguntas=0.8, dias=365, semilla=0):
+        self.categorias = categorias
+        self.preguntas = preguntas
+        self.usuarios = usuarios
+        self.respuestas = respuestas
+        self.sesgo_usuarios = sesgo_usuarios
+        self.sesgo_preguntas = sesgo_preguntas
+        self.dias = dias
+        self.rng = np.random.default_rng(semilla)
+
+        self.categoria_pregunta = self.rng.integers(1, categorias + 1, size=preguntas)
+        self.dificultad = self.rng.normal(0.0, 1.0, size=preguntas)
+        self.habilidad = self.rng.normal(0.5, 1.0, size=usuarios)
+        self.afinidad = self.rng.normal(0.0, 0.7, size=(usuarios, categorias))
+        self.peso_usuarios = self._pesos_zipf(usuarios, sesgo_usuarios)
+        self.peso_preguntas = self._pesos_zipf(preguntas, sesgo_preguntas)
+
+    def _pesos_zipf(self, total, sesgo):
+        pesos = 1.0 / np.arange(1, total + 1) ** sesgo
+        # Los ids activos quedan repartidos en lugar de ser siempre los primeros
+        self.rng.shuffle(pesos)
+        return pesos / pesos.sum()
+
+    def filas_categorias(self):
+        return [(i, f'Categoría sintética {i}') for i in range(1, self.categorias + 1)]
+
+    def filas_preguntas(self):
+        return [
+            (i + 1, f'sintetico/{i + 1}.wav', f'Sonido {int(self.categoria_pregunta[i])}-{i + 1}',
+             int(self.categoria_pregunta[i]))
+            for i in range(self.preguntas)
+        ]
+
+    def bloques_respuestas(self, tamano_bloque=500000):
+        """Genera las respuestas por bloques de columnas (usuario, pregunta, días de antigüedad, correcta)"""
+        generadas = 0
+        while generadas < self.respuestas:
+            n = min(tamano_bloque, self.respuestas - generadas)
+            usuarios = self.rng.choice(self.usuarios, size=n, p=self.peso_usuarios)
+            preguntas = self.rng.choice(self.preguntas, size=n, p=self.peso_preguntas)
+            logit = (self.habilidad[usuarios] - self.dificultad[preguntas]
+                     + self.afinidad[usuarios, self.categoria_pregunta[preguntas] - 1])
+            correctas = (self.rng.random(n) < 1.0 / (1.0 + np.exp(-logit))).astype(np.int8)
+            # Más respuestas recientes que antiguas
+            hace_dias = np.minimum(self.rng.exponential(self.dias / 4, size=n), self.dias - 1).astype(np.int64)
+            yield usuarios + 1, preguntas + 1, hace_dias, correctas
+            generadas += n
+
+    def filas_usuarios(self, aciertos, fallos, ultimo_dia):
+        hoy = date.today()
+        criterios = self.rng.integers(1, 12, size=self.usuarios)
+        filas = []
+        for i in range(self.usuarios):
+            contestadas = int(aciertos[i] + fallos[i])
+            ultimo = hoy - timedelta(days=int(ultimo_dia[i])) if contestadas else None
+            filas.append((i + 1, f'sintetico{i + 1}@auscultify.local', 'sintetico', int(aciertos[i]),
+                          int(fallos[i]), contestadas, 0, ultimo, 0, int(criterios[i])))
+        return filas
+
+
+def _insertar(cursor, query, filas, tamano_lote):
+    for i in range(0, len(filas), tamano_lote):
+        cursor.executemany(query, filas[i:i + tamano_lote])
+
+
+def cargar(generador, vaciar=False, tamano_lote=5000, db_config=None):
+    """Carga los datos generados en MySQL; devuelve el número de filas por tabla"""
+    connection = mysql.connector.connect(**(db_config or configuracion_db()))
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM Usuarios_has_Preguntas")
+        existentes = cursor.fetchone()[0]
+        if existentes and not vaciar:
+            raise RuntimeError(f'La base de datos ya tiene {existentes} respuestas; usa --vaciar para sustituirlas')
+
+        cursor.execute("SET unique_checks = 0")
+        cursor.execute("SET foreign_key_checks = 0")
+        if vaciar:
+            for tabla in TABLAS_SINTETICAS + TABLAS_DERIVADAS:
+                try:
+                    cursor.execute(f"TRUNCATE TABLE {tabla}")
+                except mysql.connector.errors.ProgrammingError:
+                    # Tabla derivada aún no instalada
+                    pass
+
+        _insertar(cursor, "INSERT INTO Categorias (idCategorias, nombreCategoria) VALUES (%s, %s)",
+                  generador.filas_categorias(), tamano_lote)
+        _insertar(cursor, """INSERT INTO Preguntas (idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias)
+                             VALUES (%s, %s, %s, %s)""", generador.filas_preguntas(), tamano_lote)
+
+        hoy = date.today()
+        aciertos = np.zeros(generador.usuarios, dtype=np.int64)
+        fallos = np.zeros(generador.usuarios, dtype=np.int64)
+        ultimo_dia = np.full(generador.usuarios, generador.dias, dtype=np.int64)
+        query = """INSERT INTO Usuarios_has_Preguntas
+                   (Usuarios_idUsuario, Preguntas_idPregunta, fechaDeContestacion, respuestaCorrecta)
+                   VALUES (%s, %s, %s, %s)"""
+        fechas = [hoy - timedelta(days=d) for d in range(generador.dias)]
+        total = 0
+        for usuarios, preguntas, hace_dias, correctas in generador.bloques_respuestas():
+            np.add.at(aciertos, usuarios - 1, correctas)
+            np.add.at(fallos, usuarios - 1, 1 - correctas)
+            np.minimum.at(ultimo_dia, usuarios - 1, hace_dias)
+            filas = list(zip(usuarios.tolist(), preguntas.tolist(),
+                             [fechas[d] for d in hace_dias.tolist()], correctas.tolist()))
+            _insertar(cursor, query, filas, tamano_lote)
+            connection.commit()
+            total += len(filas)
+
+        _insertar(cursor, """INSERT INTO Usuarios (idUsuario, correoElectronico, contrasena, totalPreguntasAcertadas,
+                                 totalPreguntasFalladas, totalPreguntasContestadas, racha, ultimoDiaPregunta,
+                                 esPublico, idCriterioMasUsado)
+                             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                  generador.filas_usuarios(aciertos, fallos, ultimo_dia), tamano_lote)
+        connection.commit()
+        return {
+            'Categorias': generador.categorias,
+            'Preguntas': generador.preguntas,
+            'Usuarios': generador.usuarios,
+            'Usuarios_has_Preguntas': total
+        }
+    finally:
+        cursor.execute("SET unique_checks = 1")
+        cursor.execute("SET foreign_key_checks = 1")
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera y carga en MySQL un conjunto de datos sintético para benchmarks')
+    parser.add_argument('--categorias', type=int, default=20)
+    parser.add_argument('--preguntas', type=int, default=10000)
+    parser.add_argument('--usuarios', type=int, default=100000)
+    parser.add_argument('--respuestas', type=int, default=1000000,
+                        help='filas de Usuarios_has_Preguntas (p. ej. 50000000 para la escala grande)')
+    parser.add_argument('--sesgo-usuarios', type=float, default=1.1,
+                        help='exponente de Zipf de la actividad de los usuarios')
+    parser.add_argument('--sesgo-preguntas', type=float, default=0.8,
+                        help='exponente de Zipf de la popularidad de las preguntas')
+    parser.add_argument('--dias', type=int, default=365, help='antigüedad máxima de las respuestas')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--vaciar', action='store_true',
+                        help='vacía antes las tablas (borra los datos existentes; usar solo con una base de datos de pruebas)')
+    parser.add_argument('--resumenes', action='store_true',
+                        help='reconstruye después los resúmenes por usuario')
+    args = parser.parse_args()
+
+    inicio = time.monotonic()
+    generador = GeneradorDatosSinteticos(
+        categorias=args.categorias, preguntas=args.preguntas, usuarios=args.usuarios,
+        respuestas=args.respuestas, sesgo_usuarios=args.sesgo_usuarios,
+        sesgo_preguntas=args.sesgo_preguntas, dias=args.dias, semilla=args.semilla
+    )
+    filas = cargar(generador, vaciar=args.vaciar)
+    if args.resumenes:
+        from ResumenesUsuario import instalar, reconstruir
+        instalar()
+        reconstruir()
+    print(f'Datos sintéticos cargados en {time.monotonic() - inicio:.1f}s: {filas}')
@@ -0,0 +1,479 @@
+import os
+import time
+import threading
+import numpy as np
+from PoolConexiones import obtener_conexion
+from CatalogoPreguntas import obtener_catalogo
+from MatrizRespuestas import MatrizRespuestas, posiciones_de_filas
+from SimilitudItems import pearson_binaria, MIN_USUARIOS_COMUNES
+from ResumenesUsuario import obtener_resumenes, respuestas_archivadas
+
+# Margen de idRespuesta que se vuelve a leer en cada sincronización: las transacciones
+# concurrentes pueden confirmar sus filas fuera de orden
+VENTANA_REORDEN = 1000
+
+
+class ContadoresCoocurrencia:
+    """Sumas suficientes de Pearson para cada par de preguntas sobre los usuarios que han respondido ambas.
+
+    n[i, j] cuenta los usuarios comunes, sx[i, j] suma su última respuesta a la pregunta i y
+    sxy[i, j] el producto de las dos respuestas; la Σy del par (i, j) es sx[j, i].
+    """
+
+    def __init__(self, capacidad_maxima):
+        self.capacidad_maxima = capacidad_maxima
+        self.columna_pregunta = {}
+        self.preguntas = []
+        self.desbordado = False
+        self.n = np.zeros((0, 0), dtype=np.int32)
+        self.sx = np.zeros((0, 0), dtype=np.int32)
+        self.sxy = np.zeros((0, 0), dtype=np.int32)
+
+    def _ampliar(self, necesaria):
+        capacidad = min(max(necesaria, 2 * len(self.n), 64), self.capacidad_maxima)
+        for nombre in ('n', 'sx', 'sxy'):
+            anterior = getattr(self, nombre)
+            nueva = np.zeros((capacidad, capacidad), dtype=np.int32)
+            nueva[:len(anterior), :len(anterior)] = anterior
+            setattr(self, nombre, nueva)
+
+    def columna(self, pregunta):
+        """Índice de la pregunta en las matrices, reservándolo si es nueva (None si no caben más)"""
+        indice = self.columna_pregunta.get(pregunta)
+        if indice is not None or self.desbordado:
+            return indice
+        if len(self.preguntas) >= self.capacidad_maxima:
+            self.desbordado = True
+            return None
+        if len(self.preguntas) >= len(self.n):
+            self._ampliar(len(self.preguntas) + 1)
+        indice = len(self.preguntas)
+        self.columna_pregunta[pregunta] = indice
+        self.preguntas.append(pregunta)
+        return indice
+
+    @classmethod
+    def desde_matriz(cls, matriz, capacidad_maxima, tamano_lote=4000000):
+        """Calcula todos los contadores de una vez, procesando los pares de cada usuario por lotes"""
+        contadores = cls(capacidad_maxima)
+        total = len(matriz.preguntas)
+        if total > capacidad_maxima:
+            contadores.desbordado = True
+            return contadores
+        for pregunta in matriz.preguntas:
+            contadores.columna(int(pregunta))
+
+        n = np.zeros(total * total, dtype=np.int64)
+        sx = np.zeros(total * total, dtype=np.int64)
+        sxy = np.zeros(total * total, dtype=np.int64)
+
+        longitudes = np.diff(matriz.indptr)
+        # Cortes de filas para que cada lote genere como mucho ~tamano_lote pares
+        acumulado = np.cumsum(longitudes.astype(np.int64) ** 2)
+        cortes = np.searchsorted(acumulado, np.arange(tamano_lote, acumulado[-1] if len(acumulado) else 0, tamano_lote))
+        limites = np.unique(np.concatenate(([0], cortes, [len(longitudes)])))
+
+        for fila_inicio, fila_fin in zip(limites[:-1], limites[1:]):
+            entradas = np.arange(matriz.indptr[fila_inicio], matriz.indptr[fila_fin])
+            filas = np.repeat(np.arange(fila_inicio, fila_fin), longitudes[fila_inicio:fila_fin])
+            derecha, repeticiones = posiciones_de_filas(matriz.indptr, filas)
+            izquierda = np.repeat(entradas, repeticiones)
+
+            x = matriz.valores[izquierda].astype(np.int64)
+            y = matriz.valores[derecha].astype(np.int64)
+            codigos = matriz.indices[izquierda].astype(np.int64) * total + matriz.indices[derecha]
+            n += np.bincount(codigos, minlength=total * total)
+            sx += np.bincount(codigos, weights=x, minlength=total * total).astype(np.int64)
+            sxy += np.bincount(codigos, weights=x * y, minlength=total * total).astype(np.int64)
+
+        for nombre, valores in (('n', n), ('sx', sx), ('sxy', sxy)):
+            destino = getattr(contadores, nombre)
+            destino[:total, :total] = valores.reshape(total, total)
+            np.fill_diagonal(destino, 0)
+        return contadores
+
+    def registrar(self, pregunta, valor, anterior, otras, valores_otras):
+        """Actualiza los pares de la pregunta respondida con el resto de preguntas del usuario"""
+        i = self.columna(pregunta)
+        if i is None or not len(otras):
+            return
+        if anterior is None:
+            # Primera respuesta del usuario a esta pregunta: es un usuario común más en cada par
+            producto = valor * valores_otras
+            self.n[i, otras] += 1
+            self.n[otras, i] += 1
+            self.sx[i, otras] += valor
+            self.sx[otras, i] += valores_otras
+            self.sxy[i, otras] += producto
+            self.sxy[otras, i] += producto
+        elif anterior != valor:
+            # Cambia su última respuesta: se corrige la aportación anterior
+            diferencia = (valor - anterior) * valores_otras
+            self.sx[i, otras] += valor - anterior
+            self.sxy[i, otras] += diferencia
+            self.sxy[otras, i] += diferencia
+
+    def similitudes(self, preguntas_base, minimo=MIN_USUARIOS_COMUNES):
+        """Similitud máxima de cada pregunta con alguna de las preguntas base; devuelve (ids, similitudes)"""
+        filas = [self.columna_pregunta[p] for p in preguntas_base if p in self.columna_pregunta]
+        total = len(self.preguntas)
+        if not filas:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        correlacion = pearson_binaria(self.n[filas, :total], self.sx[filas, :total].astype(np.float64),
+                                      self.sx[:total, filas].T, self.sxy[filas, :total], minimo)
+        return np.asarray(self.preguntas, dtype=np.int64), correlacion.max(axis=0)
+
+
+class EstadoUsuario:
+    """Estadísticas acumuladas de un usuario.
+
+    Por pregunta [intentos, fallos, última respuesta, idRespuesta de la última] (0 si viene de la
+    matriz base) y por categoría [total, aciertos].
+    """
+
+    def __init__(self):
+        self.preguntas = {}
+        self.categorias = {}
+
+
+class BaseRespuestas:
+    """Matriz de respuestas consolidada y su transpuesta"""
+
+    def __init__(self, matriz):
+        self.matriz = matriz
+        self.transpuesta = matriz.transpuesta()
+        self.creada = time.monotonic()
+
+
+class EstadisticasRespuestas:
+    """Estadísticas de respuestas en memoria que se actualizan en O(1) por respuesta nueva.
+
+    Parte de una carga completa de Usuarios_has_Preguntas y después solo aplica respuestas nuevas:
+    las que envía GestorDatosUsuarioPreguntas a /respuestas y, para las que reciba otro proceso,
+    una lectura periódica de las filas con idRespuesta superior a la última aplicada. Los usuarios
+    modificados se guardan aparte y se consolidan en la matriz base cuando son demasiados. Otros
+    componentes pueden suscribirse para recibir cada respuesta nueva una sola vez, llegue por donde llegue.
+    """
+
+    def __init__(self, intervalo_sincronizacion=None, intervalo_verificacion=None,
+                 capacidad_coocurrencia=None, max_modificados=None):
+        self.intervalo_sincronizacion = (intervalo_sincronizacion if intervalo_sincronizacion is not None
+                                         else float(os.getenv('ESTADISTICAS_SYNC_INTERVAL', 5)))
+        self.intervalo_verificacion = (intervalo_verificacion if intervalo_verificacion is not None
+                                       else float(os.getenv('ESTADISTICAS_CHECK_INTERVAL', 60)))
+        self.capacidad_coocurrencia = capacidad_coocurrencia or int(os.getenv('ESTADISTICAS_MAX_PREGUNTAS', 3000))
+        self.max_modificados = max_modificados or int(os.getenv('ESTADISTICAS_MAX_USUARIOS_MODIFICADOS', 2000))
+        self.catalogo = obtener_catalogo()
+        self.resumenes = obtener_resumenes()
+
+        self.base = None
+        self.coocurrencia = None
+        self.usuarios = {}
+        self.modificados = set()
+        self._consolidando = set()
+        self.ultimo_id = 0
+        self.limite_estable = 0
+        self._ids_recientes = set()
+        self._aplicadas_estables = 0
+        self.version = 0
+        self._suscriptores = []
+
+        self._ultima_sincronizacion = 0
+        self._ultima_verificacion = 0
+        self._lock = threading.RLock()
+        self._lock_carga = threading.Lock()
+
+        self.metricas = {
+            'registradas': 0,
+            'duplicadas': 0,
+            'sincronizadas': 0,
+            'cargas_completas': 0,
+            'consolidaciones': 0
+        }
+
+    @property
+    def cargada(self):
+        return self.base is not None
+
+    def _leer_base(self):
+        """Matriz con todo el historial, idRespuesta de la ventana de reordenación, último id y respuestas
+        anteriores a la ventana"""
+        if self.resumenes.disponible():
+            # Los resúmenes ya incluyen las respuestas de la ventana (y las archivadas)
+            pares, recientes, ultimo_id = MatrizRespuestas.leer_resumenes(VENTANA_REORDEN)
+            matriz = MatrizRespuestas.desde_pares(pares[:, 0], pares[:, 1], pares[:, 2], pares[:, 3], pares[:, 4])
+            return matriz, recientes, ultimo_id, int(pares[:, 3].sum()) - len(recientes)
+
+        datos = MatrizRespuestas.leer_respuestas()
+        matriz = MatrizRespuestas.desde_respuestas(datos[:, 0], datos[:, 1], datos[:, 2], orden=datos[:, 3])
+        ids = datos[:, 3]
+        ultimo_id = int(ids.max()) if len(ids) else 0
+        recientes = ids[ids > max(ultimo_id - VENTANA_REORDEN, 0)]
+        return matriz, recientes, ultimo_id, len(ids) - len(recientes)
+
+    def _cargar_completa(self):
+        """Lee todo el historial una vez y sustituye el estado en memoria"""
+        matriz, recientes, ultimo_id, aplicadas_estables = self._leer_base()
+        base = BaseRespuestas(matriz)
+        coocurrencia = ContadoresCoocurrencia.desde_matriz(matriz, self.capacidad_coocurrencia)
+        limite_estable = max(ultimo_id - VENTANA_REORDEN, 0)
+
+        with self._lock:
+            self.base = base
+            self.coocurrencia = coocurrencia
+            self.usuarios = {}
+            self.modificados = set()
+            self._consolidando = set()
+            self.ultimo_id = ultimo_id
+            self.limite_estable = limite_estable
+            self._ids_recientes = set(recientes.tolist())
+            self._aplicadas_estables = aplicadas_estables
+            self.version += 1
+            self.metricas['cargas_completas'] += 1
+            # Lo registrado mientras se leía la tabla se recupera en la siguiente sincronización
+            self._ultima_sincronizacion = 0
+            self._ultima_verificacion = time.monotonic()
+
+    def _estado_usuario(self, usuario_id):
+        """Estado en memoria del usuario, construido desde la matriz base la primera vez que se pide"""
+        estado = self.usuarios.get(usuario_id)
+        if estado is not None:
+            return estado
+
+        estado = EstadoUsuario()
+        matriz = self.base.matriz
+        fila = matriz.fila_usuario.get(usuario_id)
+        if fila is not None:
+            preguntas_por_id = self.catalogo.obtener().por_id
+            inicio, fin = matriz.indptr[fila], matriz.indptr[fila + 1]
+            for columna, valor, intentos, fallos in zip(matriz.indices[inicio:fin], matriz.valores[inicio:fin],
+                                                        matriz.intentos[inicio:fin], matriz.fallos[inicio:fin]):
+                pregunta_id = int(matriz.preguntas[columna])
+                estado.preguntas[pregunta_id] = [int(intentos), int(fallos), int(valor), 0]
+                pregunta = preguntas_por_id.get(pregunta_id)
+                if pregunta is not None:
+                    totales = estado.categorias.setdefault(pregunta['Categorias_idCategorias'], [0, 0])
+                    totales[0] += int(intentos)
+                    totales[1] += int(intentos) - int(fallos)
+        self.usuarios[usuario_id] = estado
+        return estado
+
+    def _aplicar(self, id_respuesta, usuario_id, pregunta_id, correcta):
+        """Aplica una respuesta nueva; False si ya estaba aplicada"""
+        if id_respuesta <= self.limite_estable or id_respuesta in self._ids_recientes:
+            return False
+        self._ids_recientes.add(id_respuesta)
+        self.ultimo_id = max(self.ultimo_id, id_respuesta)
+
+        valor = 1 if correcta else 0
+        estado = self._estado_usuario(usuario_id)
+        estadisticas = estado.preguntas.get(pregunta_id)
+        anterior = estadisticas[2] if estadisticas is not None else None
+        if estadisticas is None:
+            estadisticas = estado.preguntas[pregunta_id] = [0, 0, valor, id_respuesta]
+        estadisticas[0] += 1
+        estadisticas[1] += 1 - valor
+        if id_respuesta < estadisticas[3]:
+            # Llega tarde una respuesta anterior a la última conocida: no cambia la última respuesta
+            valor = anterior
+        estadisticas[2] = valor
+        estadisticas[3] = max(estadisticas[3], id_respuesta)
+
+        pregunta = self.catalogo.obtener().por_id.get(pregunta_id)
+        if pregunta is not None:
+            totales = estado.categorias.setdefault(pregunta['Categorias_idCategorias'], [0, 0])
+            totales[0] += 1
+            totales[1] += 1 if correcta else 0
+
+        coocurrencia = self.coocurrencia
+        if not coocurrencia.desbordado:
+            otras, valores_otras = [], []
+            for otra_id, otra in estado.preguntas.items():
+                columna = coocurrencia.columna_pregunta.get(otra_id)
+                if otra_id != pregunta_id and columna is not None:
+                    otras.append(columna)
+                    valores_otras.append(otra[2])
+            coocurrencia.registrar(pregunta_id, valor, anterior,
+                                   np.asarray(otras, dtype=np.int64), np.asarray(valores_otras, dtype=np.int32))
+
+        self.modificados.add(usuario_id)
+        self.version += 1
+        return True
+
+    def _podar_ids(self):
+        """Olvida los ids que ya quedan fuera de la ventana de reordenación"""
+        limite = max(self.ultimo_id - VENTANA_REORDEN, self.limite_estable)
+        if limite == self.limite_estable:
+            return
+        antiguos = {i for i in self._ids_recientes if i <= limite}
+        self._ids_recientes -= antiguos
+        self._aplicadas_estables += len(antiguos)
+        self.limite_estable = limite
+
+    def suscribir(self, funcion):
+        """Llama a funcion(respuestas) con las respuestas (idRespuesta, usuario, pregunta, correcta) que se
+        aplican por primera vez, tanto las de /respuestas como las recuperadas al sincronizar"""
+        self._suscriptores.append(funcion)
+
+    def _avisar(self, nuevas):
+        # Fuera del lock: los suscriptores tienen el suyo propio
+        if nuevas:
+            for funcion in self._suscriptores:
+                funcion(nuevas)
+
+    def registrar(self, respuestas):
+        """Aplica respuestas (idRespuesta, usuario, pregunta, correcta); devuelve cuántas eran nuevas"""
+        if not self.cargada:
+            # La carga completa las leerá directamente de la tabla
+            return 0
+        with self._lock:
+            nuevas = [respuesta for respuesta in sorted(respuestas) if self._aplicar(*respuesta)]
+            self.metricas['registradas'] += len(nuevas)
+            self.metricas['duplicadas'] += len(respuestas) - len(nuevas)
+            self._podar_ids()
+        self._avisar(nuevas)
+        return len(nuevas)
+
+    def _sincronizar(self):
+        """Recupera las filas que no llegaron por /respuestas y detecta borrados en la tabla"""
+        filas = MatrizRespuestas.leer_respuestas(desde_id=self.limite_estable)
+        with self._lock:
+            respuestas = sorted((fila[3], fila[0], fila[1], bool(fila[2])) for fila in filas.tolist())
+            nuevas = [respuesta for respuesta in respuestas if self._aplicar(*respuesta)]
+            self.metricas['sincronizadas'] += len(nuevas)
+            self._podar_ids()
+            limite_estable = self.limite_estable
+            aplicadas_estables = self._aplicadas_estables
+        self._ultima_sincronizacion = time.monotonic()
+        self._avisar(nuevas)
+
+        if time.monotonic() - self._ultima_verificacion >= self.intervalo_verificacion:
+            connection = obtener_conexion()
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT COUNT(*) FROM Usuarios_has_Preguntas WHERE idRespuesta <= %s", (limite_estable,))
+                total = int(cursor.fetchone()[0])
+                if self.resumenes.disponible():
+                    # Las respuestas archivadas siguen contando en la matriz cargada desde los resúmenes
+                    total += respuestas_archivadas(cursor)
+            finally:
+                cursor.close()
+                connection.close()
+            self._ultima_verificacion = time.monotonic()
+            if total != aplicadas_estables:
+                # Se han borrado respuestas (o apareció alguna muy antigua): se recarga todo
+                self._cargar_completa()
+                return
+
+        if len(self.modificados) > self.max_modificados:
+            self._consolidar()
+
+    def _consolidar(self):
+        """Incorpora los usuarios modificados a una matriz base nueva"""
+        with self._lock:
+            consolidando = self._consolidando = self.modificados
+            self.modificados = set()
+            matriz = self.base.matriz
+            pares = [(usuario_id, pregunta_id, e[2], e[0], e[1])
+                     for usuario_id in consolidando
+                     for pregunta_id, e in self.usuarios[usuario_id].preguntas.items()]
+
+        filas = np.repeat(np.arange(len(matriz.usuarios)), np.diff(matriz.indptr))
+        usuarios_entradas = matriz.usuarios[filas]
+        conservar = ~np.isin(usuarios_entradas, np.fromiter(consolidando, dtype=np.int64, count=len(consolidando)))
+        nuevos = np.array(pares, dtype=np.int64).reshape(-1, 5)
+        nueva = MatrizRespuestas.desde_pares(
+            np.concatenate((usuarios_entradas[conservar], nuevos[:, 0])),
+            np.concatenate((matriz.preguntas[matriz.indices[conservar]], nuevos[:, 1])),
+            np.concatenate((matriz.valores[conservar], nuevos[:, 2])),
+            np.concatenate((matriz.intentos[conservar], nuevos[:, 3])),
+            np.concatenate((matriz.fallos[conservar], nuevos[:, 4]))
+        )
+        base = BaseRespuestas(nueva)
+
+        with self._lock:
+            self.base = base
+            self._consolidando = set()
+            # El estado de los usuarios no modificados desde entonces ya está en la base
+            self.usuarios = {u: e for u, e in self.usuarios.items() if u in self.modificados}
+            self.metricas['consolidaciones'] += 1
+
+    def actualizar(self):
+        """Carga las estadísticas la primera vez y, cada pocos segundos, las sincroniza con la tabla"""
+        if not self.cargada:
+            with self._lock_carga:
+                if not self.cargada:
+                    self._cargar_completa()
+        if time.monotonic() - self._ultima_sincronizacion < self.intervalo_sincronizacion:
+            return
+        # Si otro hilo ya está sincronizando se sigue con el estado actual
+        if self._lock_carga.acquire(blocking=False):
+            try:
+                self._sincronizar()
+            finally:
+                self._lock_carga.release()
+
+    def respuestas_usuario(self, usuario_id):
+        """Por pregunta respondida: (intentos, fallos, última respuesta)"""
+        self.actualizar()
+        with self._lock:
+            return {p: tuple(e[:3]) for p, e in self._estado_usuario(usuario_id).preguntas.items()}
+
+    def total_respuestas(self, usuario_id):
+        """Respuestas del usuario conocidas por el proceso; cambia con cada respuesta nueva, aunque la reciba otro"""
+        self.actualizar()
+        with self._lock:
+            return sum(e[0] for e in self._estado_usuario(usuario_id).preguntas.values())
+
+    def categorias_usuario(self, usuario_id):
+        """Por categoría: (respuestas totales, aciertos)"""
+        self.actualizar()
+        with self._lock:
+            return {c: tuple(t) for c, t in self._estado_usuario(usuario_id).categorias.items()}
+
+    def instantanea_usuarios(self):
+        """Matriz base y, de los usuarios con cambios posteriores, su última respuesta e intentos por pregunta"""
+        self.actualizar()
+        with self._lock:
+            cambios = {u: {p: (e[2], e[0]) for p, e in self.usuarios[u].preguntas.items()}
+                       for u in self.modificados | self._consolidando}
+            return self.base, cambios
+
+    def preguntas_similares(self, preguntas_base, excluidas):
+        """Similitud máxima de cada pregunta no excluida con las preguntas base (None si no hay contadores)"""
+        self.actualizar()
+        with self._lock:
+            if self.coocurrencia.desbordado:
+                return None
+            ids, similitudes = self.coocurrencia.similitudes(preguntas_base)
+        excluidas = set(excluidas) | set(preguntas_base)
+        return {pregunta: similitud for pregunta, similitud in zip(ids.tolist(), similitudes.tolist())
+                if similitud > 0 and pregunta not in excluidas}
+
+    def estado(self):
+        with self._lock:
+            return {
+                'cargada': self.cargada,
+                'version': self.version,
+                'ultimo_id': self.ultimo_id,
+                'usuarios_en_memoria': len(self.usuarios),
+                'usuarios_modificados': len(self.modificados),
+                'coocurrencia': bool(self.coocurrencia and not self.coocurrencia.desbordado),
+                **self.metricas
+            }
+
+
+def respuesta_desde_json(dato):
+    """Convierte {idRespuesta, usuarioId, idPregunta, acertada} en la tupla que espera registrar()"""
+    try:
+        return (int(dato['idRespuesta']), int(dato['usuarioId']), int(dato['idPregunta']), bool(dato['acertada']))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Cada respuesta necesita idRespuesta, usuarioId, idPregunta y acertada')
+
+
+_estadisticas = EstadisticasRespuestas()
+
+
+def obtener_estadisticas():
+    """Estadísticas de respuestas del proceso"""
+    return _estadisticas
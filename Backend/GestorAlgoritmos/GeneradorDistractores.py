@@ -0,0 +1,90 @@
+import random
+import threading
+from CatalogoPreguntas import obtener_catalogo
+
+# Políticas de selección de respuestas incorrectas
+POLITICA_GLOBAL = 'global'
+POLITICA_CATEGORIA = 'categoria'
+POLITICA_CATEGORIA_GLOBAL = 'categoria_global'
+
+
+class IndiceRespuestas:
+    """Respuestas distintas del catálogo, globales y por categoría, para una versión concreta"""
+
+    def __init__(self, instantanea):
+        self.version = instantanea.version
+        globales = set()
+        por_categoria = {}
+        for pregunta in instantanea.preguntas:
+            respuesta = pregunta['respuestaCorrecta']
+            if respuesta is None:
+                continue
+            globales.add(respuesta)
+            por_categoria.setdefault(pregunta['Categorias_idCategorias'], set()).add(respuesta)
+
+        self.globales = list(globales)
+        self.por_categoria = {categoria: list(respuestas) for categoria, respuestas in por_categoria.items()}
+
+
+class GeneradorDistractores:
+    """Genera respuestas incorrectas únicas en tiempo esperado constante a partir de un índice precalculado"""
+
+    def __init__(self, catalogo=None):
+        self.catalogo = catalogo or obtener_catalogo()
+        self._indice = None
+        self._lock = threading.Lock()
+
+    def obtener_indice(self):
+        """Índice de respuestas de la versión vigente del catálogo, reconstruido solo cuando cambia"""
+        instantanea = self.catalogo.obtener()
+        indice = self._indice
+        if indice is None or indice.version != instantanea.version:
+            with self._lock:
+                if self._indice is None or self._indice.version != instantanea.version:
+                    self._indice = IndiceRespuestas(instantanea)
+                indice = self._indice
+        return indice
+
+    def _muestrear(self, respuestas, cantidad, excluidas):
+        """Elige hasta `cantidad` respuestas distintas de la lista que no estén en `excluidas`"""
+        if cantidad <= 0 or not respuestas:
+            return []
+
+        # Con pocas respuestas el muestreo por rechazo no compensa: se filtra la lista directamente
+        if len(respuestas) <= 2 * (cantidad + len(excluidas)):
+            candidatas = [r for r in respuestas if r not in excluidas]
+            return random.sample(candidatas, min(cantidad, len(candidatas)))
+
+        # Al menos la mitad de la lista es válida, así que cada intento acierta con probabilidad >= 1/2
+        elegidas = []
+        while len(elegidas) < cantidad:
+            respuesta = respuestas[random.randrange(len(respuestas))]
+            if respuesta not in excluidas and respuesta not in elegidas:
+                elegidas.append(respuesta)
+        return elegidas
+
+    def generar(self, pregunta, politica=POLITICA_GLOBAL, cantidad=3):
+        """Devuelve `cantidad` respuestas incorrectas para la pregunta según la política indicada"""
+        indice = self.obtener_indice()
+        excluidas = {pregunta['respuestaCorrecta']}
+
+        if politica == POLITICA_GLOBAL:
+            return self._muestrear(indice.globales, cantidad, excluidas)
+
+        respuestas_categoria = indice.por_categoria.get(pregunta['Categorias_idCategorias'], [])
+        elegidas = self._muestrear(respuestas_categoria, cantidad, excluidas)
+
+        if politica == POLITICA_CATEGORIA_GLOBAL and len(elegidas) < cantidad:
+            # Completar con respuestas de otras categorías
+            excluidas.update(elegidas)
+            elegidas += self._muestrear(indice.globales, cantidad - len(elegidas), excluidas)
+
+        return elegidas
+
+
+_generador = GeneradorDistractores()
+
+
+def obtener_generador_distractores():
+    """Generador de distractores del proceso"""
+    return _generador
@@ -0,0 +1,97 @@
+import os
+import time
+import numpy as np
+
+# Semilla fija para que todos los procesos generen las mismas funciones hash
+SEMILLA = 20240917
+
+
+class IndiceLSHUsuarios:
+    """Índice MinHash con bandas LSH sobre los perfiles de respuesta de los usuarios.
+
+    Cada usuario es el conjunto de fichas (pregunta, acierto/fallo) de sus últimas respuestas.
+    Dos usuarios caen en el mismo cubo de una banda cuando coinciden las `filas` firmas MinHash
+    de esa banda; con más bandas se encuentran más vecinos (recall) a cambio de más candidatos.
+    El índice solo guarda los ids de usuario, así que puede seguir usándose con una matriz más nueva.
+    """
+
+    def __init__(self, matriz, bandas=None, filas=None, tamano_lote=32000000):
+        self.creado = time.monotonic()
+        self.bandas = bandas or int(os.getenv('LSH_BANDAS', 32))
+        self.filas = filas or int(os.getenv('LSH_FILAS', 2))
+
+        generador = np.random.default_rng(SEMILLA)
+        total_hashes = self.bandas * self.filas
+        # Hash multiplicativo en 64 bits (multiplicador impar, se queda con los 32 bits altos)
+        self._a = generador.integers(1, 2 ** 63, total_hashes, dtype=np.uint64) | np.uint64(1)
+        self._b = generador.integers(0, 2 ** 63, total_hashes, dtype=np.uint64)
+        self._mezcla = generador.integers(1, 2 ** 63, self.filas, dtype=np.uint64) | np.uint64(1)
+
+        self.usuarios = matriz.usuarios
+        self.columna_pregunta = matriz.columna_pregunta
+        total_usuarios = len(matriz.usuarios)
+        claves = np.zeros((self.bandas, total_usuarios), dtype=np.uint32)
+        fichas = self._fichas(matriz.indices, matriz.valores)
+        longitudes = np.diff(matriz.indptr)
+
+        # Solo hay 2 fichas por pregunta: se calculan sus hashes una vez y después basta con indexar
+        self._tabla = self._hashes(np.arange(2 * len(matriz.preguntas), dtype=np.uint64))
+
+        # Las firmas se calculan por lotes de filas para no materializar entradas × hashes de golpe
+        entradas_lote = max(tamano_lote // total_hashes, 1)
+        acumulado = matriz.indptr[1:]
+        cortes = np.searchsorted(acumulado, np.arange(entradas_lote, acumulado[-1] if total_usuarios else 0, entradas_lote))
+        limites = np.unique(np.concatenate(([0], cortes, [total_usuarios])))
+        for inicio, fin in zip(limites[:-1], limites[1:]):
+            e0, e1 = matriz.indptr[inicio], matriz.indptr[fin]
+            if e0 == e1:
+                continue
+            hashes = self._tabla[fichas[e0:e1]]
+            con_respuestas = np.flatnonzero(longitudes[inicio:fin] > 0)
+            firmas = np.minimum.reduceat(hashes, matriz.indptr[inicio:fin][con_respuestas] - e0, axis=0)
+            claves[:, inicio + con_respuestas] = self._claves(firmas).T
+
+        # Los usuarios sin respuestas no tienen firma: se dejan fuera de los cubos
+        activos = np.flatnonzero(longitudes > 0)
+        claves = claves[:, activos]
+        orden = np.argsort(claves, axis=1, kind='stable')
+        self._orden = activos[orden].astype(np.int32)
+        self._claves_ordenadas = np.take_along_axis(claves, orden, axis=1)
+
+    @staticmethod
+    def _fichas(columnas, valores):
+        return columnas.astype(np.uint64) * np.uint64(2) + valores.astype(np.uint64)
+
+    def _hashes(self, fichas):
+        return ((fichas[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)).astype(np.uint32)
+
+    def _claves(self, firmas):
+        """Clave de cubo de cada banda a partir de sus `filas` firmas"""
+        bloques = firmas.reshape(len(firmas), self.bandas, self.filas).astype(np.uint64)
+        return ((bloques * self._mezcla).sum(axis=2) >> np.uint64(32)).astype(np.uint32)
+
+    def candidatos(self, respuestas, maximo=None):
+        """Ids de usuario que comparten cubo con el perfil {pregunta: última respuesta}, priorizando
+        los que coinciden en más bandas"""
+        maximo = maximo or int(os.getenv('LSH_MAX_CANDIDATOS', 2000))
+        columnas = [self.columna_pregunta[p] for p in respuestas if p in self.columna_pregunta]
+        if not columnas:
+            return np.empty(0, dtype=np.int64)
+        valores = [respuestas[p] or 0 for p in respuestas if p in self.columna_pregunta]
+
+        firma = self._tabla[self._fichas(np.asarray(columnas), np.asarray(valores))].min(axis=0)
+        claves = self._claves(firma[None, :])[0]
+
+        encontrados = []
+        for banda, clave in enumerate(claves):
+            ordenadas = self._claves_ordenadas[banda]
+            inicio = np.searchsorted(ordenadas, clave, side='left')
+            fin = np.searchsorted(ordenadas, clave, side='right')
+            encontrados.append(self._orden[banda, inicio:fin])
+        if not encontrados:
+            return np.empty(0, dtype=np.int64)
+
+        filas, coincidencias = np.unique(np.concatenate(encontrados), return_counts=True)
+        if len(filas) > maximo:
+            filas = filas[np.argpartition(-coincidencias, maximo - 1)[:maximo]]
+        return self.usuarios[filas]
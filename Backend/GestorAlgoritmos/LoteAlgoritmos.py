@@ -0,0 +1,137 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PoolConexiones import obtener_pool, mediciones_actuales, heredar_mediciones, cerrar_medicion
+from CatalogoPreguntas import obtener_catalogo
+
+_conexiones_lote = None
+_lock_conexiones_lote = threading.Lock()
+
+
+def conexiones_lote():
+    """Semáforo del proceso con las conexiones del pool que pueden ocupar a la vez los hilos de todos los lotes.
+
+    Cada hilo de un lote toma su propia conexión además de la que ya tiene la petición que lo lanzó, así
+    que sin este límite dos lotes simultáneos podrían agotar el pool y el resto de peticiones del worker
+    (y los hilos de precarga y de rankings) fallarían con PoolError. Por defecto es un tercio del pool
+    (LOTE_MAX_CONEXIONES): con DB_POOL_SIZE=10 y GUNICORN_THREADS=4 quedan 3 para los lotes, 4 para las
+    peticiones y 3 para los hilos en segundo plano.
+    """
+    global _conexiones_lote
+    if _conexiones_lote is None:
+        with _lock_conexiones_lote:
+            if _conexiones_lote is None:
+                maximo = int(os.getenv('LOTE_MAX_CONEXIONES', max(obtener_pool().tamano // 3, 1)))
+                _conexiones_lote = threading.BoundedSemaphore(maximo)
+                _conexiones_lote.maximo = maximo
+    return _conexiones_lote
+
+
+class LoteAlgoritmos:
+    """Ejecuta de una vez muchos trabajos (algoritmo, usuario, parámetros), p. ej. los quizzes diarios.
+
+    Los trabajos se agrupan por algoritmo: cada algoritmo usa en el lote una copia de su instancia
+    del registro y, si implementa precargar(usuarios_ids), obtiene los datos de todos sus usuarios con
+    consultas IN en lugar de una consulta por usuario. Después los trabajos se reparten entre varios
+    hilos, cada uno con su propia conexión del pool, y el fallo de un trabajo no afecta a los demás.
+    Las conexiones que usan a la vez todos los lotes del proceso están limitadas por conexiones_lote().
+    """
+
+    def __init__(self, registro, hilos=None, max_trabajos=None, tamano_precarga=500):
+        self.registro = registro
+        # Más hilos que conexiones disponibles para lotes solo esperarían al semáforo
+        self.hilos = hilos or int(os.getenv('LOTE_HILOS', conexiones_lote().maximo))
+        self.max_trabajos = max_trabajos or int(os.getenv('LOTE_MAX_TRABAJOS', 1000))
+        self.tamano_precarga = tamano_precarga
+
+    def validar(self, trabajos):
+        """Comprueba la forma del lote; lanza ValueError con el motivo si no es válido"""
+        if not isinstance(trabajos, list) or not trabajos:
+            raise ValueError('Se debe proporcionar una lista de trabajos')
+        if len(trabajos) > self.max_trabajos:
+            raise ValueError(f'Un lote admite como máximo {self.max_trabajos} trabajos')
+        for indice, trabajo in enumerate(trabajos):
+            if not isinstance(trabajo, dict):
+                raise ValueError(f'El trabajo {indice} debe ser un objeto')
+            if not isinstance(trabajo.get('params', {}), dict):
+                raise ValueError(f'Los params del trabajo {indice} deben ser un objeto')
+
+    def _precargar(self, instancia, usuarios_ids):
+        """Carga en bloque los datos de los usuarios; si falla, cada trabajo hará su consulta individual"""
+        usuarios_ids = sorted(usuarios_ids)
+        precargadas = {}
+        try:
+            for i in range(0, len(usuarios_ids), self.tamano_precarga):
+                instancia.precargar(usuarios_ids[i:i + self.tamano_precarga])
+                # Algunos algoritmos solo calientan cachés compartidas (p. ej. los bitmaps de respondidas)
+                precargadas.update(getattr(instancia, '_precargadas', {}))
+            if hasattr(instancia, '_precargadas'):
+                instancia._precargadas = precargadas
+        except Exception:
+            if hasattr(instancia, '_precargadas'):
+                instancia._precargadas = {}
+
+    def _ejecutar_trabajo(self, indice, trabajo, instancias, mediciones):
+        # Las consultas del trabajo cuentan en la medición de la petición que lanzó el lote
+        token = heredar_mediciones(mediciones)
+        try:
+            return self._ejecutar_trabajo_medido(indice, trabajo, instancias)
+        finally:
+            cerrar_medicion(token)
+
+    def _ejecutar_trabajo_medido(self, indice, trabajo, instancias):
+        slug = trabajo.get('algoritmo')
+        usuario_id = trabajo.get('usuario_id')
+        salida = {'indice': indice, 'algoritmo': slug, 'usuario_id': usuario_id}
+
+        instancia = instancias.get(slug)
+        if instancia is None:
+            return {**salida, 'success': False, 'error': f'Algoritmo desconocido: {slug}'}
+
+        data = dict(trabajo.get('params') or {})
+        if usuario_id is not None:
+            data['usuario_id'] = usuario_id
+        try:
+            with conexiones_lote(), obtener_pool().ambito():
+                resultado = self.registro.ejecutar(slug, data, instancia)
+        except Exception as e:
+            return {**salida, 'success': False, 'error': str(e)}
+        # Los algoritmos señalan sus errores en el propio resultado
+        return {**salida, 'success': resultado.get('estado') != 'error', 'resultado': resultado}
+
+    def ejecutar(self, trabajos):
+        self.validar(trabajos)
+
+        # Un lote suele repetir pocos algoritmos con muchos usuarios: se agrupan para compartir la carga
+        usuarios_por_algoritmo = {}
+        for trabajo in trabajos:
+            slug = trabajo.get('algoritmo')
+            if slug not in self.registro:
+                continue
+            usuarios = usuarios_por_algoritmo.setdefault(slug, set())
+            if isinstance(trabajo.get('usuario_id'), int):
+                usuarios.add(trabajo['usuario_id'])
+
+        obtener_catalogo().obtener()
+        instancias = {}
+        with obtener_pool().ambito():
+            for slug, usuarios_ids in usuarios_por_algoritmo.items():
+                instancia = self.registro.nueva(slug)
+                if usuarios_ids and hasattr(instancia, 'precargar'):
+                    self._precargar(instancia, usuarios_ids)
+                instancias[slug] = instancia
+
+        mediciones = mediciones_actuales()
+        with ThreadPoolExecutor(max_workers=min(self.hilos, len(trabajos))) as ejecutor:
+            resultados = list(ejecutor.map(
+                lambda par: self._ejecutar_trabajo(par[0], par[1], instancias, mediciones),
+                enumerate(trabajos)
+            ))
+
+        completados = sum(1 for r in resultados if r['success'])
+        return {
+            'resultados': resultados,
+            'total': len(resultados),
+            'completados': completados,
+            'fallidos': len(resultados) - completados
+        }
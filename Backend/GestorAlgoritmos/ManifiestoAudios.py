@@ -0,0 +1,232 @@
+import os
+import time
+import wave
+import struct
+import hashlib
+import threading
+from urllib.parse import quote
+
+# Tipos MIME de los formatos de audio que se sirven; mimetypes no conoce todos (p. ej. .m4a)
+TIPOS_AUDIO = {
+    '.m4a': 'audio/mp4',
+    '.mp4': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg',
+    '.oga': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.flac': 'audio/flac',
+    '.webm': 'audio/webm'
+}
+
+
+def _directorio_por_defecto():
+    # Mismos sitios en los que busca los audios GestionarPreguntas
+    candidatos = [
+        os.path.join(os.getcwd(), 'Audios'),
+        '/app/Audios',
+        '/Audios',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Audios')
+    ]
+    for candidato in candidatos:
+        if os.path.isdir(candidato):
+            return os.path.normpath(candidato)
+    return candidatos[0]
+
+
+def duracion_mp4(f):
+    """Duración en segundos de un MP4/M4A, leída de la caja mvhd dentro de moov (None si no está)"""
+    f.seek(0, os.SEEK_END)
+    fin = f.tell()
+    inicio, limite = 0, fin
+    while inicio + 8 <= limite:
+        f.seek(inicio)
+        tamano, tipo = struct.unpack('>I4s', f.read(8))
+        cabecera = 8
+        if tamano == 1:
+            tamano = struct.unpack('>Q', f.read(8))[0]
+            cabecera = 16
+        elif tamano == 0:
+            tamano = limite - inicio
+        if tamano < cabecera:
+            return None
+        if tipo == b'moov':
+            # Se recorren las cajas hijas de moov
+            inicio, limite = inicio + cabecera, inicio + tamano
+            continue
+        if tipo == b'mvhd':
+            version = f.read(1)[0]
+            if version == 1:
+                f.read(3 + 16)
+                escala, duracion = struct.unpack('>IQ', f.read(12))
+            else:
+                f.read(3 + 8)
+                escala, duracion = struct.unpack('>II', f.read(8))
+            return round(duracion / escala, 3) if escala else None
+        inicio += tamano
+    return None
+
+
+def duracion_wav(ruta):
+    with wave.open(ruta, 'rb') as audio:
+        return round(audio.getnframes() / audio.getframerate(), 3) if audio.getframerate() else None
+
+
+def describir_audio(ruta):
+    """Tamaño, hash SHA-256 del contenido y duración de un fichero de audio"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+        extension = os.path.splitext(ruta)[1].lower()
+        duracion = None
+        try:
+            if extension in ('.m4a', '.mp4'):
+                duracion = duracion_mp4(f)
+            elif extension == '.wav':
+                duracion = duracion_wav(ruta)
+        except (OSError, EOFError, struct.error, wave.Error, IndexError):
+            # Fichero truncado o con un formato inesperado: se sirve igual, sin duración
+            duracion = None
+    return sha.hexdigest(), duracion
+
+
+class ManifiestoAudios:
+    """Índice del árbol Audios/: tamaño, duración, hash del contenido y tipo MIME de cada fichero.
+
+    Con el hash se construye una URL versionada (`?v=`) que cambia en cuanto cambia el contenido, así que
+    los clientes pueden descargar en paralelo los audios del quiz y guardarlos en caché indefinidamente.
+    El directorio se vuelve a recorrer cada `intervalo_verificacion` segundos (y al invalidar el catálogo);
+    solo se vuelven a leer los ficheros cuyo tamaño o fecha de modificación han cambiado.
+    """
+
+    def __init__(self, directorio=None, url_base=None, intervalo_verificacion=None):
+        self.directorio = directorio or os.getenv('AUDIOS_DIR') or _directorio_por_defecto()
+        self.url_base = (url_base or os.getenv('AUDIOS_URL_BASE', 'http://localhost:3012/audio')).rstrip('/')
+        self.intervalo_verificacion = (intervalo_verificacion if intervalo_verificacion is not None
+                                       else float(os.getenv('AUDIOS_CHECK_INTERVAL', 60)))
+
+        # ruta relativa -> descripción del audio
+        self._audios = {}
+        # ruta relativa -> (tamaño, mtime_ns) con el que se calculó su descripción
+        self._firmas = {}
+        self.version = None
+        self._ultima_verificacion = None
+        self._lock = threading.Lock()
+
+        self.metricas = {
+            'escaneos': 0,
+            'ficheros_leidos': 0,
+            'errores': 0
+        }
+
+    @staticmethod
+    def normalizar(ruta):
+        """Ruta relativa con barras normales, como la guardan las preguntas (a veces con barras invertidas)"""
+        return str(ruta).replace('\\', '/').lstrip('/')
+
+    def _escanear(self):
+        audios = {}
+        firmas = {}
+        leidos = 0
+        errores = 0
+        for raiz, _, ficheros in os.walk(self.directorio):
+            for fichero in ficheros:
+                extension = os.path.splitext(fichero)[1].lower()
+                if extension not in TIPOS_AUDIO:
+                    continue
+                completa = os.path.join(raiz, fichero)
+                ruta = self.normalizar(os.path.relpath(completa, self.directorio))
+                try:
+                    estado = os.stat(completa)
+                except OSError:
+                    continue
+                firma = (estado.st_size, estado.st_mtime_ns)
+                if self._firmas.get(ruta) == firma:
+                    audios[ruta] = self._audios[ruta]
+                    firmas[ruta] = firma
+                    continue
+                try:
+                    contenido, duracion = describir_audio(completa)
+                except OSError:
+                    errores += 1
+                    continue
+                leidos += 1
+                audios[ruta] = {
+                    'ruta': ruta,
+                    'url': f'{self.url_base}/{quote(ruta)}?v={contenido[:16]}',
+                    'bytes': estado.st_size,
+                    'duracion': duracion,
+                    'hash': f'sha256:{contenido}',
+                    'tipo': TIPOS_AUDIO[extension]
+                }
+                firmas[ruta] = firma
+
+        version = hashlib.sha256(''.join(f'{r}:{audios[r]["hash"]};' for r in sorted(audios)).encode()).hexdigest()
+        self._audios = audios
+        self._firmas = firmas
+        self.version = version[:16]
+        self.metricas['escaneos'] += 1
+        self.metricas['ficheros_leidos'] += leidos
+        self.metricas['errores'] += errores
+
+    def actualizar(self, forzar=False):
+        """Vuelve a recorrer el directorio si ha pasado el intervalo de verificación (o si se fuerza)"""
+        ahora = time.monotonic()
+        if (not forzar and self._ultima_verificacion is not None
+                and ahora - self._ultima_verificacion < self.intervalo_verificacion):
+            return
+        with self._lock:
+            if (not forzar and self._ultima_verificacion is not None
+                    and time.monotonic() - self._ultima_verificacion < self.intervalo_verificacion):
+                return
+            self._escanear()
+            self._ultima_verificacion = time.monotonic()
+
+    def invalidar(self):
+        """Fuerza un nuevo recorrido en el siguiente uso, p. ej. tras añadir o cambiar preguntas"""
+        self._ultima_verificacion = None
+
+    def obtener(self, ruta):
+        """Descripción del audio de una pregunta (urlAudio), o None si no está en el directorio"""
+        self.actualizar()
+        return self._audios.get(self.normalizar(ruta))
+
+    def anotar(self, pregunta):
+        """Copia de la pregunta formateada con los datos de su audio en 'audio'"""
+        return {**pregunta, 'audio': self.obtener(pregunta.get('urlAudio', ''))}
+
+    def anotar_partes(self, partes):
+        """Añade los datos del audio a cada pregunta de un generador de partes (PartesQuiz)"""
+        for tipo, contenido in partes:
+            yield tipo, (self.anotar(contenido) if tipo == 'pregunta' else contenido)
+
+    def anotar_resultado(self, resultado):
+        """Resultado de un algoritmo con los datos del audio en cada pregunta"""
+        if not isinstance(resultado, dict) or not resultado.get('preguntas'):
+            return resultado
+        return {**resultado, 'preguntas': [self.anotar(pregunta) for pregunta in resultado['preguntas']]}
+
+    def manifiesto(self):
+        """Todos los audios con su versión conjunta (cambia si cambia cualquier fichero)"""
+        self.actualizar()
+        return {'version': self.version, 'audios': sorted(self._audios.values(), key=lambda audio: audio['ruta'])}
+
+    def estado(self):
+        """Directorio, número de audios y contadores para monitorización"""
+        return {
+            'directorio': self.directorio,
+            'audios': len(self._audios),
+            'bytes': sum(audio['bytes'] for audio in self._audios.values()),
+            'version': self.version,
+            **self.metricas
+        }
+
+
+_manifiesto_audios = ManifiestoAudios()
+
+
+def obtener_manifiesto_audios():
+    """Manifiesto de audios del proceso"""
+    return _manifiesto_audios
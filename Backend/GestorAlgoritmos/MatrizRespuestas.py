@@ -0,0 +1,178 @@
+import numpy as np
+from PoolConexiones import obtener_conexion
+from ResumenesUsuario import obtener_resumenes
+
+
+class MatrizRespuestas:
+    """Matriz dispersa usuarios × preguntas en formato CSR con la última respuesta de cada usuario a cada pregunta"""
+
+    def __init__(self, usuarios, preguntas, indptr, indices, valores, intentos, fallos):
+        # Fila i -> usuarios[i], columna j -> preguntas[j]
+        self.usuarios = usuarios
+        self.preguntas = preguntas
+        self.indptr = indptr
+        self.indices = indices
+        self.valores = valores
+        self.intentos = intentos
+        self.fallos = fallos
+        self.fila_usuario = {int(u): i for i, u in enumerate(usuarios)}
+        self.columna_pregunta = {int(p): j for j, p in enumerate(preguntas)}
+
+    @property
+    def forma(self):
+        return (len(self.usuarios), len(self.preguntas))
+
+    @classmethod
+    def desde_respuestas(cls, usuarios, preguntas, correctas, orden=None):
+        """Construye la matriz a partir de respuestas sueltas; `orden` decide cuál es la última (p. ej. idRespuesta)"""
+        usuarios = np.asarray(usuarios, dtype=np.int64)
+        preguntas = np.asarray(preguntas, dtype=np.int64)
+        correctas = np.asarray(correctas, dtype=np.int8)
+        if orden is None:
+            orden = np.arange(len(usuarios))
+        orden = np.asarray(orden, dtype=np.int64)
+
+        # Ordenar por (usuario, pregunta, orden) y quedarse con la última respuesta de cada par
+        permutacion = np.lexsort((orden, preguntas, usuarios))
+        usuarios = usuarios[permutacion]
+        preguntas = preguntas[permutacion]
+        correctas = correctas[permutacion]
+
+        if len(usuarios):
+            cambio = np.empty(len(usuarios), dtype=bool)
+            cambio[:-1] = (usuarios[1:] != usuarios[:-1]) | (preguntas[1:] != preguntas[:-1])
+            cambio[-1] = True
+            ultimos = np.flatnonzero(cambio)
+            primeros = np.concatenate(([0], ultimos[:-1] + 1))
+            fallos = np.add.reduceat(1 - correctas.astype(np.int32), primeros)
+        else:
+            ultimos = primeros = fallos = np.empty(0, dtype=np.int64)
+
+        return cls.desde_pares(usuarios[ultimos], preguntas[ultimos], correctas[ultimos],
+                               ultimos - primeros + 1, fallos)
+
+    @classmethod
+    def desde_pares(cls, usuarios, preguntas, valores, intentos, fallos):
+        """Construye la matriz a partir de pares (usuario, pregunta) ya agregados y sin repetir"""
+        usuarios = np.asarray(usuarios, dtype=np.int64)
+        preguntas = np.asarray(preguntas, dtype=np.int64)
+
+        ids_usuarios, filas = np.unique(usuarios, return_inverse=True)
+        ids_preguntas, columnas = np.unique(preguntas, return_inverse=True)
+        permutacion = np.lexsort((columnas, filas))
+
+        indptr = np.zeros(len(ids_usuarios) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(filas, minlength=len(ids_usuarios)), out=indptr[1:])
+
+        return cls(ids_usuarios, ids_preguntas, indptr,
+                   columnas[permutacion].astype(np.int32),
+                   np.asarray(valores, dtype=np.int8)[permutacion],
+                   np.asarray(intentos, dtype=np.int32)[permutacion],
+                   np.asarray(fallos, dtype=np.int32)[permutacion])
+
+    @staticmethod
+    def leer_respuestas(desde_id=None, tamano_lote=100000):
+        """Filas (usuario, pregunta, correcta, idRespuesta) de Usuarios_has_Preguntas, leídas por lotes"""
+        connection = obtener_conexion()
+        cursor = connection.cursor()
+        try:
+            query = """
+                SELECT Usuarios_idUsuario, Preguntas_idPregunta, COALESCE(respuestaCorrecta, 0), idRespuesta
+                FROM Usuarios_has_Preguntas
+            """
+            if desde_id is None:
+                cursor.execute(query)
+            else:
+                cursor.execute(query + " WHERE idRespuesta > %s ORDER BY idRespuesta", (desde_id,))
+            bloques = []
+            while True:
+                filas = cursor.fetchmany(tamano_lote)
+                if not filas:
+                    break
+                bloques.append(np.array(filas, dtype=np.int64))
+        finally:
+            cursor.close()
+            connection.close()
+
+        return np.concatenate(bloques) if bloques else np.empty((0, 4), dtype=np.int64)
+
+    @staticmethod
+    def leer_resumenes(ventana, tamano_lote=100000):
+        """Pares (usuario, pregunta, última respuesta, intentos, fallos) de ResumenUsuarioPregunta, los idRespuesta
+        posteriores a ultimo_id - ventana y ultimo_id, todo leído en la misma instantánea de la base de datos.
+
+        Los resúmenes incluyen las respuestas archivadas, así que la matriz no pierde historial al compactar.
+        """
+        connection = obtener_conexion()
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction(consistent_snapshot=True, readonly=True)
+            try:
+                # Las respuestas sin corregir cuentan como fallo, igual que en desde_respuestas
+                cursor.execute("""
+                    SELECT Usuarios_idUsuario, Preguntas_idPregunta, ultimaRespuesta, intentos, intentos - aciertos
+                    FROM ResumenUsuarioPregunta
+                """)
+                bloques = []
+                while True:
+                    filas = cursor.fetchmany(tamano_lote)
+                    if not filas:
+                        break
+                    bloques.append(np.array(filas, dtype=np.int64))
+                cursor.execute("""
+                    SELECT GREATEST(
+                        (SELECT COALESCE(MAX(idRespuesta), 0) FROM Usuarios_has_Preguntas),
+                        (SELECT COALESCE(MAX(ultimoIdRespuesta), 0) FROM ResumenUsuarioPregunta)
+                    )
+                """)
+                ultimo_id = int(cursor.fetchone()[0])
+                cursor.execute("SELECT idRespuesta FROM Usuarios_has_Preguntas WHERE idRespuesta > %s",
+                               (max(ultimo_id - ventana, 0),))
+                recientes = np.array([fila[0] for fila in cursor.fetchall()], dtype=np.int64)
+            finally:
+                connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+        pares = np.concatenate(bloques) if bloques else np.empty((0, 5), dtype=np.int64)
+        return pares, recientes, ultimo_id
+
+    @classmethod
+    def cargar(cls, tamano_lote=100000):
+        """Construye la matriz desde los resúmenes por usuario y pregunta o, sin ellos, leyendo
+        Usuarios_has_Preguntas una sola vez, por lotes"""
+        if obtener_resumenes().disponible():
+            pares, _, _ = cls.leer_resumenes(0, tamano_lote=tamano_lote)
+            return cls.desde_pares(pares[:, 0], pares[:, 1], pares[:, 2], pares[:, 3], pares[:, 4])
+        datos = cls.leer_respuestas(tamano_lote=tamano_lote)
+        return cls.desde_respuestas(datos[:, 0], datos[:, 1], datos[:, 2], orden=datos[:, 3])
+
+    def fila(self, usuario_id):
+        """Columnas y valores de la fila de un usuario (arrays vacíos si no existe)"""
+        i = self.fila_usuario.get(usuario_id)
+        if i is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int8)
+        inicio, fin = self.indptr[i], self.indptr[i + 1]
+        return self.indices[inicio:fin], self.valores[inicio:fin]
+
+    def transpuesta(self):
+        """Misma información en orden preguntas × usuarios (CSC de la original)"""
+        filas = np.repeat(np.arange(len(self.usuarios), dtype=np.int32), np.diff(self.indptr))
+        permutacion = np.argsort(self.indices, kind='stable')
+        indptr = np.zeros(len(self.preguntas) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=len(self.preguntas)), out=indptr[1:])
+        return MatrizRespuestas(self.preguntas, self.usuarios, indptr, filas[permutacion],
+                                self.valores[permutacion], self.intentos[permutacion],
+                                self.fallos[permutacion])
+
+
+def posiciones_de_filas(indptr, filas):
+    """Posiciones en indices/valores de todas las entradas de las filas dadas, concatenadas"""
+    inicios = indptr[filas]
+    longitudes = indptr[np.asarray(filas) + 1] - inicios
+    total = int(longitudes.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), longitudes
+    desplazamientos = np.repeat(inicios - np.concatenate(([0], np.cumsum(longitudes)[:-1])), longitudes)
+    return np.arange(total, dtype=np.int64) + desplazamientos, longitudes
@@ -0,0 +1,189 @@
+import os
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from PoolConexiones import obtener_pool, observar_consultas
+
+# Con gunicorn se define PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py): los contadores e histogramas de
+# todos los workers se suman al exponerlos. El estado del pool y de las cachés es de cada proceso y se
+# publica con la etiqueta pid del worker que atiende la petición a /metrics.
+
+BUCKETS_SEGUNDOS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+ejecuciones_algoritmo = Counter(
+    'gestor_algoritmo_ejecuciones_total', 'Ejecuciones de cada algoritmo por estado del resultado',
+    ['algoritmo', 'estado'])
+duracion_algoritmo = Histogram(
+    'gestor_algoritmo_duracion_segundos', 'Duración de cada ejecución de un algoritmo',
+    ['algoritmo'], buckets=BUCKETS_SEGUNDOS)
+consultas_algoritmo = Histogram(
+    'gestor_algoritmo_consultas_db', 'Consultas SQL por ejecución de un algoritmo',
+    ['algoritmo'], buckets=BUCKETS_CONSULTAS)
+tiempo_db_algoritmo = Histogram(
+    'gestor_algoritmo_db_segundos', 'Tiempo en base de datos por ejecución de un algoritmo',
+    ['algoritmo'], buckets=BUCKETS_SEGUNDOS)
+
+peticiones_http = Counter(
+    'gestor_http_peticiones_total', 'Peticiones HTTP por endpoint y código de respuesta',
+    ['endpoint', 'metodo', 'codigo'])
+duracion_http = Histogram(
+    'gestor_http_duracion_segundos', 'Duración de las peticiones HTTP',
+    ['endpoint'], buckets=BUCKETS_SEGUNDOS)
+consultas_http = Histogram(
+    'gestor_http_consultas_db', 'Consultas SQL por petición HTTP',
+    ['endpoint'], buckets=BUCKETS_CONSULTAS)
+tiempo_db_http = Histogram(
+    'gestor_http_db_segundos', 'Tiempo en base de datos por petición HTTP',
+    ['endpoint'], buckets=BUCKETS_SEGUNDOS)
+
+consultas_db = Counter('gestor_db_consultas_total', 'Sentencias SQL ejecutadas (incluye tareas en segundo plano)')
+tiempo_db = Counter('gestor_db_segundos_total', 'Tiempo total en base de datos')
+
+
+def _observar_consulta(duracion):
+    consultas_db.inc()
+    tiempo_db.inc(duracion)
+
+
+def observar_ejecucion(slug, estado, segundos, db):
+    """Observador de RegistroAlgoritmos.ejecutar"""
+    ejecuciones_algoritmo.labels(slug, estado).inc()
+    duracion_algoritmo.labels(slug).observe(segundos)
+    consultas_algoritmo.labels(slug).observe(db['consultas'])
+    tiempo_db_algoritmo.labels(slug).observe(db['segundos'])
+
+
+def observar_peticion(endpoint, metodo, codigo, segundos, db):
+    """Registra una petición HTTP; endpoint es la regla de la ruta, no la URL, para acotar las series"""
+    peticiones_http.labels(endpoint, metodo, str(codigo)).inc()
+    duracion_http.labels(endpoint).observe(segundos)
+    consultas_http.labels(endpoint).observe(db['consultas'])
+    tiempo_db_http.labels(endpoint).observe(db['segundos'])
+
+
+class ColectorEstado:
+    """Estado del proceso en el momento de la consulta: pool de conexiones, cachés y colas"""
+
+    def collect(self):
+        from CatalogoPreguntas import obtener_catalogo
+        from EstadisticasRespuestas import obtener_estadisticas
+        from PrecargaQuizzes import obtener_precarga
+        from CacheRankings import obtener_cache_rankings
+        from BitmapsRespondidas import obtener_bitmaps_respondidas
+        from PreguntasServidas import obtener_preguntas_servidas
+        from ColaRepasos import obtener_cola_repasos
+        from ManifiestoAudios import obtener_manifiesto_audios
+        from RegistroAlgoritmos import obtener_registro
+
+        pid = str(os.getpid())
+
+        pool = obtener_pool().estado()
+        conexiones = GaugeMetricFamily('gestor_pool_conexiones', 'Conexiones del pool por estado', labels=['pid', 'estado'])
+        for estado in ('creadas', 'libres', 'en_uso'):
+            conexiones.add_metric([pid, estado], pool[estado])
+        yield conexiones
+        yield self._gauge('gestor_pool_tamano', 'Tamaño máximo del pool', pid, pool['tamano'])
+        eventos_pool = CounterMetricFamily('gestor_pool_eventos', 'Eventos del pool de conexiones', labels=['pid', 'evento'])
+        for evento in ('prestamos', 'esperas', 'agotamientos', 'conexiones_creadas', 'reconexiones', 'descartadas'):
+            eventos_pool.add_metric([pid, evento], pool[evento])
+        yield eventos_pool
+
+        precarga = obtener_precarga().estado()
+        yield self._gauge('gestor_precarga_usuarios', 'Quizzes pregenerados en cola', pid, precarga['usuarios'])
+        yield self._gauge('gestor_precarga_pendientes', 'Quizzes en generación', pid, precarga['pendientes'])
+        eventos_precarga = CounterMetricFamily('gestor_precarga_eventos', 'Eventos de la cola de quizzes pregenerados',
+                                               labels=['pid', 'evento'])
+        for evento in ('servidos', 'fallos', 'generados', 'invalidados', 'descartados', 'errores'):
+            eventos_precarga.add_metric([pid, evento], precarga[evento])
+        yield eventos_precarga
+        pedidos = precarga['servidos'] + precarga['fallos']
+        yield self._gauge('gestor_precarga_tasa_aciertos', 'Fracción de quizzes servidos desde la cola', pid,
+                          precarga['servidos'] / pedidos if pedidos else 0.0)
+
+        rankings = obtener_cache_rankings().estado()
+        yield self._gauge('gestor_rankings_entradas', 'Rankings de candidatas en caché', pid, rankings['rankings'])
+        eventos_rankings = CounterMetricFamily('gestor_rankings_eventos', 'Eventos de la caché de rankings',
+                                               labels=['pid', 'evento'])
+        for evento in ('aciertos', 'obsoletos', 'fallos', 'refrescos', 'invalidados', 'descartados', 'errores'):
+            eventos_rankings.add_metric([pid, evento], rankings[evento])
+        yield eventos_rankings
+
+        respondidas = obtener_bitmaps_respondidas().estado()
+        yield self._gauge('gestor_respondidas_usuarios', 'Usuarios con bitmap de respondidas en memoria', pid,
+                          respondidas['usuarios'])
+        yield self._gauge('gestor_respondidas_bytes', 'Bytes de los bitmaps de respondidas', pid, respondidas['bytes'])
+        eventos_respondidas = CounterMetricFamily('gestor_respondidas_eventos', 'Eventos de los bitmaps de respondidas',
+                                                  labels=['pid', 'evento'])
+        for evento in ('aciertos', 'fallos', 'registradas', 'descartados'):
+            eventos_respondidas.add_metric([pid, evento], respondidas[evento])
+        yield eventos_respondidas
+
+        servidas = obtener_preguntas_servidas().estado()
+        yield self._gauge('gestor_servidas_pendientes', 'Preguntas servidas pendientes de escribir', pid,
+                          servidas['pendientes'])
+        eventos_servidas = CounterMetricFamily('gestor_servidas_eventos', 'Eventos de la escritura diferida de preguntas servidas',
+                                               labels=['pid', 'evento'])
+        for evento in ('anotadas', 'escrituras', 'filas_escritas', 'errores', 'descartadas'):
+            eventos_servidas.add_metric([pid, evento], servidas[evento])
+        yield eventos_servidas
+
+        repasos = obtener_cola_repasos().estado()
+        yield self._gauge('gestor_repasos_usuarios', 'Usuarios con plan de repaso espaciado en memoria', pid,
+                          repasos['usuarios'])
+        yield self._gauge('gestor_repasos_tarjetas', 'Preguntas en los planes de repaso en memoria', pid, repasos['tarjetas'])
+        eventos_repasos = CounterMetricFamily('gestor_repasos_eventos', 'Eventos de los planes de repaso espaciado',
+                                              labels=['pid', 'evento'])
+        for evento in ('aciertos', 'fallos', 'registradas', 'descartados'):
+            eventos_repasos.add_metric([pid, evento], repasos[evento])
+        yield eventos_repasos
+
+        audios = obtener_manifiesto_audios().estado()
+        yield self._gauge('gestor_audios_ficheros', 'Audios en el manifiesto', pid, audios['audios'])
+        yield self._gauge('gestor_audios_bytes', 'Tamaño total de los audios del manifiesto', pid, audios['bytes'])
+        eventos_audios = CounterMetricFamily('gestor_audios_eventos', 'Recorridos del directorio de audios y ficheros leídos',
+                                             labels=['pid', 'evento'])
+        for evento in ('escaneos', 'ficheros_leidos', 'errores'):
+            eventos_audios.add_metric([pid, evento], audios[evento])
+        yield eventos_audios
+
+        catalogo = obtener_catalogo().estado()
+        yield self._gauge('gestor_catalogo_version', 'Versión del catálogo de preguntas en memoria', pid, catalogo['version'])
+        yield self._gauge('gestor_catalogo_preguntas', 'Preguntas en el catálogo en memoria', pid, catalogo['total_preguntas'])
+        eventos_catalogo = CounterMetricFamily('gestor_catalogo_eventos', 'Verificaciones y recargas del catálogo',
+                                               labels=['pid', 'evento'])
+        for evento in ('verificaciones', 'recargas'):
+            eventos_catalogo.add_metric([pid, evento], catalogo[evento])
+        yield eventos_catalogo
+
+        estadisticas = obtener_estadisticas().estado()
+        yield self._gauge('gestor_estadisticas_usuarios', 'Usuarios con respuestas en memoria', pid,
+                          estadisticas['usuarios_en_memoria'])
+        yield self._gauge('gestor_estadisticas_pendientes', 'Usuarios modificados pendientes de consolidar', pid,
+                          estadisticas['usuarios_modificados'])
+
+        yield self._gauge('gestor_algoritmos_cargados', 'Algoritmos importados e instanciados', pid,
+                          len(obtener_registro().estado()['cargados']))
+
+    @staticmethod
+    def _gauge(nombre, descripcion, pid, valor):
+        metrica = GaugeMetricFamily(nombre, descripcion, labels=['pid'])
+        metrica.add_metric([pid], valor)
+        return metrica
+
+
+_colector_estado = ColectorEstado()
+observar_consultas(_observar_consulta)
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    REGISTRY.register(_colector_estado)
+
+
+def exposicion():
+    """Texto de /metrics y su Content-Type"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        registro.register(_colector_estado)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
@@ -0,0 +1,24 @@
+import math
+import heapq
+import random
+
+
+def muestrear_sin_reemplazo(elementos, pesos, cantidad, rng=random):
+    """Elige `cantidad` elementos sin repetir, cada uno con probabilidad proporcional a su peso.
+
+    Usa las claves de Efraimidis y Spirakis: cada elemento recibe u^(1/peso), con u uniforme en (0, 1),
+    y se quedan las `cantidad` claves más altas. El resultado tiene la misma distribución que ir sacando
+    de uno en uno y renormalizando los pesos, pero cuesta O(n log k) en lugar de O(k·n). Se devuelven
+    en el orden en que habrían salido. Los elementos con peso 0 solo se eligen, al azar, cuando ya no
+    quedan elementos con peso positivo.
+    """
+    claves = []
+    for indice, peso in enumerate(pesos):
+        u = 1.0 - rng.random()
+        peso = float(peso)
+        if peso > 0:
+            # log(u^(1/peso)) conserva el orden y no se queda en 0 con pesos pequeños
+            claves.append((1, math.log(u) / peso, indice))
+        else:
+            claves.append((0, u, indice))
+    return [elementos[indice] for _, _, indice in heapq.nlargest(cantidad, claves)]
@@ -0,0 +1,41 @@
+TIPO_NDJSON = 'application/x-ndjson'
+
+
+def recoger_partes(partes):
+    """Junta las partes de ejecutar_por_partes() en el resultado que devuelve ejecutar().
+
+    Las partes son ('pregunta', pregunta_formateada) por cada pregunta, en cuanto está lista, y al final
+    ('resumen', datos) con el resto de campos del resultado (o el error, si lo hubo).
+    """
+    preguntas = []
+    resumen = {}
+    for tipo, contenido in partes:
+        if tipo == 'pregunta':
+            preguntas.append(contenido)
+        else:
+            resumen = contenido
+    if resumen.get('estado') == 'error':
+        return resumen
+    return {'preguntas': preguntas, **resumen}
+
+
+def partes_de_resultado(resultado):
+    """Partes de un resultado ya completo: algoritmos sin ejecutar_por_partes() o quizzes pregenerados"""
+    if not isinstance(resultado, dict):
+        yield 'resumen', resultado
+        return
+    for pregunta in resultado.get('preguntas') or []:
+        yield 'pregunta', pregunta
+    yield 'resumen', {clave: valor for clave, valor in resultado.items() if clave != 'preguntas'}
+
+
+def lineas_ndjson(partes, dumps):
+    """Una línea JSON por pregunta y una última con el resumen, con el mismo success/error que la respuesta JSON"""
+    try:
+        for tipo, contenido in partes:
+            if tipo == 'pregunta':
+                yield dumps({'tipo': 'pregunta', 'pregunta': contenido}) + '\n'
+            else:
+                yield dumps({'tipo': 'resumen', 'success': True, 'resultado': contenido}) + '\n'
+    except Exception as e:
+        yield dumps({'tipo': 'resumen', 'success': False, 'error': str(e)}) + '\n'
@@ -0,0 +1,360 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import errors
+
+
+def configuracion_db():
+    """Devuelve la configuración de conexión a MySQL a partir de las variables de entorno"""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', 'root'),
+        'database': os.getenv('DB_NAME', 'mydb'),
+        'port': int(os.getenv('DB_PORT', 3306)),
+        'autocommit': True,
+        'consume_results': True
+    }
+
+
+# Conexión asociada a la petición en curso (None fuera de un ámbito de petición)
+_ambito_peticion = contextvars.ContextVar('ambito_peticion', default=None)
+
+# Mediciones abiertas en el contexto actual (p. ej. la petición y, dentro, la ejecución de un algoritmo)
+_mediciones_db = contextvars.ContextVar('mediciones_db', default=())
+# Una medición puede recibir consultas de varios hilos (trabajos de /algoritmos/batch)
+_lock_mediciones = threading.Lock()
+
+# Funciones llamadas con la duración de cada consulta, p. ej. para las métricas del proceso
+_observadores_consultas = []
+
+
+def observar_consultas(observador):
+    """Registra una función observador(duracion) que se llama tras cada sentencia SQL"""
+    _observadores_consultas.append(observador)
+
+
+def registrar_consulta(duracion, sentencia=None):
+    """Anota una sentencia en las mediciones abiertas; devuelve su traza (para sumarle las filas) o None"""
+    traza = None
+    mediciones = _mediciones_db.get()
+    if mediciones:
+        with _lock_mediciones:
+            for medicion in mediciones:
+                medicion['consultas'] += 1
+                medicion['segundos'] += duracion
+                if 'sentencias' in medicion:
+                    if traza is None:
+                        traza = {'sql': sentencia, 'segundos': duracion, 'filas': 0}
+                    medicion['sentencias'].append(traza)
+    for observador in _observadores_consultas:
+        observador(duracion)
+    return traza
+
+
+def abrir_medicion(trazar=False):
+    """Empieza a contar consultas y tiempo de base de datos; devuelve (medicion, token para cerrarla).
+
+    Con trazar=True la medición guarda además cada sentencia con su duración y filas en 'sentencias'.
+    """
+    medicion = {'consultas': 0, 'segundos': 0.0}
+    if trazar:
+        medicion['sentencias'] = []
+    return medicion, _mediciones_db.set(_mediciones_db.get() + (medicion,))
+
+
+def cerrar_medicion(token):
+    _mediciones_db.reset(token)
+
+
+def mediciones_actuales():
+    """Mediciones abiertas en este contexto, para continuarlas en otro hilo con heredar_mediciones"""
+    return _mediciones_db.get()
+
+
+def heredar_mediciones(mediciones):
+    """Hace que las consultas de este hilo cuenten en mediciones de otro; se cierra con cerrar_medicion"""
+    return _mediciones_db.set(mediciones)
+
+
+@contextmanager
+def medir_consultas(trazar=False):
+    """Cuenta las consultas y el tiempo de base de datos del bloque: with medir_consultas() as db: ..."""
+    medicion, token = abrir_medicion(trazar)
+    try:
+        yield medicion
+    finally:
+        cerrar_medicion(token)
+
+
+class CursorMedido:
+    """Envoltorio de un cursor que mide cada sentencia que ejecuta y las filas que devuelve"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._traza = None
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def _anotar(self, inicio, sentencia):
+        self._traza = registrar_consulta(time.perf_counter() - inicio, sentencia)
+        if self._traza is not None and not getattr(self._cursor, 'with_rows', False):
+            # INSERT/UPDATE/DELETE: filas afectadas
+            self._traza['filas'] = max(self._cursor.rowcount, 0)
+
+    def _contar_filas(self, filas):
+        if self._traza is not None:
+            self._traza['filas'] += filas
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._anotar(inicio, operation)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._anotar(inicio, operation)
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        self._contar_filas(len(filas))
+        return filas
+
+    def fetchmany(self, *args, **kwargs):
+        filas = self._cursor.fetchmany(*args, **kwargs)
+        self._contar_filas(len(filas))
+        return filas
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            self._contar_filas(1)
+        return fila
+
+
+class ConexionPool:
+    """Envoltorio de una conexión prestada por el pool: close() la devuelve al pool en lugar de cerrarla"""
+
+    def __init__(self, pool, conexion, en_ambito=False):
+        self._pool = pool
+        self._conexion = conexion
+        self._en_ambito = en_ambito
+        self._devuelta = False
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return CursorMedido(self._conexion.cursor(*args, **kwargs))
+
+    def close(self):
+        # Dentro de un ámbito de petición la conexión se reutiliza hasta que el ámbito termina
+        if self._en_ambito or self._devuelta:
+            return
+        self._devuelta = True
+        self._pool.devolver(self._conexion)
+
+
+class PoolConexiones:
+    """Pool de conexiones MySQL compartido por todos los algoritmos de un mismo proceso"""
+
+    def __init__(self, db_config=None, tamano=None, timeout=None, intervalo_verificacion=None):
+        self.db_config = db_config or configuracion_db()
+        self.tamano = tamano or int(os.getenv('DB_POOL_SIZE', 10))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 5))
+        self.intervalo_verificacion = (intervalo_verificacion if intervalo_verificacion is not None
+                                       else float(os.getenv('DB_POOL_CHECK_INTERVAL', 30)))
+        self.pid = os.getpid()
+
+        # Pila LIFO de (conexion, instante_ultimo_uso): se reutilizan primero las conexiones más recientes
+        self._libres = []
+        self._creadas = 0
+        self._en_uso = 0
+        self._condicion = threading.Condition()
+
+        self.metricas = {
+            'prestamos': 0,
+            'esperas': 0,
+            'agotamientos': 0,
+            'conexiones_creadas': 0,
+            'reconexiones': 0,
+            'descartadas': 0
+        }
+
+    def _adquirir(self):
+        """Toma una conexión libre, crea una nueva si hay hueco o espera hasta timeout"""
+        limite = time.monotonic() + self.timeout
+        conexion = None
+        ultimo_uso = None
+
+        with self._condicion:
+            self.metricas['prestamos'] += 1
+            ha_esperado = False
+            while True:
+                if self._libres:
+                    conexion, ultimo_uso = self._libres.pop()
+                    break
+                if self._creadas < self.tamano:
+                    self._creadas += 1
+                    break
+                if not ha_esperado:
+                    ha_esperado = True
+                    self.metricas['esperas'] += 1
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.metricas['agotamientos'] += 1
+                    raise errors.PoolError(
+                        f'Pool de conexiones agotado ({self.tamano} conexiones en uso durante {self.timeout}s)'
+                    )
+                self._condicion.wait(restante)
+            self._en_uso += 1
+
+        try:
+            if conexion is None:
+                conexion = mysql.connector.connect(**self.db_config)
+                with self._condicion:
+                    self.metricas['conexiones_creadas'] += 1
+            elif time.monotonic() - ultimo_uso > self.intervalo_verificacion:
+                self._verificar(conexion)
+        except Exception:
+            with self._condicion:
+                self._creadas -= 1
+                self._en_uso -= 1
+                self._condicion.notify()
+            raise
+
+        return conexion
+
+    def _verificar(self, conexion):
+        """Comprueba que una conexión que lleva tiempo ociosa sigue viva y la reabre si el servidor la cerró"""
+        try:
+            conexion.ping(reconnect=False)
+        except mysql.connector.Error:
+            conexion.reconnect(attempts=1, delay=0)
+            with self._condicion:
+                self.metricas['reconexiones'] += 1
+
+    def devolver(self, conexion):
+        """Devuelve una conexión al pool, descartándola si ha quedado en mal estado"""
+        sana = True
+        try:
+            if conexion.unread_result:
+                conexion.consume_results()
+            if conexion.in_transaction:
+                conexion.rollback()
+        except mysql.connector.Error:
+            sana = False
+
+        with self._condicion:
+            self._en_uso -= 1
+            if sana:
+                self._libres.append((conexion, time.monotonic()))
+            else:
+                self._creadas -= 1
+                self.metricas['descartadas'] += 1
+            self._condicion.notify()
+
+        if not sana:
+            try:
+                conexion.close()
+            except mysql.connector.Error:
+                pass
+
+    def cerrar_libres(self):
+        """Cierra las conexiones ociosas, p. ej. en el proceso maestro antes de hacer fork"""
+        with self._condicion:
+            libres, self._libres = self._libres, []
+            self._creadas -= len(libres)
+        for conexion, _ in libres:
+            try:
+                conexion.close()
+            except mysql.connector.Error:
+                pass
+
+    def obtener_conexion(self):
+        """Presta una conexión; dentro de un ámbito de petición siempre es la misma"""
+        estado = _ambito_peticion.get()
+        if estado is None:
+            return ConexionPool(self, self._adquirir())
+
+        if estado['conexion'] is None:
+            estado['conexion'] = self._adquirir()
+        return ConexionPool(self, estado['conexion'], en_ambito=True)
+
+    def abrir_ambito(self):
+        """Inicia un ámbito de petición; devuelve el token necesario para cerrarlo (None si ya había uno)"""
+        if _ambito_peticion.get() is not None:
+            return None
+        return _ambito_peticion.set({'conexion': None})
+
+    def cerrar_ambito(self, token):
+        """Termina el ámbito de petición y devuelve su conexión al pool"""
+        if token is None:
+            return
+        estado = _ambito_peticion.get()
+        _ambito_peticion.reset(token)
+        if estado and estado['conexion'] is not None:
+            self.devolver(estado['conexion'])
+
+    @contextmanager
+    def ambito(self):
+        """Context manager para que todas las consultas de un bloque compartan conexión"""
+        token = self.abrir_ambito()
+        try:
+            yield
+        finally:
+            self.cerrar_ambito(token)
+
+    def estado(self):
+        """Estado y contadores del pool para monitorización"""
+        with self._condicion:
+            return {
+                'tamano': self.tamano,
+                'creadas': self._creadas,
+                'libres': len(self._libres),
+                'en_uso': self._en_uso,
+                **self.metricas
+            }
+
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def obtener_pool():
+    """Devuelve el pool del proceso actual, creándolo la primera vez (uno por proceso worker)"""
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _lock_pool:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = PoolConexiones()
+    return _pool
+
+
+def obtener_conexion():
+    """Atajo para obtener una conexión del pool del proceso"""
+    return obtener_pool().obtener_conexion()
+
+
+def ejecutar_consultas(consultas):
+    """Ejecuta consultas independientes {nombre: (query, params)} en una misma conexión; devuelve {nombre: filas}"""
+    connection = obtener_conexion()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        resultados = {}
+        for nombre, (query, params) in consultas.items():
+            cursor.execute(query, params)
+            resultados[nombre] = cursor.fetchall()
+        return resultados
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,68 @@
+import os
+import time
+import asyncio
+import aiomysql
+from PoolConexiones import configuracion_db, registrar_consulta
+
+
+class PoolConexionesAsync:
+    """Pool de conexiones aiomysql para ServidorAsync: las consultas esperan en el bucle de eventos sin ocupar hilos"""
+
+    def __init__(self, db_config=None, tamano=None):
+        self.db_config = db_config or configuracion_db()
+        self.tamano = tamano or int(os.getenv('DB_POOL_ASYNC_SIZE', 20))
+        self._pool = None
+
+    async def iniciar(self):
+        if self._pool is None:
+            self._pool = await aiomysql.create_pool(
+                host=self.db_config['host'],
+                user=self.db_config['user'],
+                password=self.db_config['password'],
+                db=self.db_config['database'],
+                port=self.db_config['port'],
+                autocommit=True,
+                minsize=1,
+                maxsize=self.tamano,
+                pool_recycle=3600
+            )
+        return self
+
+    async def cerrar(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def consultar(self, query, params=None):
+        """Ejecuta una consulta y devuelve sus filas como diccionarios"""
+        async with self._pool.acquire() as conexion:
+            async with conexion.cursor(aiomysql.DictCursor) as cursor:
+                inicio = time.perf_counter()
+                await cursor.execute(query, params)
+                filas = await cursor.fetchall()
+                # Cuenta en las métricas y en la medición de la petición, igual que las consultas síncronas
+                traza = registrar_consulta(time.perf_counter() - inicio, query)
+                if traza is not None:
+                    traza['filas'] = len(filas)
+                return filas
+
+    async def ejecutar_consultas(self, consultas):
+        """Versión asíncrona de PoolConexiones.ejecutar_consultas: lanza todas las consultas a la vez,
+        cada una con su conexión del pool"""
+        nombres = list(consultas)
+        filas = await asyncio.gather(*(self.consultar(*consultas[nombre]) for nombre in nombres))
+        return {nombre: list(resultado) for nombre, resultado in zip(nombres, filas)}
+
+    def estado(self):
+        if self._pool is None:
+            return {'tamano': self.tamano, 'creadas': 0, 'libres': 0}
+        return {'tamano': self.tamano, 'creadas': self._pool.size, 'libres': self._pool.freesize}
+
+
+_pool = PoolConexionesAsync()
+
+
+def obtener_pool_async():
+    """Pool asíncrono del proceso (se inicia en el arranque de ServidorAsync)"""
+    return _pool
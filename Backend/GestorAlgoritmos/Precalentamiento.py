@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+from PoolConexiones import obtener_pool
+from CatalogoPreguntas import obtener_catalogo
+from EstadisticasRespuestas import obtener_estadisticas
+from RegistroAlgoritmos import obtener_registro
+from ManifiestoAudios import obtener_manifiesto_audios
+
+logger = logging.getLogger(__name__)
+
+# Estado del proceso: qué se ha precalentado y si el worker ya puede recibir tráfico
+_estado = {
+    'pid': os.getpid(),
+    'listo': False,
+    'precalentado': {},
+    'errores': {}
+}
+
+
+def precalentar():
+    """Carga catálogo, estadísticas y todos los algoritmos (con su precalentar()) antes de atender peticiones.
+
+    Con el servidor pre-fork se ejecuta en el proceso maestro: los workers heredan las matrices NumPy
+    por copia en escritura en lugar de cargarlas cada uno. Un paso que falle (p. ej. la base de datos aún
+    no responde) no impide arrancar; ese dato se cargará de forma perezosa en la primera petición.
+    """
+    registro = obtener_registro()
+    pasos = [
+        ('catalogo', lambda: obtener_catalogo().obtener()),
+        ('estadisticas', lambda: obtener_estadisticas().actualizar()),
+        ('audios', lambda: obtener_manifiesto_audios().actualizar(forzar=True))
+    ]
+    # Cada algoritmo se importa, se instancia y precalienta sus propios índices
+    pasos += [(slug, lambda slug=slug: registro.precalentar(slug)) for slug in registro.slugs()]
+    with obtener_pool().ambito():
+        for nombre, paso in pasos:
+            inicio = time.monotonic()
+            try:
+                paso()
+                _estado['precalentado'][nombre] = round(time.monotonic() - inicio, 3)
+                _estado['errores'].pop(nombre, None)
+            except Exception as e:
+                _estado['errores'][nombre] = str(e)
+                logger.warning('No se pudo precalentar %s: %s', nombre, e)
+
+    # Las conexiones abiertas no deben compartirse con los procesos hijos
+    obtener_pool().cerrar_libres()
+    return _estado
+
+
+def marcar_listo():
+    """Marca el proceso actual como listo para recibir tráfico (se llama en cada worker)"""
+    _estado['pid'] = os.getpid()
+    _estado['listo'] = True
+
+
+def marcar_drenando():
+    """El worker va a terminar: deja de anunciarse como listo mientras acaba sus peticiones"""
+    _estado['listo'] = False
+
+
+def estado_worker():
+    """Disponibilidad del worker para la sonda de readiness"""
+    if obtener_catalogo().estado()['version'] == 0:
+        # Si el precalentamiento falló, la propia sonda reintenta la carga del catálogo
+        try:
+            obtener_catalogo().obtener()
+        except Exception as e:
+            _estado['errores']['catalogo'] = str(e)
+    catalogo = obtener_catalogo().estado()
+    return {
+        'pid': os.getpid(),
+        'listo': _estado['listo'] and _estado['pid'] == os.getpid() and catalogo['version'] > 0,
+        'catalogo': catalogo['version'],
+        'estadisticas': obtener_estadisticas().cargada,
+        'precalentado': dict(_estado['precalentado']),
+        'errores': dict(_estado['errores'])
+    }
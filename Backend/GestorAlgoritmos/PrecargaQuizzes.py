@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PoolConexiones import obtener_pool, obtener_conexion
+from CatalogoPreguntas import obtener_catalogo
+from EstadisticasRespuestas import obtener_estadisticas
+
+# Criterios que no se pregeneran: el 2 anota en PreguntasServidas las preguntas que elige al ejecutarse (un quiz
+# pregenerado las daría por servidas antes de que el usuario las vea) y el 3 necesita categoria_id
+CRITERIOS_SIN_PRECARGA = {2, 3}
+
+
+class PrecargaQuizzes:
+    """Cola acotada con el siguiente quiz ya generado de cada usuario activo.
+
+    Tras servir un quiz a un usuario se genera en segundo plano el siguiente con el algoritmo de su
+    idCriterioMasUsado, de modo que la próxima petición lo recibe al instante. Las respuestas nuevas
+    del usuario invalidan su quiz pregenerado (y lanzan uno nuevo), igual que un cambio de catálogo o
+    superar el TTL; en cualquiera de esos casos la petición se atiende generando el quiz en el momento.
+    Con varios workers /respuestas solo invalida en el que la atiende: cada quiz guarda además cuántas
+    respuestas tenía el usuario al generarlo y se descarta si ya no coinciden, lo que el resto de workers
+    detecta en su siguiente sincronización de estadísticas.
+    """
+
+    def __init__(self, registro=None, capacidad=None, ttl=None, hilos=None):
+        self.registro = registro
+        self.capacidad = capacidad or int(os.getenv('PRECARGA_MAX_USUARIOS', 5000))
+        self.ttl = ttl if ttl is not None else float(os.getenv('PRECARGA_TTL', 600))
+        self.hilos = hilos or int(os.getenv('PRECARGA_HILOS', 2))
+        self.activa = os.getenv('PRECARGA_ACTIVA', '1') != '0'
+
+        # usuario -> (slug, resultado, version_catalogo, respuestas_usuario, instante); en orden de uso para
+        # expulsar el más antiguo
+        self._quizzes = OrderedDict()
+        # Generación por usuario: una invalidación descarta los quizzes que se estaban generando
+        self._generaciones = {}
+        self._pendientes = set()
+        self._ejecutor = None
+        self._lock = threading.Lock()
+
+        self.metricas = {
+            'servidos': 0,
+            'fallos': 0,
+            'generados': 0,
+            'invalidados': 0,
+            'descartados': 0,
+            'errores': 0
+        }
+
+    def configurar(self, registro):
+        """Indica el RegistroAlgoritmos del que salen los algoritmos de cada idCriterioAlgoritmo"""
+        self.registro = registro
+
+    def tomar(self, slug, usuario_id):
+        """Saca el quiz pregenerado del usuario si es de ese algoritmo y sigue vigente; None si no hay"""
+        if not self.activa:
+            return None
+        with self._lock:
+            entrada = self._quizzes.get(usuario_id)
+            if entrada is None or entrada[0] != slug:
+                self.metricas['fallos'] += 1
+                return None
+            del self._quizzes[usuario_id]
+
+        _, resultado, version, respuestas, instante = entrada
+        if (time.monotonic() - instante > self.ttl or version != obtener_catalogo().obtener().version
+                or respuestas != obtener_estadisticas().total_respuestas(usuario_id)):
+            with self._lock:
+                self.metricas['descartados'] += 1
+                self.metricas['fallos'] += 1
+            return None
+        with self._lock:
+            self.metricas['servidos'] += 1
+        return resultado
+
+    def servido(self, usuario_id):
+        """Se llama tras servir un quiz: encola la generación del siguiente"""
+        if not self.activa:
+            return
+        with self._lock:
+            if usuario_id in self._pendientes or usuario_id in self._quizzes:
+                return
+            self._pendientes.add(usuario_id)
+            generacion = self._generaciones.get(usuario_id, 0)
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='precarga')
+        self._ejecutor.submit(self._generar, usuario_id, generacion)
+
+    def invalidar(self, usuarios_ids):
+        """Descarta los quizzes pregenerados de usuarios con respuestas nuevas y los vuelve a generar"""
+        activos = []
+        with self._lock:
+            for usuario_id in usuarios_ids:
+                self._generaciones[usuario_id] = self._generaciones.get(usuario_id, 0) + 1
+                if self._quizzes.pop(usuario_id, None) is not None:
+                    self.metricas['invalidados'] += 1
+                    activos.append(usuario_id)
+                # Si se estaba generando, _generar lo descartará y volverá a encolarlo
+            # Evita que el diccionario de generaciones crezca sin límite
+            if len(self._generaciones) > 4 * self.capacidad:
+                self._generaciones = {u: g for u, g in self._generaciones.items() if u in self._pendientes}
+        for usuario_id in activos:
+            self.servido(usuario_id)
+
+    def _algoritmo_usuario(self, usuario_id):
+        connection = obtener_conexion()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT idCriterioMasUsado FROM Usuarios WHERE idUsuario = %s", (usuario_id,))
+            fila = cursor.fetchone()
+        finally:
+            cursor.close()
+            connection.close()
+        if not fila or fila[0] in CRITERIOS_SIN_PRECARGA or self.registro is None:
+            return None
+        return self.registro.por_criterio(fila[0])
+
+    def _generar(self, usuario_id, generacion):
+        repetir = False
+        try:
+            with obtener_pool().ambito():
+                slug = self._algoritmo_usuario(usuario_id)
+                if slug is None:
+                    return
+                version = obtener_catalogo().obtener().version
+                respuestas = obtener_estadisticas().total_respuestas(usuario_id)
+                resultado = self.registro.ejecutar(slug, {'usuario_id': usuario_id})
+            if resultado.get('estado') == 'error':
+                return
+
+            with self._lock:
+                if self._generaciones.get(usuario_id, 0) != generacion:
+                    # Han llegado respuestas mientras se generaba: el quiz ya no refleja su historial
+                    self.metricas['descartados'] += 1
+                    repetir = True
+                    return
+                self._quizzes[usuario_id] = (slug, resultado, version, respuestas, time.monotonic())
+                self._quizzes.move_to_end(usuario_id)
+                while len(self._quizzes) > self.capacidad:
+                    self._quizzes.popitem(last=False)
+                self.metricas['generados'] += 1
+        except Exception:
+            with self._lock:
+                self.metricas['errores'] += 1
+        finally:
+            with self._lock:
+                self._pendientes.discard(usuario_id)
+            if repetir:
+                self.servido(usuario_id)
+
+    def estado(self):
+        """Tamaño de la cola y contadores de aciertos/fallos para monitorización"""
+        with self._lock:
+            return {
+                'activa': self.activa,
+                'capacidad': self.capacidad,
+                'usuarios': len(self._quizzes),
+                'pendientes': len(self._pendientes),
+                **self.metricas
+            }
+
+
+_precarga = PrecargaQuizzes()
+
+
+def obtener_precarga():
+    """Cola de quizzes pregenerados del proceso"""
+    return _precarga
@@ -1,30 +1,50 @@
-import random
 import mysql.connector
-import os
+from PoolConexiones import obtener_conexion, ejecutar_consultas
+from CatalogoPreguntas import obtener_catalogo
+from ResumenesUsuario import obtener_resumenes
+from GeneradorDistractores import obtener_generador_distractores
+from MuestreoPonderado import muestrear_sin_reemplazo
 
 class PreguntasMasFalladasPasado:
+    slug = 'preguntas-mas-falladas-pasado'
+    criterio = 6
+    resumen = 'Te pone preguntas que has fallado previamente en el pasado priorizando las que mas te equivocas'
+
     def __init__(self):
         self.nombre = "PreguntasMasFalladasPasado"
         self.descripcion = "Te pone preguntas que has fallado previamente en el pasado priorizando las que mas te equivocas."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
+        self.resumenes = obtener_resumenes()
+        self._precargadas = {}
     
     def get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return obtener_conexion()
     
-    def obtener_preguntas_mas_falladas(self, usuario_id):
-        """Obtiene las preguntas que el usuario ha fallado más frecuentemente"""
-        try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
+    def consultas_precarga(self, usuarios_ids):
+        """Consultas para obtener de una vez las preguntas falladas de varios usuarios (/algoritmos/batch y ServidorAsync)"""
+        if self.resumenes.disponible():
             query = """
                 SELECT 
+                    r.Usuarios_idUsuario,
+                    p.idPregunta,
+                    p.urlAudio,
+                    p.respuestaCorrecta,
+                    p.Categorias_idCategorias,
+                    r.intentos as total_intentos,
+                    r.fallos as total_fallos,
+                    r.aciertos as total_aciertos,
+                    (r.fallos / r.intentos) as tasa_fallo,
+                    r.ultimaFecha as ultima_fecha
+                FROM ResumenUsuarioPregunta r
+                INNER JOIN Preguntas p ON r.Preguntas_idPregunta = p.idPregunta
+                WHERE r.Usuarios_idUsuario IN ({}) AND r.fallos > 0
+                ORDER BY r.Usuarios_idUsuario, tasa_fallo DESC, total_fallos DESC, ultima_fecha ASC
+            """.format(','.join(['%s'] * len(usuarios_ids)))
+        else:
+            query = """
+                SELECT 
+                    uhp.Usuarios_idUsuario,
                     p.idPregunta,
                     p.urlAudio,
                     p.respuestaCorrecta,
@@ -36,12 +56,76 @@ class PreguntasMasFalladasPasado:
                     MAX(uhp.fechaDeContestacion) as ultima_fecha
                 FROM Usuarios_has_Preguntas uhp
                 INNER JOIN Preguntas p ON uhp.Preguntas_idPregunta = p.idPregunta
-                WHERE uhp.Usuarios_idUsuario = %s
-                GROUP BY p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias
+                WHERE uhp.Usuarios_idUsuario IN ({})
+                GROUP BY uhp.Usuarios_idUsuario, p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias
                 HAVING SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END) > 0
-                ORDER BY tasa_fallo DESC, total_fallos DESC, ultima_fecha ASC
-                LIMIT 50
-            """
+                ORDER BY uhp.Usuarios_idUsuario, tasa_fallo DESC, total_fallos DESC, ultima_fecha ASC
+            """.format(','.join(['%s'] * len(usuarios_ids)))
+        return {'preguntas': (query, list(usuarios_ids))}
+    
+    def guardar_precarga(self, resultados, usuarios_ids):
+        """Guarda lo obtenido por consultas_precarga para que las siguientes ejecuciones no consulten la base de datos"""
+        filas = resultados['preguntas']
+        # Las filas traen el id como entero aunque se haya pedido como texto
+        claves = {str(usuario_id): usuario_id for usuario_id in usuarios_ids}
+        precargadas = {usuario_id: [] for usuario_id in usuarios_ids}
+        for fila in filas:
+            preguntas_usuario = precargadas[claves[str(fila.pop('Usuarios_idUsuario'))]]
+            preguntas_usuario.append(fila)
+        self._precargadas = precargadas
+    
+    def precargar(self, usuarios_ids):
+        """Obtiene en una sola consulta las preguntas falladas de varios usuarios"""
+        try:
+            self.guardar_precarga(ejecutar_consultas(self.consultas_precarga(usuarios_ids)), usuarios_ids)
+        except mysql.connector.Error as db_error:
+            raise Exception(f'Error de base de datos al precargar preguntas falladas: {str(db_error)}')
+    
+    def obtener_preguntas_mas_falladas(self, usuario_id):
+        """Obtiene las preguntas que el usuario ha fallado más frecuentemente"""
+        if usuario_id in self._precargadas:
+            return self._precargadas[usuario_id]
+        
+        try:
+            connection = self.get_db_connection()
+            cursor = connection.cursor(dictionary=True)
+            
+            if self.resumenes.disponible():
+                query = """
+                    SELECT 
+                        p.idPregunta,
+                        p.urlAudio,
+                        p.respuestaCorrecta,
+                        p.Categorias_idCategorias,
+                        r.intentos as total_intentos,
+                        r.fallos as total_fallos,
+                        r.aciertos as total_aciertos,
+                        (r.fallos / r.intentos) as tasa_fallo,
+                        r.ultimaFecha as ultima_fecha
+                    FROM ResumenUsuarioPregunta r
+                    INNER JOIN Preguntas p ON r.Preguntas_idPregunta = p.idPregunta
+                    WHERE r.Usuarios_idUsuario = %s AND r.fallos > 0
+                    ORDER BY tasa_fallo DESC, total_fallos DESC, ultima_fecha ASC
+                """
+            else:
+                query = """
+                    SELECT 
+                        p.idPregunta,
+                        p.urlAudio,
+                        p.respuestaCorrecta,
+                        p.Categorias_idCategorias,
+                        COUNT(*) as total_intentos,
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END) as total_fallos,
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END) as total_aciertos,
+                        (SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END) / COUNT(*)) as tasa_fallo,
+                        MAX(uhp.fechaDeContestacion) as ultima_fecha
+                    FROM Usuarios_has_Preguntas uhp
+                    INNER JOIN Preguntas p ON uhp.Preguntas_idPregunta = p.idPregunta
+                    WHERE uhp.Usuarios_idUsuario = %s
+                    GROUP BY p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias
+                    HAVING SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END) > 0
+                    ORDER BY tasa_fallo DESC, total_fallos DESC, ultima_fecha ASC
+                """
             cursor.execute(query, (usuario_id,))
             preguntas_falladas = cursor.fetchall()
             
@@ -73,13 +157,7 @@ class PreguntasMasFalladasPasado:
                 }
             
             # Obtener todas las preguntas para generar opciones incorrectas
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            query_todas = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas"
-            cursor.execute(query_todas)
-            todas_las_preguntas = cursor.fetchall()
-            cursor.close()
-            connection.close()
+            todas_las_preguntas = self.catalogo.obtener().preguntas
             
             if len(todas_las_preguntas) < 4:
                 return {
@@ -95,54 +173,23 @@ class PreguntasMasFalladasPasado:
             pesos = []
             for pregunta in preguntas_falladas:
                 # Peso basado en tasa de fallo (0.1 a 1.0) + número de fallos normalizados
-                peso_tasa = pregunta['tasa_fallo']
-                peso_cantidad = min(pregunta['total_fallos'] / 10, 0.5)  # Normalizar cantidad de fallos
+                peso_tasa = float(pregunta['tasa_fallo'])
+                peso_cantidad = min(float(pregunta['total_fallos']) / 10, 0.5)  # Normalizar cantidad de fallos
                 peso_total = peso_tasa + peso_cantidad
                 pesos.append(peso_total)
             
-            # Selección ponderada de preguntas
-            preguntas_elegidas = []
-            preguntas_disponibles = preguntas_falladas.copy()
-            pesos_disponibles = pesos.copy()
-            
-            for i in range(num_preguntas):
-                if not preguntas_disponibles:
-                    break
-                
-                # Selección ponderada
-                suma_pesos = sum(pesos_disponibles)
-                if suma_pesos == 0:
-                    pregunta_elegida = random.choice(preguntas_disponibles)
-                    indice_elegido = preguntas_disponibles.index(pregunta_elegida)
-                else:
-                    probabilidades = [peso / suma_pesos for peso in pesos_disponibles]
-                    indice_elegido = random.choices(range(len(preguntas_disponibles)), weights=probabilidades)[0]
-                    pregunta_elegida = preguntas_disponibles[indice_elegido]
-                
-                preguntas_elegidas.append(pregunta_elegida)
-                preguntas_disponibles.pop(indice_elegido)
-                pesos_disponibles.pop(indice_elegido)
+            # Selección ponderada sin repetir: O(n log k), así que se puede muestrear sobre todo el historial
+            preguntas_elegidas = muestrear_sin_reemplazo(preguntas_falladas, pesos, num_preguntas)
             
             for pregunta_principal in preguntas_elegidas:
                 # Generar respuestas incorrectas
-                respuestas_incorrectas = set()
-                otras_preguntas = [p for p in todas_las_preguntas if p['idPregunta'] != pregunta_principal['idPregunta']]
-                
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas.remove(pregunta_incorrecta)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias'],
                     'tasa_fallo_personal': round(pregunta_principal['tasa_fallo'], 2),
                     'total_fallos_personal': pregunta_principal['total_fallos'],
@@ -1,45 +1,46 @@
 import random
+from datetime import datetime, date
+import numpy as np
 import mysql.connector
-import os
+from PoolConexiones import obtener_conexion, ejecutar_consultas
+from CatalogoPreguntas import obtener_catalogo
+from GeneradorDistractores import obtener_generador_distractores
+from ResumenesUsuario import obtener_resumenes
+from BitmapsRespondidas import obtener_bitmaps_respondidas
+from PreguntasServidas import obtener_preguntas_servidas
 
 class PreguntasNoHechas:
+    slug = 'preguntas-no-hechas'
+    criterio = 2
+    resumen = 'Elige aleatoriamente preguntas que no has hecho'
+
     def __init__(self):
         self.nombre = "PreguntasNoHechas"
         self.descripcion = "Elige aleatoriamente preguntas que no has hecho. Si no hay preguntas sin hacer, se eligira las que más tiempo lleve sin hacerse."
-        self.db_config = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', 'root'),
-            'database': os.getenv('DB_NAME', 'mydb'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
+        self.resumenes = obtener_resumenes()
+        self.respondidas = obtener_bitmaps_respondidas()
+        self.servidas = obtener_preguntas_servidas()
     
     def get_db_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        return obtener_conexion()
     
-    def ejecutar(self, data):
-        try:
-            if not data or 'usuario_id' not in data:
-                return {
-                    'estado': 'error',
-                    'mensaje': 'Se debe proporcionar usuario_id en los datos de entrada'
-                }
-            
-            usuario_id = data['usuario_id']
-            
-            connection = self.get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            query_no_hechas = """
-                SELECT p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias
+    def consulta_mas_antiguas(self, usuario_id):
+        """Consulta de las preguntas ya hechas por el usuario, de la más antigua a la más reciente. No se precarga
+        (ServidorAsync la lanzaría en cada petición): solo hace falta si no bastan las no hechas, que salen del
+        catálogo y del bitmap de respondidas sin consultar"""
+        if self.resumenes.disponible():
+            # Los resúmenes incluyen las preguntas cuyas respuestas ya se han archivado
+            query_mas_antiguas = """
+                SELECT p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias,
+                       r.ultimaFecha as ultima_fecha
                 FROM Preguntas p
-                LEFT JOIN Usuarios_has_Preguntas uhp ON p.idPregunta = uhp.Preguntas_idPregunta 
-                    AND uhp.Usuarios_idUsuario = %s
-                WHERE uhp.Preguntas_idPregunta IS NULL
+                INNER JOIN ResumenUsuarioPregunta r ON p.idPregunta = r.Preguntas_idPregunta
+                    AND r.Usuarios_idUsuario = %s
+                ORDER BY ultima_fecha ASC
             """
-            cursor.execute(query_no_hechas, (usuario_id,))
-            preguntas_no_hechas = cursor.fetchall()
-            
+        else:
             query_mas_antiguas = """
                 SELECT p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias,
                        MAX(uhp.fechaDeContestacion) as ultima_fecha
@@ -49,8 +50,41 @@ class PreguntasNoHechas:
                 GROUP BY p.idPregunta, p.urlAudio, p.respuestaCorrecta, p.Categorias_idCategorias
                 ORDER BY ultima_fecha ASC
             """
-            cursor.execute(query_mas_antiguas, (usuario_id,))
-            preguntas_mas_antiguas = cursor.fetchall()
+        return query_mas_antiguas, (usuario_id,)
+    
+    def obtener_no_hechas(self, usuario_id):
+        """Preguntas del catálogo que no están en el bitmap de respondidas del usuario"""
+        catalogo = self.catalogo.obtener()
+        pendientes = np.flatnonzero(~self.respondidas.obtener(usuario_id).contiene(catalogo.ids))
+        return [catalogo.preguntas[i] for i in pendientes.tolist()]
+    
+    def obtener_mas_antiguas(self, usuario_id):
+        """Preguntas que el usuario ya hizo, de la que respondió o se le sirvió hace más tiempo a la más reciente"""
+        preguntas = ejecutar_consultas({'mas_antiguas': self.consulta_mas_antiguas(usuario_id)})['mas_antiguas']
+        servidas = self.servidas.ultimas(usuario_id)
+        if not servidas:
+            return preguntas
+
+        def ultima_vez(pregunta):
+            fecha = pregunta['ultima_fecha']
+            if isinstance(fecha, date) and not isinstance(fecha, datetime):
+                fecha = datetime.combine(fecha, datetime.min.time())
+            servida = servidas.get(pregunta['idPregunta'])
+            return max(fecha or datetime.min, servida or datetime.min)
+
+        return sorted(preguntas, key=ultima_vez)
+    
+    def ejecutar(self, data):
+        try:
+            if not data or 'usuario_id' not in data:
+                return {
+                    'estado': 'error',
+                    'mensaje': 'Se debe proporcionar usuario_id en los datos de entrada'
+                }
+            
+            usuario_id = data['usuario_id']
+            
+            preguntas_no_hechas = self.obtener_no_hechas(usuario_id)
            
             preguntas_candidatas = []
             preguntas_mas_antiguas_ids = set()
@@ -61,16 +95,12 @@ class PreguntasNoHechas:
 
             if len(preguntas_candidatas) < 10:
                 preguntas_necesarias = 10 - len(preguntas_candidatas)
-                preguntas_antiguas_seleccionadas = preguntas_mas_antiguas[:preguntas_necesarias]
+                # Solo se consultan las fechas cuando no bastan las preguntas no hechas
+                preguntas_antiguas_seleccionadas = self.obtener_mas_antiguas(usuario_id)[:preguntas_necesarias]
                 preguntas_candidatas.extend(preguntas_antiguas_seleccionadas)
                 preguntas_mas_antiguas_ids = {p['idPregunta'] for p in preguntas_antiguas_seleccionadas}
             
-            query_todas = "SELECT idPregunta, urlAudio, respuestaCorrecta, Categorias_idCategorias FROM Preguntas"
-            cursor.execute(query_todas)
-            todas_las_preguntas = cursor.fetchall()
-            
-            cursor.close()
-            connection.close()
+            todas_las_preguntas = self.catalogo.obtener().preguntas
             
             if not preguntas_candidatas:
                 return {
@@ -87,47 +117,22 @@ class PreguntasNoHechas:
             num_preguntas = min(10, len(preguntas_candidatas))
             preguntas_seleccionadas_raw = random.sample(preguntas_candidatas, num_preguntas)
             
-            preguntas_antiguas_a_actualizar = [p for p in preguntas_seleccionadas_raw if p['idPregunta'] in preguntas_mas_antiguas_ids]
+            preguntas_antiguas_servidas = [p['idPregunta'] for p in preguntas_seleccionadas_raw if p['idPregunta'] in preguntas_mas_antiguas_ids]
             
-            if preguntas_antiguas_a_actualizar:
-                connection = self.get_db_connection()
-                cursor = connection.cursor()
-                
-                for pregunta in preguntas_antiguas_a_actualizar:
-                    update_query = """
-                        UPDATE Usuarios_has_Preguntas 
-                        SET fechaDeContestacion = CURDATE()
-                        WHERE Usuarios_idUsuario = %s AND Preguntas_idPregunta = %s
-                        ORDER BY fechaDeContestacion DESC
-                        LIMIT 1
-                    """
-                    cursor.execute(update_query, (usuario_id, pregunta['idPregunta']))
-                
-                connection.commit()
-                cursor.close()
-                connection.close()
+            if preguntas_antiguas_servidas:
+                # Se escribe en segundo plano: la petición no bloquea filas de Usuarios_has_Preguntas
+                self.servidas.anotar(usuario_id, preguntas_antiguas_servidas)
             
             preguntas_seleccionadas = []
             
             for pregunta_principal in preguntas_seleccionadas_raw:
-                respuestas_incorrectas = set()
-                otras_preguntas = [p for p in todas_las_preguntas if p['idPregunta'] != pregunta_principal['idPregunta']]
-                
-                while len(respuestas_incorrectas) < 3 and len(otras_preguntas) > 0:
-                    pregunta_incorrecta = random.choice(otras_preguntas)
-                    respuesta_incorrecta = pregunta_incorrecta['respuestaCorrecta']
-                    
-                    if (respuesta_incorrecta != pregunta_principal['respuestaCorrecta'] and 
-                        respuesta_incorrecta not in respuestas_incorrectas):
-                        respuestas_incorrectas.add(respuesta_incorrecta)
-                    
-                    otras_preguntas.remove(pregunta_incorrecta)
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal)
                 
                 pregunta_formateada = {
                     'idPregunta': pregunta_principal['idPregunta'],
                     'urlAudio': pregunta_principal['urlAudio'],
                     'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
-                    'respuestasIncorrectas': list(respuestas_incorrectas),
+                    'respuestasIncorrectas': respuestas_incorrectas,
                     'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias']
                 }
                 
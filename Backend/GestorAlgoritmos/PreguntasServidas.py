@@ -0,0 +1,196 @@
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime
+import mysql.connector
+from PoolConexiones import obtener_conexion
+
+logger = logging.getLogger(__name__)
+
+DDL_SERVIDAS = """
+    CREATE TABLE IF NOT EXISTS PreguntasServidas (
+        Usuarios_idUsuario INT NOT NULL,
+        Preguntas_idPregunta INT NOT NULL,
+        ultimaVez DATETIME NOT NULL,
+        PRIMARY KEY (Usuarios_idUsuario, Preguntas_idPregunta)
+    ) ENGINE = InnoDB
+"""
+
+
+class PreguntasServidas:
+    """Última vez que se sirvió cada pregunta ya respondida a cada usuario, escrita en diferido.
+
+    PreguntasNoHechas anota aquí las preguntas antiguas que repite en lugar de reescribir la fecha de
+    la respuesta en Usuarios_has_Preguntas dentro de la petición. Las anotaciones se acumulan en memoria
+    (una por usuario y pregunta, la más reciente) y un hilo las escribe cada `intervalo` segundos, o antes
+    si llegan a `tamano_lote`, con un INSERT de varias filas por lote y un único commit. Las anotaciones
+    pendientes se tienen en cuenta al leer, así que el propio proceso no repite una pregunta aunque aún
+    no esté escrita; otro worker la ve como mucho `intervalo` segundos después.
+    """
+
+    def __init__(self, intervalo=None, tamano_lote=None, max_pendientes=None):
+        self.intervalo = intervalo if intervalo is not None else float(os.getenv('SERVIDAS_INTERVALO', 1))
+        self.tamano_lote = tamano_lote or int(os.getenv('SERVIDAS_LOTE', 500))
+        # Si la base de datos no responde las anotaciones se reintentan, pero sin crecer sin límite
+        self.max_pendientes = max_pendientes or int(os.getenv('SERVIDAS_MAX_PENDIENTES', 100000))
+
+        # usuario -> {pregunta: instante en que se sirvió}; indexado por usuario para que ultimas() solo
+        # recorra las del usuario que pide
+        self._pendientes = {}
+        self._total_pendientes = 0
+        # Lo que se está escribiendo: sigue contando al leer hasta que termina el commit
+        self._en_escritura = {}
+        self._instalada = False
+        self._hilo = None
+        self._pid = None
+        self._hay_lote = threading.Event()
+        self._lock = threading.Lock()
+        # Una sola escritura a la vez, sea la del hilo o la de vaciar() al terminar
+        self._lock_escritura = threading.Lock()
+
+        self.metricas = {
+            'anotadas': 0,
+            'escrituras': 0,
+            'filas_escritas': 0,
+            'errores': 0,
+            'descartadas': 0
+        }
+
+    def _arrancar(self):
+        # El hilo se crea en cada worker: los hilos del maestro no sobreviven al fork
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._hilo = threading.Thread(target=self._escribir_periodicamente, name='preguntas-servidas', daemon=True)
+        self._hilo.start()
+        atexit.register(self.vaciar)
+
+    def _escribir_periodicamente(self):
+        while True:
+            self._hay_lote.wait(self.intervalo)
+            self._hay_lote.clear()
+            try:
+                self.vaciar()
+            except Exception as e:
+                logger.warning('No se pudieron escribir las preguntas servidas: %s', e)
+
+    def anotar(self, usuario_id, preguntas_ids):
+        """Anota que se acaban de servir estas preguntas al usuario; se escriben en segundo plano"""
+        ahora = datetime.now().replace(microsecond=0)
+        with self._lock:
+            self._arrancar()
+            pendientes = self._pendientes.setdefault(int(usuario_id), {})
+            antes = len(pendientes)
+            for pregunta_id in preguntas_ids:
+                pendientes[int(pregunta_id)] = ahora
+            self._total_pendientes += len(pendientes) - antes
+            self.metricas['anotadas'] += len(preguntas_ids)
+            if self._total_pendientes >= self.tamano_lote:
+                self._hay_lote.set()
+
+    def vaciar(self):
+        """Escribe las anotaciones pendientes en un único commit; devuelve las filas escritas"""
+        with self._lock_escritura:
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, {}
+                self._total_pendientes = 0
+                self._en_escritura = pendientes
+            if not pendientes:
+                return 0
+
+            filas = [(usuario, pregunta, instante)
+                     for usuario, preguntas in pendientes.items() for pregunta, instante in preguntas.items()]
+            query = """
+                INSERT INTO PreguntasServidas (Usuarios_idUsuario, Preguntas_idPregunta, ultimaVez)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE ultimaVez = GREATEST(ultimaVez, VALUES(ultimaVez))
+            """
+            connection = obtener_conexion()
+            cursor = connection.cursor()
+            try:
+                if not self._instalada:
+                    cursor.execute(DDL_SERVIDAS)
+                    self._instalada = True
+                connection.start_transaction()
+                for i in range(0, len(filas), self.tamano_lote):
+                    cursor.executemany(query, filas[i:i + self.tamano_lote])
+                connection.commit()
+            except mysql.connector.Error:
+                try:
+                    connection.rollback()
+                except mysql.connector.Error:
+                    pass
+                self._reencolar(pendientes)
+                raise
+            finally:
+                cursor.close()
+                connection.close()
+                with self._lock:
+                    self._en_escritura = {}
+
+            with self._lock:
+                self.metricas['escrituras'] += 1
+                self.metricas['filas_escritas'] += len(filas)
+            return len(filas)
+
+    def _reencolar(self, pendientes):
+        with self._lock:
+            self.metricas['errores'] += 1
+            for usuario, preguntas in pendientes.items():
+                actuales = self._pendientes.setdefault(usuario, {})
+                for pregunta, instante in preguntas.items():
+                    if pregunta in actuales:
+                        actuales[pregunta] = max(actuales[pregunta], instante)
+                    elif self._total_pendientes < self.max_pendientes:
+                        actuales[pregunta] = instante
+                        self._total_pendientes += 1
+                    else:
+                        self.metricas['descartadas'] += 1
+                if not actuales:
+                    del self._pendientes[usuario]
+
+    def ultimas(self, usuario_id):
+        """Última vez que se sirvió al usuario cada pregunta: {idPregunta: instante}, incluidas las pendientes"""
+        servidas = {}
+        connection = obtener_conexion()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT Preguntas_idPregunta, ultimaVez
+                FROM PreguntasServidas
+                WHERE Usuarios_idUsuario = %s
+            """, (usuario_id,))
+            servidas = dict(cursor.fetchall())
+        except mysql.connector.errors.ProgrammingError:
+            # Aún no se ha escrito nunca y la tabla no existe
+            pass
+        finally:
+            cursor.close()
+            connection.close()
+
+        usuario = int(usuario_id)
+        with self._lock:
+            for pendientes in (self._en_escritura.get(usuario, {}), self._pendientes.get(usuario, {})):
+                for pregunta, instante in pendientes.items():
+                    if instante > servidas.get(pregunta, datetime.min):
+                        servidas[pregunta] = instante
+        return servidas
+
+    def estado(self):
+        """Anotaciones pendientes y contadores para monitorización"""
+        with self._lock:
+            return {
+                'intervalo': self.intervalo,
+                'tamano_lote': self.tamano_lote,
+                'pendientes': self._total_pendientes,
+                **self.metricas
+            }
+
+
+_preguntas_servidas = PreguntasServidas()
+
+
+def obtener_preguntas_servidas():
+    """Registro de preguntas servidas del proceso"""
+    return _preguntas_servidas
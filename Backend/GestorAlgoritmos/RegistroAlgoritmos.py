@@ -0,0 +1,171 @@
+import os
+import ast
+import copy
+import time
+import importlib
+import threading
+from collections import namedtuple
+from PoolConexiones import medir_consultas
+from PartesQuiz import partes_de_resultado
+
+# Datos de un algoritmo leídos de su clase sin importar el módulo
+DefinicionAlgoritmo = namedtuple('DefinicionAlgoritmo', ['slug', 'modulo', 'clase', 'criterio', 'resumen'])
+
+
+def descubrir_algoritmos(directorio=None):
+    """Busca en los módulos del directorio las clases con los atributos slug, criterio y resumen.
+
+    Se analiza el código fuente con ast en lugar de importarlo, de modo que los algoritmos que dependen
+    de NumPy o de índices grandes no se cargan hasta que se usan por primera vez.
+    """
+    directorio = directorio or os.path.dirname(os.path.abspath(__file__))
+    definiciones = {}
+    for fichero in sorted(os.listdir(directorio)):
+        if not fichero.endswith('.py'):
+            continue
+        with open(os.path.join(directorio, fichero), encoding='utf-8') as f:
+            arbol = ast.parse(f.read(), filename=fichero)
+        for nodo in arbol.body:
+            if not isinstance(nodo, ast.ClassDef):
+                continue
+            atributos = {}
+            for sentencia in nodo.body:
+                if (isinstance(sentencia, ast.Assign) and len(sentencia.targets) == 1
+                        and isinstance(sentencia.targets[0], ast.Name)
+                        and sentencia.targets[0].id in ('slug', 'criterio', 'resumen')):
+                    atributos[sentencia.targets[0].id] = ast.literal_eval(sentencia.value)
+            if 'slug' not in atributos:
+                continue
+            slug = atributos['slug']
+            if slug in definiciones:
+                raise ValueError(f'Algoritmo {slug} definido dos veces: {definiciones[slug].clase} y {nodo.name}')
+            definiciones[slug] = DefinicionAlgoritmo(slug, fichero[:-3], nodo.name,
+                                                     atributos.get('criterio'), atributos.get('resumen', ''))
+    return definiciones
+
+
+class RegistroAlgoritmos:
+    """Algoritmos disponibles, cada uno instanciado una sola vez y compartido entre peticiones.
+
+    Las instancias solo guardan dependencias compartidas (catálogo, estadísticas, índices), así que
+    pueden atender a la vez peticiones de distintos hilos. Quien necesite precargar datos de usuarios
+    (/algoritmos/batch, ServidorAsync) pide una copia con nueva() para no tocar la compartida.
+    """
+
+    def __init__(self, definiciones=None):
+        self._definiciones = definiciones if definiciones is not None else descubrir_algoritmos()
+        self._por_criterio = {d.criterio: d.slug for d in self._definiciones.values() if d.criterio is not None}
+        self._instancias = {}
+        self._observadores = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, slug):
+        return slug in self._definiciones
+
+    def slugs(self):
+        """Slugs ordenados por idCriterioAlgoritmo"""
+        return sorted(self._definiciones, key=lambda slug: (self._definiciones[slug].criterio is None,
+                                                            self._definiciones[slug].criterio or 0, slug))
+
+    def por_criterio(self, criterio):
+        """Slug del algoritmo que implementa un idCriterioAlgoritmo, o None"""
+        return self._por_criterio.get(criterio)
+
+    def clase(self, slug):
+        definicion = self._definiciones[slug]
+        return getattr(importlib.import_module(definicion.modulo), definicion.clase)
+
+    def obtener(self, slug):
+        """Instancia compartida del algoritmo; se importa y crea en el primer uso"""
+        instancia = self._instancias.get(slug)
+        if instancia is None:
+            with self._lock:
+                instancia = self._instancias.get(slug)
+                if instancia is None:
+                    instancia = self.clase(slug)()
+                    self._instancias[slug] = instancia
+        return instancia
+
+    def nueva(self, slug):
+        """Copia de la instancia compartida con su propia precarga (no vuelve a ejecutar __init__)"""
+        instancia = copy.copy(self.obtener(slug))
+        if hasattr(instancia, '_precargadas'):
+            instancia._precargadas = {}
+        return instancia
+
+    def observar(self, observador):
+        """Registra observador(slug, estado, segundos, db) para cada ejecución; db = {'consultas', 'segundos'}"""
+        self._observadores.append(observador)
+
+    def ejecutar(self, slug, data, instancia=None):
+        """Ejecuta el algoritmo (la instancia compartida o la copia indicada) midiendo tiempo y consultas"""
+        instancia = instancia or self.obtener(slug)
+        inicio = time.perf_counter()
+        estado = 'excepcion'
+        with medir_consultas() as db:
+            try:
+                resultado = instancia.ejecutar(data)
+                estado = resultado.get('estado', 'desconocido') if isinstance(resultado, dict) else 'desconocido'
+                return resultado
+            finally:
+                segundos = time.perf_counter() - inicio
+                for observador in self._observadores:
+                    observador(slug, estado, segundos, db)
+
+    def ejecutar_por_partes(self, slug, data, instancia=None):
+        """Como ejecutar(), pero genera las partes del resultado (PartesQuiz) a medida que están listas.
+
+        Los algoritmos con ejecutar_por_partes() entregan cada pregunta en cuanto la formatean; el resto
+        se ejecuta entero y se reparte después.
+        """
+        instancia = instancia or self.obtener(slug)
+        inicio = time.perf_counter()
+        estado = 'excepcion'
+        with medir_consultas() as db:
+            try:
+                if hasattr(instancia, 'ejecutar_por_partes'):
+                    partes = instancia.ejecutar_por_partes(data)
+                else:
+                    partes = partes_de_resultado(instancia.ejecutar(data))
+                for tipo, contenido in partes:
+                    if tipo == 'resumen':
+                        estado = contenido.get('estado', 'desconocido') if isinstance(contenido, dict) else 'desconocido'
+                    yield tipo, contenido
+            finally:
+                segundos = time.perf_counter() - inicio
+                for observador in self._observadores:
+                    observador(slug, estado, segundos, db)
+
+    def precalentar(self, slug):
+        """Crea la instancia y ejecuta su precalentar() si lo tiene (índices, matrices...)"""
+        instancia = self.obtener(slug)
+        if hasattr(instancia, 'precalentar'):
+            instancia.precalentar()
+
+    def disponibles(self):
+        """Listado de /algoritmos/disponibles; sale de los atributos de cada clase"""
+        return [
+            {
+                'nombre': self._definiciones[slug].clase,
+                'descripcion': self._definiciones[slug].resumen,
+                'endpoint': f'/algoritmos/{slug}'
+            }
+            for slug in self.slugs()
+        ]
+
+    def estado(self):
+        return {'algoritmos': len(self._definiciones), 'cargados': sorted(self._instancias)}
+
+
+_registro = None
+_registro_lock = threading.Lock()
+
+
+def obtener_registro():
+    """Registro de algoritmos del proceso"""
+    global _registro
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                _registro = RegistroAlgoritmos()
+    return _registro
@@ -0,0 +1,100 @@
+import mysql.connector
+from datetime import date
+from CatalogoPreguntas import obtener_catalogo
+from GeneradorDistractores import obtener_generador_distractores
+from ColaRepasos import obtener_cola_repasos
+
+class RepasoEspaciado:
+    slug = 'repaso-espaciado'
+    criterio = 12
+    resumen = 'Te pone las preguntas que te toca repasar según la repetición espaciada'
+
+    def __init__(self):
+        self.nombre = "RepasoEspaciado"
+        self.descripcion = "Te pone las preguntas que te toca repasar según la repetición espaciada (SM-2): las que fallas vuelven al día siguiente y las que aciertas cada vez más espaciadas."
+        self.catalogo = obtener_catalogo()
+        self.distractores = obtener_generador_distractores()
+        self.repasos = obtener_cola_repasos()
+
+    def ejecutar(self, data):
+        try:
+            if not data or 'usuario_id' not in data:
+                return {
+                    'estado': 'error',
+                    'mensaje': 'Se debe proporcionar usuario_id en los datos de entrada'
+                }
+
+            usuario_id = data['usuario_id']
+
+            # Las 10 preguntas con el repaso más próximo, de la más atrasada en adelante
+            preguntas_por_id = self.catalogo.obtener().por_id
+            proximas, total_tarjetas = self.repasos.proximas(usuario_id, 10, valida=lambda p: p in preguntas_por_id)
+
+            if not proximas:
+                return {
+                    'estado': 'error',
+                    'mensaje': 'El usuario no ha respondido ninguna pregunta todavía'
+                }
+
+            if len(preguntas_por_id) < 4:
+                return {
+                    'estado': 'error',
+                    'mensaje': 'Se necesitan al menos 4 preguntas en la base de datos para generar opciones'
+                }
+
+            hoy = date.today()
+            preguntas_seleccionadas = []
+
+            for pregunta_id, (repeticiones, facilidad, intervalo, proxima) in proximas:
+                pregunta_principal = preguntas_por_id[pregunta_id]
+                respuestas_incorrectas = self.distractores.generar(pregunta_principal)
+
+                pregunta_formateada = {
+                    'idPregunta': pregunta_principal['idPregunta'],
+                    'urlAudio': pregunta_principal['urlAudio'],
+                    'respuestaCorrecta': pregunta_principal['respuestaCorrecta'],
+                    'respuestasIncorrectas': respuestas_incorrectas,
+                    'Categorias_idCategorias': pregunta_principal['Categorias_idCategorias'],
+                    'proximo_repaso': proxima.strftime('%Y-%m-%d'),
+                    'dias_retraso': (hoy - proxima).days,
+                    'intervalo_dias': intervalo,
+                    'repeticiones': repeticiones
+                }
+
+                preguntas_seleccionadas.append(pregunta_formateada)
+
+            pendientes = sum(1 for _, tarjeta in proximas if tarjeta[3] <= hoy)
+
+            resultado = {
+                'preguntas': preguntas_seleccionadas,
+                'total_preguntas': len(preguntas_seleccionadas),
+                'preguntas_pendientes_hoy': pendientes,
+                'total_preguntas_en_repaso': total_tarjetas,
+                'usuario_id': usuario_id,
+                'estado': 'completado',
+                'mensaje': f'Algoritmo ejecutado correctamente - {len(preguntas_seleccionadas)} preguntas para repasar ({pendientes} pendientes hoy)'
+            }
+
+            if data:
+                resultado['datos_entrada'] = data
+
+            return resultado
+
+        except mysql.connector.Error as db_error:
+            return {
+                'estado': 'error',
+                'mensaje': f'Error de base de datos: {str(db_error)}'
+            }
+        except Exception as e:
+            return {
+                'estado': 'error',
+                'mensaje': f'Error en el algoritmo: {str(e)}'
+            }
+
+    def obtener_info(self):
+        return {
+            'nombre': self.nombre,
+            'descripcion': self.descripcion,
+            'parametros_entrada': ['usuario_id (requerido)'],
+            'parametros_salida': ['preguntas', 'total_preguntas', 'preguntas_pendientes_hoy', 'total_preguntas_en_repaso', 'usuario_id', 'estado', 'mensaje']
+        }
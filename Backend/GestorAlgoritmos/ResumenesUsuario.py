@@ -0,0 +1,571 @@
+import os
+import time
+import argparse
+import threading
+from datetime import date, timedelta
+import mysql.connector
+from PoolConexiones import obtener_conexion
+
+# Resúmenes por usuario × pregunta, usuario × categoría y usuario × día de Usuarios_has_Preguntas. Los
+# mantienen al día los triggers de abajo en cada INSERT/UPDATE/DELETE, sea cual sea el servicio que
+# escribe la respuesta. Son la forma compacta del historial que leen los algoritmos: las respuestas más
+# antiguas que la retención se mueven a Usuarios_has_PreguntasArchivo (archivar) y los resúmenes las
+# siguen incluyendo.
+DDL_RESUMENES = [
+    """
+    CREATE TABLE IF NOT EXISTS ResumenUsuarioPregunta (
+        Usuarios_idUsuario INT NOT NULL,
+        Preguntas_idPregunta INT NOT NULL,
+        intentos INT NOT NULL DEFAULT 0,
+        aciertos INT NOT NULL DEFAULT 0,
+        fallos INT NOT NULL DEFAULT 0,
+        primeraFecha DATE NULL DEFAULT NULL,
+        ultimaFecha DATE NULL DEFAULT NULL,
+        ultimaRespuesta TINYINT NOT NULL DEFAULT 0,
+        ultimoIdRespuesta INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (Usuarios_idUsuario, Preguntas_idPregunta),
+        INDEX idx_resumen_pregunta (Preguntas_idPregunta)
+    ) ENGINE = InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ResumenUsuarioCategoria (
+        Usuarios_idUsuario INT NOT NULL,
+        Categorias_idCategorias INT NOT NULL,
+        intentos INT NOT NULL DEFAULT 0,
+        aciertos INT NOT NULL DEFAULT 0,
+        fallos INT NOT NULL DEFAULT 0,
+        ultimaFecha DATE NULL DEFAULT NULL,
+        PRIMARY KEY (Usuarios_idUsuario, Categorias_idCategorias)
+    ) ENGINE = InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ResumenUsuarioDia (
+        Usuarios_idUsuario INT NOT NULL,
+        fecha DATE NOT NULL,
+        intentos INT NOT NULL DEFAULT 0,
+        aciertos INT NOT NULL DEFAULT 0,
+        fallos INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (Usuarios_idUsuario, fecha)
+    ) ENGINE = InnoDB
+    """,
+    # Respuestas archivadas: mismas columnas, sin claves foráneas y comprimida; solo la leen reconstruir()
+    # y las auditorías
+    """
+    CREATE TABLE IF NOT EXISTS Usuarios_has_PreguntasArchivo (
+        Usuarios_idUsuario INT NOT NULL,
+        Preguntas_idPregunta INT NOT NULL,
+        idRespuesta INT NOT NULL,
+        fechaDeContestacion DATE NULL DEFAULT NULL,
+        respuestaCorrecta TINYINT NULL DEFAULT NULL,
+        PRIMARY KEY (idRespuesta),
+        INDEX idx_archivo_usuario_pregunta (Usuarios_idUsuario, Preguntas_idPregunta)
+    ) ENGINE = InnoDB ROW_FORMAT = COMPRESSED
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CompactacionRespuestas (
+        idLote INT NOT NULL AUTO_INCREMENT,
+        fecha DATETIME NOT NULL,
+        limiteFecha DATE NOT NULL,
+        filas INT NOT NULL,
+        maxIdRespuesta INT NOT NULL,
+        PRIMARY KEY (idLote)
+    ) ENGINE = InnoDB
+    """
+]
+
+# Columnas e índices añadidos a tablas que ya existían en instalaciones anteriores
+COLUMNAS_NUEVAS = {
+    'ResumenUsuarioPregunta': [
+        ('primeraFecha', "DATE NULL DEFAULT NULL AFTER fallos"),
+        ('ultimaRespuesta', "TINYINT NOT NULL DEFAULT 0 AFTER ultimaFecha"),
+        ('ultimoIdRespuesta', "INT NOT NULL DEFAULT 0 AFTER ultimaRespuesta")
+    ]
+}
+INDICES_NUEVOS = {
+    'ResumenUsuarioPregunta': [('idx_resumen_pregunta', "(Preguntas_idPregunta)")]
+}
+
+TRIGGERS_RESUMENES = {
+    'ResumenUsuario_insertar': """
+        CREATE TRIGGER ResumenUsuario_insertar AFTER INSERT ON Usuarios_has_Preguntas
+        FOR EACH ROW
+        BEGIN
+            INSERT INTO ResumenUsuarioPregunta (Usuarios_idUsuario, Preguntas_idPregunta, intentos, aciertos, fallos,
+                                                primeraFecha, ultimaFecha, ultimaRespuesta, ultimoIdRespuesta)
+            VALUES (NEW.Usuarios_idUsuario, NEW.Preguntas_idPregunta, 1,
+                    IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0),
+                    NEW.fechaDeContestacion, NEW.fechaDeContestacion, COALESCE(NEW.respuestaCorrecta, 0), NEW.idRespuesta)
+            ON DUPLICATE KEY UPDATE
+                intentos = intentos + 1,
+                aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+                fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0),
+                primeraFecha = LEAST(COALESCE(primeraFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, primeraFecha)),
+                ultimaFecha = GREATEST(COALESCE(ultimaFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, ultimaFecha)),
+                -- Las asignaciones se aplican en orden: ultimaRespuesta aún ve el ultimoIdRespuesta anterior
+                ultimaRespuesta = IF(NEW.idRespuesta > ultimoIdRespuesta, COALESCE(NEW.respuestaCorrecta, 0), ultimaRespuesta),
+                ultimoIdRespuesta = GREATEST(ultimoIdRespuesta, NEW.idRespuesta);
+
+            INSERT INTO ResumenUsuarioCategoria (Usuarios_idUsuario, Categorias_idCategorias, intentos, aciertos, fallos, ultimaFecha)
+            SELECT NEW.Usuarios_idUsuario, p.Categorias_idCategorias, 1,
+                   IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0), NEW.fechaDeContestacion
+            FROM Preguntas p
+            WHERE p.idPregunta = NEW.Preguntas_idPregunta
+            ON DUPLICATE KEY UPDATE
+                intentos = intentos + 1,
+                aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+                fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0),
+                ultimaFecha = GREATEST(COALESCE(ultimaFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, ultimaFecha));
+
+            IF NEW.fechaDeContestacion IS NOT NULL THEN
+                INSERT INTO ResumenUsuarioDia (Usuarios_idUsuario, fecha, intentos, aciertos, fallos)
+                VALUES (NEW.Usuarios_idUsuario, NEW.fechaDeContestacion, 1,
+                        IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0))
+                ON DUPLICATE KEY UPDATE
+                    intentos = intentos + 1,
+                    aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+                    fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0);
+            END IF;
+        END
+    """,
+    # PreguntasNoHechas actualiza fechaDeContestacion; usuario y pregunta de una fila nunca cambian
+    'ResumenUsuario_actualizar': """
+        CREATE TRIGGER ResumenUsuario_actualizar AFTER UPDATE ON Usuarios_has_Preguntas
+        FOR EACH ROW
+        BEGIN
+            UPDATE ResumenUsuarioPregunta
+            SET aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0) - IF(OLD.respuestaCorrecta = 1, 1, 0),
+                fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0) - IF(OLD.respuestaCorrecta = 0, 1, 0),
+                primeraFecha = LEAST(COALESCE(primeraFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, primeraFecha)),
+                ultimaFecha = (SELECT MAX(uhp.fechaDeContestacion) FROM Usuarios_has_Preguntas uhp
+                               WHERE uhp.Usuarios_idUsuario = NEW.Usuarios_idUsuario
+                               AND uhp.Preguntas_idPregunta = NEW.Preguntas_idPregunta),
+                ultimaRespuesta = IF(NEW.idRespuesta = ultimoIdRespuesta, COALESCE(NEW.respuestaCorrecta, 0), ultimaRespuesta)
+            WHERE Usuarios_idUsuario = NEW.Usuarios_idUsuario AND Preguntas_idPregunta = NEW.Preguntas_idPregunta;
+
+            UPDATE ResumenUsuarioCategoria rc
+            INNER JOIN Preguntas p ON p.Categorias_idCategorias = rc.Categorias_idCategorias
+            SET rc.aciertos = rc.aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0) - IF(OLD.respuestaCorrecta = 1, 1, 0),
+                rc.fallos = rc.fallos + IF(NEW.respuestaCorrecta = 0, 1, 0) - IF(OLD.respuestaCorrecta = 0, 1, 0),
+                rc.ultimaFecha = GREATEST(COALESCE(rc.ultimaFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, rc.ultimaFecha))
+            WHERE rc.Usuarios_idUsuario = NEW.Usuarios_idUsuario AND p.idPregunta = NEW.Preguntas_idPregunta;
+
+            IF NOT (OLD.fechaDeContestacion <=> NEW.fechaDeContestacion) OR NOT (OLD.respuestaCorrecta <=> NEW.respuestaCorrecta) THEN
+                UPDATE ResumenUsuarioDia
+                SET intentos = intentos - 1,
+                    aciertos = aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+                    fallos = fallos - IF(OLD.respuestaCorrecta = 0, 1, 0)
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion;
+                DELETE FROM ResumenUsuarioDia
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion AND intentos <= 0;
+                IF NEW.fechaDeContestacion IS NOT NULL THEN
+                    INSERT INTO ResumenUsuarioDia (Usuarios_idUsuario, fecha, intentos, aciertos, fallos)
+                    VALUES (NEW.Usuarios_idUsuario, NEW.fechaDeContestacion, 1,
+                            IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0))
+                    ON DUPLICATE KEY UPDATE
+                        intentos = intentos + 1,
+                        aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+                        fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0);
+                END IF;
+            END IF;
+        END
+    """,
+    # archivar() borra con @archivando_respuestas = 1: esas respuestas siguen contando en los resúmenes
+    'ResumenUsuario_eliminar': """
+        CREATE TRIGGER ResumenUsuario_eliminar AFTER DELETE ON Usuarios_has_Preguntas
+        FOR EACH ROW
+        BEGIN
+            IF COALESCE(@archivando_respuestas, 0) = 0 THEN
+                UPDATE ResumenUsuarioPregunta
+                SET intentos = intentos - 1,
+                    aciertos = aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+                    fallos = fallos - IF(OLD.respuestaCorrecta = 0, 1, 0),
+                    ultimaFecha = COALESCE(
+                        (SELECT MAX(uhp.fechaDeContestacion) FROM Usuarios_has_Preguntas uhp
+                         WHERE uhp.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                         AND uhp.Preguntas_idPregunta = OLD.Preguntas_idPregunta),
+                        (SELECT MAX(a.fechaDeContestacion) FROM Usuarios_has_PreguntasArchivo a
+                         WHERE a.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                         AND a.Preguntas_idPregunta = OLD.Preguntas_idPregunta)),
+                    ultimaRespuesta = IF(OLD.idRespuesta = ultimoIdRespuesta, COALESCE(
+                        (SELECT COALESCE(uhp.respuestaCorrecta, 0) FROM Usuarios_has_Preguntas uhp
+                         WHERE uhp.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                         AND uhp.Preguntas_idPregunta = OLD.Preguntas_idPregunta
+                         ORDER BY uhp.idRespuesta DESC LIMIT 1), ultimaRespuesta), ultimaRespuesta),
+                    ultimoIdRespuesta = IF(OLD.idRespuesta = ultimoIdRespuesta, COALESCE(
+                        (SELECT MAX(uhp.idRespuesta) FROM Usuarios_has_Preguntas uhp
+                         WHERE uhp.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                         AND uhp.Preguntas_idPregunta = OLD.Preguntas_idPregunta), ultimoIdRespuesta), ultimoIdRespuesta)
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND Preguntas_idPregunta = OLD.Preguntas_idPregunta;
+                DELETE FROM ResumenUsuarioPregunta
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND Preguntas_idPregunta = OLD.Preguntas_idPregunta AND intentos <= 0;
+
+                UPDATE ResumenUsuarioCategoria rc
+                INNER JOIN Preguntas p ON p.Categorias_idCategorias = rc.Categorias_idCategorias
+                SET rc.intentos = rc.intentos - 1,
+                    rc.aciertos = rc.aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+                    rc.fallos = rc.fallos - IF(OLD.respuestaCorrecta = 0, 1, 0)
+                WHERE rc.Usuarios_idUsuario = OLD.Usuarios_idUsuario AND p.idPregunta = OLD.Preguntas_idPregunta;
+                DELETE FROM ResumenUsuarioCategoria
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND intentos <= 0;
+
+                UPDATE ResumenUsuarioDia
+                SET intentos = intentos - 1,
+                    aciertos = aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+                    fallos = fallos - IF(OLD.respuestaCorrecta = 0, 1, 0)
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion;
+                DELETE FROM ResumenUsuarioDia
+                WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion AND intentos <= 0;
+            END IF;
+        END
+    """
+,
+    # Al borrar un usuario o una pregunta (sus respuestas se borran antes) se purgan también las archivadas,
+    # que los triggers de Usuarios_has_Preguntas no ven; las filas purgadas se anotan en negativo
+    'ResumenUsuario_eliminar_usuario': """
+        CREATE TRIGGER ResumenUsuario_eliminar_usuario AFTER DELETE ON Usuarios
+        FOR EACH ROW
+        BEGIN
+            DECLARE purgadas INT DEFAULT 0;
+            DELETE FROM Usuarios_has_PreguntasArchivo WHERE Usuarios_idUsuario = OLD.idUsuario;
+            SET purgadas = ROW_COUNT();
+            IF purgadas > 0 THEN
+                INSERT INTO CompactacionRespuestas (fecha, limiteFecha, filas, maxIdRespuesta)
+                VALUES (NOW(), CURDATE(), -purgadas, 0);
+            END IF;
+            DELETE FROM ResumenUsuarioPregunta WHERE Usuarios_idUsuario = OLD.idUsuario;
+            DELETE FROM ResumenUsuarioCategoria WHERE Usuarios_idUsuario = OLD.idUsuario;
+            DELETE FROM ResumenUsuarioDia WHERE Usuarios_idUsuario = OLD.idUsuario;
+        END
+    """,
+    'ResumenUsuario_eliminar_pregunta': """
+        CREATE TRIGGER ResumenUsuario_eliminar_pregunta AFTER DELETE ON Preguntas
+        FOR EACH ROW
+        BEGIN
+            DECLARE purgadas INT DEFAULT 0;
+            UPDATE ResumenUsuarioCategoria rc
+            INNER JOIN (
+                SELECT Usuarios_idUsuario, COUNT(*) AS intentos,
+                       SUM(IF(respuestaCorrecta = 1, 1, 0)) AS aciertos, SUM(IF(respuestaCorrecta = 0, 1, 0)) AS fallos
+                FROM Usuarios_has_PreguntasArchivo
+                WHERE Preguntas_idPregunta = OLD.idPregunta
+                GROUP BY Usuarios_idUsuario
+            ) a ON a.Usuarios_idUsuario = rc.Usuarios_idUsuario
+            SET rc.intentos = rc.intentos - a.intentos,
+                rc.aciertos = rc.aciertos - a.aciertos,
+                rc.fallos = rc.fallos - a.fallos
+            WHERE rc.Categorias_idCategorias = OLD.Categorias_idCategorias;
+            DELETE FROM ResumenUsuarioCategoria
+            WHERE Categorias_idCategorias = OLD.Categorias_idCategorias AND intentos <= 0
+            AND Usuarios_idUsuario IN (SELECT Usuarios_idUsuario FROM Usuarios_has_PreguntasArchivo
+                                       WHERE Preguntas_idPregunta = OLD.idPregunta);
+
+            UPDATE ResumenUsuarioDia d
+            INNER JOIN (
+                SELECT Usuarios_idUsuario, fechaDeContestacion, COUNT(*) AS intentos,
+                       SUM(IF(respuestaCorrecta = 1, 1, 0)) AS aciertos, SUM(IF(respuestaCorrecta = 0, 1, 0)) AS fallos
+                FROM Usuarios_has_PreguntasArchivo
+                WHERE Preguntas_idPregunta = OLD.idPregunta AND fechaDeContestacion IS NOT NULL
+                GROUP BY Usuarios_idUsuario, fechaDeContestacion
+            ) a ON a.Usuarios_idUsuario = d.Usuarios_idUsuario AND a.fechaDeContestacion = d.fecha
+            SET d.intentos = d.intentos - a.intentos,
+                d.aciertos = d.aciertos - a.aciertos,
+                d.fallos = d.fallos - a.fallos;
+            DELETE FROM ResumenUsuarioDia
+            WHERE intentos <= 0
+            AND Usuarios_idUsuario IN (SELECT Usuarios_idUsuario FROM Usuarios_has_PreguntasArchivo
+                                       WHERE Preguntas_idPregunta = OLD.idPregunta);
+
+            DELETE FROM Usuarios_has_PreguntasArchivo WHERE Preguntas_idPregunta = OLD.idPregunta;
+            SET purgadas = ROW_COUNT();
+            IF purgadas > 0 THEN
+                INSERT INTO CompactacionRespuestas (fecha, limiteFecha, filas, maxIdRespuesta)
+                VALUES (NOW(), CURDATE(), -purgadas, 0);
+            END IF;
+            DELETE FROM ResumenUsuarioPregunta WHERE Preguntas_idPregunta = OLD.idPregunta;
+        END
+    """
+}
+
+# Todas las respuestas de un rango de usuarios, estén aún en la tabla o ya archivadas
+RESPUESTAS_RANGO_USUARIOS = """
+    SELECT Usuarios_idUsuario, Preguntas_idPregunta, idRespuesta, fechaDeContestacion, respuestaCorrecta
+    FROM Usuarios_has_Preguntas WHERE Usuarios_idUsuario BETWEEN %s AND %s
+    UNION ALL
+    SELECT Usuarios_idUsuario, Preguntas_idPregunta, idRespuesta, fechaDeContestacion, respuestaCorrecta
+    FROM Usuarios_has_PreguntasArchivo WHERE Usuarios_idUsuario BETWEEN %s AND %s
+"""
+
+
+def _migrar(cursor):
+    """Añade a las tablas de una instalación anterior las columnas e índices que les falten"""
+    for tabla, columnas in COLUMNAS_NUEVAS.items():
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (tabla,))
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        for columna, definicion in columnas:
+            if columna not in existentes:
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+    for tabla, indices in INDICES_NUEVOS.items():
+        cursor.execute("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (tabla,))
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        for indice, columnas in indices:
+            if indice not in existentes:
+                cursor.execute(f"ALTER TABLE {tabla} ADD INDEX {indice} {columnas}")
+
+
+def instalar():
+    """Crea las tablas de resúmenes y de archivo y (re)crea sus triggers sobre Usuarios_has_Preguntas, Usuarios y Preguntas"""
+    connection = obtener_conexion()
+    cursor = connection.cursor()
+    try:
+        for ddl in DDL_RESUMENES:
+            cursor.execute(ddl)
+        _migrar(cursor)
+        for nombre, ddl in TRIGGERS_RESUMENES.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            cursor.execute(ddl)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def reconstruir(usuarios_por_bloque=1000):
+    """Recalcula los resúmenes desde Usuarios_has_Preguntas y su archivo, por bloques de usuarios.
+
+    Cada bloque se borra y se vuelve a agregar en una transacción; la lectura de INSERT ... SELECT
+    bloquea las respuestas del bloque, así que las que se inserten a la vez esperan y las aplica el
+    trigger sobre el resumen ya reconstruido. Devuelve el tamaño del rango de ids de usuario recorrido.
+    """
+    connection = obtener_conexion()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT MIN(minimo), MAX(maximo) FROM (
+                SELECT MIN(Usuarios_idUsuario) AS minimo, MAX(Usuarios_idUsuario) AS maximo FROM Usuarios_has_Preguntas
+                UNION ALL
+                SELECT MIN(Usuarios_idUsuario), MAX(Usuarios_idUsuario) FROM Usuarios_has_PreguntasArchivo
+            ) rangos
+        """)
+        minimo, maximo = cursor.fetchone()
+        if minimo is None:
+            cursor.execute("DELETE FROM ResumenUsuarioPregunta")
+            cursor.execute("DELETE FROM ResumenUsuarioCategoria")
+            cursor.execute("DELETE FROM ResumenUsuarioDia")
+            return 0
+
+        # Usuarios que ya no tienen respuestas
+        for tabla in ('ResumenUsuarioPregunta', 'ResumenUsuarioCategoria', 'ResumenUsuarioDia'):
+            cursor.execute(f"DELETE FROM {tabla} WHERE Usuarios_idUsuario < %s OR Usuarios_idUsuario > %s", (minimo, maximo))
+
+        for inicio in range(minimo, maximo + 1, usuarios_por_bloque):
+            limites = (inicio, inicio + usuarios_por_bloque - 1)
+            connection.start_transaction()
+            try:
+                for tabla in ('ResumenUsuarioPregunta', 'ResumenUsuarioCategoria', 'ResumenUsuarioDia'):
+                    cursor.execute(f"DELETE FROM {tabla} WHERE Usuarios_idUsuario BETWEEN %s AND %s", limites)
+                cursor.execute(f"""
+                    INSERT INTO ResumenUsuarioPregunta (Usuarios_idUsuario, Preguntas_idPregunta, intentos, aciertos, fallos,
+                                                        primeraFecha, ultimaFecha, ultimaRespuesta, ultimoIdRespuesta)
+                    SELECT
+                        uhp.Usuarios_idUsuario,
+                        uhp.Preguntas_idPregunta,
+                        COUNT(*),
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END),
+                        MIN(uhp.fechaDeContestacion),
+                        MAX(uhp.fechaDeContestacion),
+                        CAST(SUBSTRING_INDEX(GROUP_CONCAT(COALESCE(uhp.respuestaCorrecta, 0) ORDER BY uhp.idRespuesta DESC), ',', 1) AS UNSIGNED),
+                        MAX(uhp.idRespuesta)
+                    FROM ({RESPUESTAS_RANGO_USUARIOS}) uhp
+                    GROUP BY uhp.Usuarios_idUsuario, uhp.Preguntas_idPregunta
+                """, limites + limites)
+                cursor.execute(f"""
+                    INSERT INTO ResumenUsuarioCategoria (Usuarios_idUsuario, Categorias_idCategorias, intentos, aciertos, fallos, ultimaFecha)
+                    SELECT
+                        uhp.Usuarios_idUsuario,
+                        p.Categorias_idCategorias,
+                        COUNT(*),
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END),
+                        MAX(uhp.fechaDeContestacion)
+                    FROM ({RESPUESTAS_RANGO_USUARIOS}) uhp
+                    INNER JOIN Preguntas p ON uhp.Preguntas_idPregunta = p.idPregunta
+                    GROUP BY uhp.Usuarios_idUsuario, p.Categorias_idCategorias
+                """, limites + limites)
+                cursor.execute(f"""
+                    INSERT INTO ResumenUsuarioDia (Usuarios_idUsuario, fecha, intentos, aciertos, fallos)
+                    SELECT
+                        uhp.Usuarios_idUsuario,
+                        uhp.fechaDeContestacion,
+                        COUNT(*),
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 1 THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN uhp.respuestaCorrecta = 0 THEN 1 ELSE 0 END)
+                    FROM ({RESPUESTAS_RANGO_USUARIOS}) uhp
+                    WHERE uhp.fechaDeContestacion IS NOT NULL
+                    GROUP BY uhp.Usuarios_idUsuario, uhp.fechaDeContestacion
+                """, limites + limites)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        return maximo - minimo + 1
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def archivar(retencion_dias=None, tamano_lote=5000):
+    """Mueve a Usuarios_has_PreguntasArchivo las respuestas con más de `retencion_dias` días.
+
+    Los resúmenes ya incluyen esas respuestas y no cambian: el DELETE se hace con @archivando_respuestas
+    para que el trigger de borrado no las descuente. Cada lote se mueve en su propia transacción y queda
+    anotado en CompactacionRespuestas. Devuelve el número de respuestas archivadas.
+    """
+    if retencion_dias is None:
+        retencion_dias = int(os.getenv('RESUMENES_RETENCION_DIAS', 180))
+    limite_fecha = date.today() - timedelta(days=retencion_dias)
+    if not ResumenesUsuario(intervalo_verificacion=0).disponible():
+        raise RuntimeError('Los resúmenes no están instalados: ejecuta antes ResumenesUsuario.py --instalar')
+
+    connection = obtener_conexion()
+    cursor = connection.cursor()
+    archivadas = 0
+    ultimo_id = 0
+    try:
+        while True:
+            connection.start_transaction()
+            try:
+                # Se recorre la clave primaria desde el último lote: una sola pasada por la tabla
+                cursor.execute("""
+                    SELECT idRespuesta FROM Usuarios_has_Preguntas
+                    WHERE idRespuesta > %s AND fechaDeContestacion < %s
+                    ORDER BY idRespuesta
+                    LIMIT %s
+                    FOR UPDATE
+                """, (ultimo_id, limite_fecha, tamano_lote))
+                ids = [fila[0] for fila in cursor.fetchall()]
+                if not ids:
+                    connection.commit()
+                    break
+                marcadores = ','.join(['%s'] * len(ids))
+                cursor.execute(f"""
+                    INSERT INTO Usuarios_has_PreguntasArchivo
+                        (Usuarios_idUsuario, Preguntas_idPregunta, idRespuesta, fechaDeContestacion, respuestaCorrecta)
+                    SELECT Usuarios_idUsuario, Preguntas_idPregunta, idRespuesta, fechaDeContestacion, respuestaCorrecta
+                    FROM Usuarios_has_Preguntas
+                    WHERE idRespuesta IN ({marcadores})
+                """, ids)
+                cursor.execute("SET @archivando_respuestas = 1")
+                try:
+                    cursor.execute(f"DELETE FROM Usuarios_has_Preguntas WHERE idRespuesta IN ({marcadores})", ids)
+                finally:
+                    cursor.execute("SET @archivando_respuestas = 0")
+                cursor.execute("""
+                    INSERT INTO CompactacionRespuestas (fecha, limiteFecha, filas, maxIdRespuesta)
+                    VALUES (NOW(), %s, %s, %s)
+                """, (limite_fecha, len(ids), ids[-1]))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            archivadas += len(ids)
+            ultimo_id = ids[-1]
+        return archivadas
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def respuestas_archivadas(cursor):
+    """Respuestas que hay en el archivo según CompactacionRespuestas (0 si nunca se ha archivado)"""
+    try:
+        cursor.execute("SELECT COALESCE(SUM(filas), 0) FROM CompactacionRespuestas")
+        return int(cursor.fetchone()[0])
+    except mysql.connector.errors.ProgrammingError:
+        return 0
+
+
+class ResumenesUsuario:
+    """Indica si los algoritmos pueden leer los resúmenes en lugar de agregar Usuarios_has_Preguntas.
+
+    En una base de datos anterior a los resúmenes las tablas no existen hasta ejecutar
+    `python ResumenesUsuario.py --instalar`; mientras tanto los algoritmos usan sus consultas originales.
+    Durante esa primera reconstrucción conviene arrancar el servicio con RESUMENES_USUARIO=0. Una vez
+    archivadas respuestas, las consultas originales ya no ven todo el historial y los resúmenes son la
+    única fuente completa.
+    """
+
+    def __init__(self, intervalo_verificacion=None):
+        self.intervalo_verificacion = (intervalo_verificacion if intervalo_verificacion is not None
+                                       else float(os.getenv('RESUMENES_CHECK_INTERVAL', 300)))
+        self.activos = os.getenv('RESUMENES_USUARIO', '1') != '0'
+        self._disponibles = False
+        self._ultima_verificacion = None
+        self._lock = threading.Lock()
+
+    def disponible(self):
+        """True si existen las tablas de resúmenes con todas sus columnas"""
+        if not self.activos:
+            return False
+        ahora = time.monotonic()
+        if self._ultima_verificacion is not None and ahora - self._ultima_verificacion < self.intervalo_verificacion:
+            return self._disponibles
+
+        with self._lock:
+            if self._ultima_verificacion is None or time.monotonic() - self._ultima_verificacion >= self.intervalo_verificacion:
+                self._ultima_verificacion = time.monotonic()
+                connection = obtener_conexion()
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("SELECT primeraFecha, ultimaRespuesta, ultimoIdRespuesta FROM ResumenUsuarioPregunta LIMIT 1")
+                    cursor.fetchall()
+                    cursor.execute("SELECT 1 FROM ResumenUsuarioCategoria LIMIT 1")
+                    cursor.fetchall()
+                    cursor.execute("SELECT 1 FROM ResumenUsuarioDia LIMIT 1")
+                    cursor.fetchall()
+                    self._disponibles = True
+                except mysql.connector.errors.ProgrammingError:
+                    self._disponibles = False
+                finally:
+                    cursor.close()
+                    connection.close()
+        return self._disponibles
+
+
+_resumenes = ResumenesUsuario()
+
+
+def obtener_resumenes():
+    """Estado de los resúmenes por usuario del proceso"""
+    return _resumenes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Instala, reconstruye y compacta los resúmenes de respuestas por usuario')
+    parser.add_argument('--instalar', action='store_true',
+                        help='crea las tablas y los triggers antes de reconstruir')
+    parser.add_argument('--bloque', type=int, default=1000,
+                        help='usuarios por transacción de reconstrucción')
+    parser.add_argument('--sin-reconstruir', action='store_true',
+                        help='no recalcula los resúmenes (p. ej. para solo archivar)')
+    parser.add_argument('--archivar', action='store_true',
+                        help='mueve al archivo las respuestas más antiguas que la retención')
+    parser.add_argument('--retencion', type=int, default=None,
+                        help='días de respuestas que se quedan en Usuarios_has_Preguntas (RESUMENES_RETENCION_DIAS, 180)')
+    args = parser.parse_args()
+
+    inicio = time.monotonic()
+    if args.instalar:
+        instalar()
+    if not args.sin_reconstruir:
+        total = reconstruir(usuarios_por_bloque=args.bloque)
+        print(f'Resúmenes reconstruidos para el rango de {total} usuarios en {time.monotonic() - inicio:.1f}s')
+    if args.archivar:
+        inicio = time.monotonic()
+        total = archivar(retencion_dias=args.retencion)
+        print(f'{total} respuestas archivadas en {time.monotonic() - inicio:.1f}s')
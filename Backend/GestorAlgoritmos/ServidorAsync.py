@@ -0,0 +1,200 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import pymysql
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route, Mount
+from PoolConexiones import obtener_pool, abrir_medicion, cerrar_medicion, heredar_mediciones, mediciones_actuales
+from PoolConexionesAsync import obtener_pool_async
+from Precalentamiento import precalentar, marcar_listo, estado_worker
+from Metricas import exposicion
+from TrazaSQL import CABECERA_DEPURACION, cabeceras, resumen, revisar_presupuesto
+from PartesQuiz import TIPO_NDJSON, lineas_ndjson
+from ManifiestoAudios import obtener_manifiesto_audios
+from app import app as app_flask, registro
+
+# Variante ASGI de GestorAlgoritmos: uvicorn ServidorAsync:app --host 0.0.0.0 --port 3014
+#
+# Solo POST /algoritmos/{algoritmo} (y /health, /ready y /metrics) es nativo: sus consultas previas
+# (consultas_precarga) esperan en el bucle de eventos con aiomysql, así que un worker puede tener cientos
+# de peticiones esperando a la base de datos sin un hilo por petición. Lo que depende de CPU (similitudes
+# con NumPy, selección y distractores) y las consultas que dependen de un resultado previo se ejecutan
+# después en un pequeño pool de hilos. El resto de rutas de la aplicación Flask (/respuestas/lote,
+# /catalogo/invalidar, /algoritmos/batch, /algoritmos/disponibles, los /estado...) se sirven tal cual a
+# través de a2wsgi, así que esta variante puede sustituir a la de gunicorn en el mismo puerto.
+#
+# Hoy cada algoritmo tiene como mucho una consulta previa independiente: las preguntas respondidas, las
+# respuestas del usuario y los usuarios candidatos salen de la memoria (BitmapsRespondidas,
+# EstadisticasRespuestas, SimilitudUsuarios), no de la base de datos. ejecutar_consultas las lanzaría a la
+# vez si un algoritmo declarase varias.
+_ejecutor_cpu = ThreadPoolExecutor(max_workers=int(os.getenv('ASYNC_HILOS_CPU', os.cpu_count() or 1)),
+                                   thread_name_prefix='cpu')
+
+
+def respuesta(contenido, estado=200, headers=None):
+    # Misma serialización que Flask (Decimal, fechas) para que ambas variantes respondan igual
+    return Response(app_flask.json.dumps(contenido), status_code=estado, headers=headers,
+                    media_type='application/json')
+
+
+def _ejecutar_sincrono(slug, algoritmo, data, mediciones, audio):
+    # El hilo del ejecutor no hereda el contexto: sus consultas se suman a las mediciones de la petición
+    token = heredar_mediciones(mediciones)
+    try:
+        with obtener_pool().ambito():
+            resultado = registro.ejecutar(slug, data, algoritmo)
+        return obtener_manifiesto_audios().anotar_resultado(resultado) if audio else resultado
+    finally:
+        cerrar_medicion(token)
+
+
+def _producir_lineas(slug, algoritmo, data, mediciones, audio, loop, cola):
+    # Cada línea NDJSON pasa al bucle de eventos en cuanto el algoritmo la genera; None marca el final
+    token = heredar_mediciones(mediciones)
+    try:
+        with obtener_pool().ambito():
+            partes = registro.ejecutar_por_partes(slug, data, algoritmo)
+            if audio:
+                partes = obtener_manifiesto_audios().anotar_partes(partes)
+            for linea in lineas_ndjson(partes, app_flask.json.dumps):
+                loop.call_soon_threadsafe(cola.put_nowait, linea)
+    finally:
+        cerrar_medicion(token)
+        loop.call_soon_threadsafe(cola.put_nowait, None)
+
+
+async def health_check(request):
+    return respuesta({'status': 'ok', 'service': 'GestorAlgoritmos', 'modo': 'asgi', 'pool': obtener_pool_async().estado()})
+
+
+async def readiness_check(request):
+    estado = await asyncio.get_running_loop().run_in_executor(_ejecutor_cpu, estado_worker)
+    return respuesta(estado, 200 if estado['listo'] else 503)
+
+
+async def metricas(request):
+    contenido, tipo = exposicion()
+    return Response(contenido, headers={'Content-Type': tipo})
+
+
+async def ejecutar_algoritmo(request):
+    slug = request.path_params['algoritmo']
+    if slug not in registro:
+        return respuesta({'success': False, 'error': 'Algoritmo no encontrado'}, 404)
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    # Mismo ?audio=1 que la variante Flask: datos del audio y URL versionada en cada pregunta
+    audio = request.query_params.get('audio', '').lower() in ('1', 'true', 'si')
+
+    if TIPO_NDJSON in request.headers.get('accept', ''):
+        return StreamingResponse(_lineas_algoritmo(slug, data, audio, request.url.path,
+                                                   bool(request.headers.get(CABECERA_DEPURACION))), media_type=TIPO_NDJSON,
+                                 headers={'X-Accel-Buffering': 'no'})
+
+    medicion, token = abrir_medicion(trazar=True)
+    try:
+        contenido, estado = await _ejecutar_algoritmo(slug, data, audio)
+    finally:
+        cerrar_medicion(token)
+    revisar_presupuesto(f'POST {request.url.path}', medicion)
+    return respuesta(contenido, estado, cabeceras(medicion) if request.headers.get(CABECERA_DEPURACION) else None)
+
+
+async def _precargar(algoritmo, data):
+    """Lanza a la vez las consultas_precarga del algoritmo; devuelve el resultado de error si fallan, o None"""
+    usuario_id = data.get('usuario_id') if isinstance(data, dict) else None
+    if usuario_id is not None and hasattr(algoritmo, 'consultas_precarga'):
+        consultas = algoritmo.consultas_precarga([usuario_id])
+        try:
+            resultados = await obtener_pool_async().ejecutar_consultas(consultas)
+        except pymysql.err.MySQLError as db_error:
+            return {
+                'estado': 'error',
+                'mensaje': f'Error de base de datos: {str(db_error)}'
+            }
+        algoritmo.guardar_precarga(resultados, [usuario_id])
+    return None
+
+
+async def _ejecutar_algoritmo(slug, data, audio):
+    try:
+        # Copia propia: la precarga de esta petición no debe verse desde otras
+        algoritmo = registro.nueva(slug)
+        error = await _precargar(algoritmo, data)
+        if error is not None:
+            return {'success': True, 'resultado': error}, 200
+
+        loop = asyncio.get_running_loop()
+        resultado = await loop.run_in_executor(_ejecutor_cpu, _ejecutar_sincrono, slug, algoritmo, data,
+                                               mediciones_actuales(), audio)
+        return {'success': True, 'resultado': resultado}, 200
+    except Exception as e:
+        return {'success': False, 'error': str(e)}, 500
+
+
+async def _lineas_algoritmo(slug, data, audio, ruta, depuracion):
+    """Respuesta NDJSON: una línea por pregunta en cuanto está lista y una última con el resumen.
+
+    Las cabeceras salen antes de las consultas: con X-Debug-SQL su resumen va en una línea final {'tipo': 'sql'}.
+    """
+    medicion, token = abrir_medicion(trazar=True)
+    try:
+        algoritmo = registro.nueva(slug)
+        error = await _precargar(algoritmo, data)
+        if error is not None:
+            yield app_flask.json.dumps({'tipo': 'resumen', 'success': True, 'resultado': error}) + '\n'
+        else:
+            loop = asyncio.get_running_loop()
+            cola = asyncio.Queue()
+            produccion = loop.run_in_executor(_ejecutor_cpu, _producir_lineas, slug, algoritmo, data,
+                                              mediciones_actuales(), audio, loop, cola)
+            while (linea := await cola.get()) is not None:
+                yield linea
+            await produccion
+    except Exception as e:
+        yield app_flask.json.dumps({'tipo': 'resumen', 'success': False, 'error': str(e)}) + '\n'
+    else:
+        if depuracion:
+            yield app_flask.json.dumps({'tipo': 'sql', **resumen(medicion)}) + '\n'
+    finally:
+        cerrar_medicion(token)
+        revisar_presupuesto(f'POST {ruta}', medicion)
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    await obtener_pool_async().iniciar()
+    await asyncio.get_running_loop().run_in_executor(_ejecutor_cpu, precalentar)
+    marcar_listo()
+    yield
+    await obtener_pool_async().cerrar()
+
+
+# Las rutas de Flask se ejecutan en los hilos propios de a2wsgi, igual que bajo gunicorn
+app_wsgi = WSGIMiddleware(app_flask, workers=int(os.getenv('ASYNC_HILOS_WSGI', 10)))
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/ready', readiness_check, methods=['GET']),
+        Route('/metrics', metricas, methods=['GET']),
+        # Antes que /algoritmos/{algoritmo}, que la tomaría por un algoritmo llamado 'batch'
+        Route('/algoritmos/batch', app_wsgi, methods=['POST']),
+        Route('/algoritmos/{algoritmo}', ejecutar_algoritmo, methods=['POST']),
+        Mount('/', app=app_wsgi)
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=ciclo_de_vida
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 3014)))
@@ -0,0 +1,309 @@
+import os
+import time
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import mysql.connector
+from PoolConexiones import obtener_conexion
+from MatrizRespuestas import MatrizRespuestas, posiciones_de_filas
+from ResumenesUsuario import obtener_resumenes
+
+MIN_USUARIOS_COMUNES = 3
+
+DDL_SIMILITUD = """
+    CREATE TABLE IF NOT EXISTS SimilitudPreguntas (
+        idPregunta INT NOT NULL,
+        idVecino INT NOT NULL,
+        similitud FLOAT NOT NULL,
+        fechaCalculo DATETIME NOT NULL,
+        PRIMARY KEY (idPregunta, idVecino)
+    ) ENGINE = InnoDB
+"""
+
+# Matrices compartidas con los procesos hijos: se heredan al hacer fork sin serializarlas
+_matriz = None
+_transpuesta = None
+
+
+def pearson_binaria(n, sx, sy, sxy, minimo=MIN_USUARIOS_COMUNES):
+    """Correlación de Pearson vectorizada de variables 0/1 a partir de sus sumas (n, Σx, Σy, Σxy)"""
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covarianza = sxy - sx * sy / n
+        varianza_x = sx - sx * sx / n
+        varianza_y = sy - sy * sy / n
+        correlacion = covarianza / np.sqrt(varianza_x * varianza_y)
+    correlacion[~np.isfinite(correlacion) | (n < minimo)] = 0
+    return correlacion
+
+
+def correlaciones_pregunta(columna, matriz, transpuesta):
+    """Correlación de una pregunta con todas las demás, sobre los usuarios que han respondido ambas"""
+    inicio, fin = transpuesta.indptr[columna], transpuesta.indptr[columna + 1]
+    filas = transpuesta.indices[inicio:fin]
+    x = transpuesta.valores[inicio:fin].astype(np.float64)
+
+    posiciones, longitudes = posiciones_de_filas(matriz.indptr, filas)
+    columnas = matriz.indices[posiciones]
+    y = matriz.valores[posiciones].astype(np.float64)
+    x_repetida = np.repeat(x, longitudes)
+
+    total = len(matriz.preguntas)
+    n = np.bincount(columnas, minlength=total)
+    sx = np.bincount(columnas, weights=x_repetida, minlength=total)
+    sy = np.bincount(columnas, weights=y, minlength=total)
+    sxy = np.bincount(columnas, weights=x_repetida * y, minlength=total)
+    return pearson_binaria(n, sx, sy, sxy)
+
+
+def top_k(valores, k):
+    """Índices de los k valores positivos más altos, ordenados de mayor a menor"""
+    positivos = np.flatnonzero(valores > 0)
+    if len(positivos) > k:
+        positivos = positivos[np.argpartition(-valores[positivos], k - 1)[:k]]
+    return positivos[np.argsort(-valores[positivos], kind='stable')]
+
+
+def _vecinos_bloque(columnas, k):
+    resultado = []
+    for columna in columnas:
+        correlaciones = correlaciones_pregunta(columna, _matriz, _transpuesta)
+        correlaciones[columna] = 0
+        mejores = top_k(correlaciones, k)
+        resultado.append((
+            int(_matriz.preguntas[columna]),
+            [(int(_matriz.preguntas[j]), float(correlaciones[j])) for j in mejores]
+        ))
+    return resultado
+
+
+def similitudes_coocurrencia(preguntas_base, excluidas, minimo=MIN_USUARIOS_COMUNES):
+    """Similitud máxima de cada pregunta no excluida con las preguntas base, calculada en el momento.
+
+    Una sola consulta agrupada devuelve, para cada par (pregunta base, otra pregunta), cuántos usuarios
+    han respondido ambas y las sumas de sus últimas respuestas; la correlación de todos los pares se
+    calcula después de una vez con pearson_binaria. El número de consultas no depende del historial.
+    """
+    preguntas_base = list(preguntas_base)
+    if not preguntas_base:
+        return {}
+    marcadores = ','.join(['%s'] * len(preguntas_base))
+    if obtener_resumenes().disponible():
+        # El resumen por usuario y pregunta ya guarda la última respuesta: no hay que ordenar el historial
+        query = f"""
+            WITH ultimas AS (
+                SELECT Usuarios_idUsuario, Preguntas_idPregunta, ultimaRespuesta AS valor
+                FROM ResumenUsuarioPregunta
+                WHERE Usuarios_idUsuario IN (
+                    SELECT Usuarios_idUsuario FROM ResumenUsuarioPregunta WHERE Preguntas_idPregunta IN ({marcadores})
+                )
+            )
+            SELECT otra.Preguntas_idPregunta, COUNT(*), SUM(base.valor), SUM(otra.valor), SUM(base.valor * otra.valor)
+            FROM ultimas base
+            INNER JOIN ultimas otra ON otra.Usuarios_idUsuario = base.Usuarios_idUsuario
+                AND otra.Preguntas_idPregunta <> base.Preguntas_idPregunta
+            WHERE base.Preguntas_idPregunta IN ({marcadores})
+            GROUP BY base.Preguntas_idPregunta, otra.Preguntas_idPregunta
+            HAVING COUNT(*) >= %s
+        """
+    else:
+        query = f"""
+            WITH respuestas AS (
+                SELECT Usuarios_idUsuario, Preguntas_idPregunta, COALESCE(respuestaCorrecta, 0) AS valor,
+                       ROW_NUMBER() OVER (PARTITION BY Usuarios_idUsuario, Preguntas_idPregunta
+                                          ORDER BY idRespuesta DESC) AS orden
+                FROM Usuarios_has_Preguntas
+                WHERE Usuarios_idUsuario IN (
+                    SELECT Usuarios_idUsuario FROM Usuarios_has_Preguntas WHERE Preguntas_idPregunta IN ({marcadores})
+                )
+            ),
+            ultimas AS (
+                SELECT Usuarios_idUsuario, Preguntas_idPregunta, valor FROM respuestas WHERE orden = 1
+            )
+            SELECT otra.Preguntas_idPregunta, COUNT(*), SUM(base.valor), SUM(otra.valor), SUM(base.valor * otra.valor)
+            FROM ultimas base
+            INNER JOIN ultimas otra ON otra.Usuarios_idUsuario = base.Usuarios_idUsuario
+                AND otra.Preguntas_idPregunta <> base.Preguntas_idPregunta
+            WHERE base.Preguntas_idPregunta IN ({marcadores})
+            GROUP BY base.Preguntas_idPregunta, otra.Preguntas_idPregunta
+            HAVING COUNT(*) >= %s
+        """
+    connection = obtener_conexion()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(query, preguntas_base + preguntas_base + [minimo])
+        filas = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+    if not filas:
+        return {}
+
+    columnas = np.array(filas, dtype=np.float64).reshape(-1, 5)
+    correlaciones = pearson_binaria(columnas[:, 1], columnas[:, 2], columnas[:, 3], columnas[:, 4], minimo)
+    excluidas = set(excluidas) | set(preguntas_base)
+    similitudes = {}
+    for pregunta, similitud in zip(columnas[:, 0].astype(np.int64).tolist(), correlaciones.tolist()):
+        if similitud > similitudes.get(pregunta, 0) and pregunta not in excluidas:
+            similitudes[pregunta] = similitud
+    return similitudes
+
+
+def calcular_vecinos(matriz, k=50, procesos=None, tamano_bloque=64):
+    """Top-K vecinos de cada pregunta, repartiendo bloques de preguntas entre los núcleos disponibles"""
+    global _matriz, _transpuesta
+    _matriz = matriz
+    _transpuesta = matriz.transpuesta()
+
+    total = len(matriz.preguntas)
+    bloques = [list(range(i, min(i + tamano_bloque, total))) for i in range(0, total, tamano_bloque)]
+    procesos = procesos or os.cpu_count() or 1
+
+    if procesos == 1 or len(bloques) <= 1:
+        resultados = [_vecinos_bloque(bloque, k) for bloque in bloques]
+    else:
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as ejecutor:
+            resultados = list(ejecutor.map(_vecinos_bloque, bloques, [k] * len(bloques)))
+
+    return {pregunta: vecinos for bloque in resultados for pregunta, vecinos in bloque}
+
+
+def guardar_vecinos(vecinos, tamano_lote=5000):
+    """Sustituye de forma atómica el contenido de SimilitudPreguntas por los vecinos calculados"""
+    fecha_calculo = datetime.now().replace(microsecond=0)
+    filas = [(pregunta, vecino, similitud, fecha_calculo)
+             for pregunta, lista in vecinos.items()
+             for vecino, similitud in lista]
+
+    connection = obtener_conexion()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(DDL_SIMILITUD)
+        cursor.execute("DROP TABLE IF EXISTS SimilitudPreguntasNueva")
+        cursor.execute("CREATE TABLE SimilitudPreguntasNueva LIKE SimilitudPreguntas")
+        for i in range(0, len(filas), tamano_lote):
+            cursor.executemany(
+                "INSERT INTO SimilitudPreguntasNueva (idPregunta, idVecino, similitud, fechaCalculo) VALUES (%s, %s, %s, %s)",
+                filas[i:i + tamano_lote]
+            )
+        connection.commit()
+
+        # Los lectores ven la tabla antigua o la nueva completa, nunca una a medio escribir
+        cursor.execute("DROP TABLE IF EXISTS SimilitudPreguntasAntigua")
+        cursor.execute("RENAME TABLE SimilitudPreguntas TO SimilitudPreguntasAntigua, SimilitudPreguntasNueva TO SimilitudPreguntas")
+        cursor.execute("DROP TABLE SimilitudPreguntasAntigua")
+    finally:
+        cursor.close()
+        connection.close()
+
+    return len(filas)
+
+
+class IndiceSimilitudItems:
+    """Vecinos precalculados de cada pregunta, cargados en memoria desde SimilitudPreguntas.
+
+    La correlación de Pearson no cambia al invertir ambas variables, así que la similitud por
+    fallos (AlgoritmoItemPositivo) y por aciertos (AlgoritmoItemNegativo) es la misma y ambos
+    algoritmos comparten estas listas.
+    """
+
+    def __init__(self, intervalo_verificacion=None, max_antiguedad=None):
+        self.intervalo_verificacion = (intervalo_verificacion if intervalo_verificacion is not None
+                                       else float(os.getenv('SIMILITUD_ITEMS_CHECK_INTERVAL', 300)))
+        # Segundos tras los que un cálculo publicado deja de considerarse al día (0: sin límite)
+        self.max_antiguedad = (max_antiguedad if max_antiguedad is not None
+                               else float(os.getenv('SIMILITUD_ITEMS_MAX_ANTIGUEDAD', 2 * 86400)))
+        self.vecinos = {}
+        self.fecha_calculo = None
+        self._ultima_verificacion = None
+        self._lock = threading.Lock()
+
+    def _actualizar(self):
+        """Recarga las listas si el batch ha publicado un cálculo nuevo"""
+        ahora = time.monotonic()
+        if self._ultima_verificacion is not None and ahora - self._ultima_verificacion < self.intervalo_verificacion:
+            return
+
+        with self._lock:
+            if self._ultima_verificacion is not None and time.monotonic() - self._ultima_verificacion < self.intervalo_verificacion:
+                return
+            self._ultima_verificacion = time.monotonic()
+
+            connection = obtener_conexion()
+            cursor = connection.cursor()
+            try:
+                try:
+                    cursor.execute("SELECT fechaCalculo FROM SimilitudPreguntas LIMIT 1")
+                    fila = cursor.fetchone()
+                except mysql.connector.errors.ProgrammingError:
+                    # El batch aún no se ha ejecutado nunca y la tabla no existe
+                    fila = None
+                fecha_calculo = fila[0] if fila else None
+
+                if fecha_calculo != self.fecha_calculo:
+                    vecinos = {}
+                    if fecha_calculo is not None:
+                        cursor.execute("""
+                            SELECT idPregunta, idVecino, similitud
+                            FROM SimilitudPreguntas
+                            ORDER BY idPregunta, similitud DESC
+                        """)
+                        for pregunta, vecino, similitud in cursor.fetchall():
+                            vecinos.setdefault(pregunta, []).append((vecino, similitud))
+                    self.vecinos = vecinos
+                    self.fecha_calculo = fecha_calculo
+            finally:
+                cursor.close()
+                connection.close()
+
+    def disponible(self):
+        """True si hay un cálculo publicado que se pueda usar"""
+        self._actualizar()
+        return bool(self.vecinos)
+
+    def vigente(self):
+        """True si hay un cálculo publicado y no es más antiguo que max_antiguedad"""
+        if not self.disponible():
+            return False
+        if not self.max_antiguedad or not isinstance(self.fecha_calculo, datetime):
+            return True
+        return (datetime.now() - self.fecha_calculo).total_seconds() <= self.max_antiguedad
+
+    def preguntas_similares(self, preguntas_base, excluidas):
+        """Similitud máxima de cada pregunta no excluida con alguna de las preguntas base"""
+        self._actualizar()
+        vecinos = self.vecinos
+        similitudes = {}
+        for pregunta_base in preguntas_base:
+            for vecino, similitud in vecinos.get(pregunta_base, ()):
+                if vecino not in excluidas and similitud > similitudes.get(vecino, 0):
+                    similitudes[vecino] = similitud
+        return similitudes
+
+
+_indice = IndiceSimilitudItems()
+
+
+def obtener_indice_similitud_items():
+    """Índice de similitud entre preguntas del proceso"""
+    return _indice
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calcula y publica los vecinos más similares de cada pregunta')
+    parser.add_argument('--k', type=int, default=int(os.getenv('SIMILITUD_ITEMS_K', 50)),
+                        help='vecinos a guardar por pregunta')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='procesos de cálculo (por defecto, uno por núcleo)')
+    args = parser.parse_args()
+
+    inicio = time.monotonic()
+    matriz = MatrizRespuestas.cargar()
+    vecinos = calcular_vecinos(matriz, k=args.k, procesos=args.procesos)
+    total = guardar_vecinos(vecinos)
+    print(f'{total} pares de similitud guardados para {len(vecinos)} preguntas '
+          f'({matriz.forma[0]} usuarios) en {time.monotonic() - inicio:.1f}s')
@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+import numpy as np
+from MatrizRespuestas import posiciones_de_filas
+from EstadisticasRespuestas import obtener_estadisticas
+from IndiceLSHUsuarios import IndiceLSHUsuarios
+from SimilitudItems import pearson_binaria, top_k
+
+MIN_RESPUESTAS = 5
+MIN_PREGUNTAS_COMUNES = 3
+
+# Modos de búsqueda de usuarios similares
+MODO_EXACTO = 'exacto'
+MODO_APROXIMADO = 'aproximado'
+MODO_AUTO = 'auto'
+
+
+def pearson_respuestas(respuestas1, respuestas2, minimo=MIN_PREGUNTAS_COMUNES):
+    """Pearson de dos usuarios sobre sus preguntas comunes a partir de {pregunta: última respuesta}"""
+    comunes = respuestas1.keys() & respuestas2.keys()
+    n = len(comunes)
+    sx = sum(respuestas1[p] for p in comunes)
+    sy = sum(respuestas2[p] for p in comunes)
+    sxy = sum(respuestas1[p] * respuestas2[p] for p in comunes)
+    return float(pearson_binaria(np.array([n]), np.array([sx]), np.array([sy]), np.array([sxy]), minimo)[0])
+
+
+def puntuar_todos(base, columnas, x):
+    """Sumas de Pearson de todos los usuarios de la base contra el perfil (columnas, x), vía la transpuesta"""
+    transpuesta = base.transpuesta
+    posiciones, longitudes = posiciones_de_filas(transpuesta.indptr, columnas)
+    filas = transpuesta.indices[posiciones]
+    y = transpuesta.valores[posiciones].astype(np.float64)
+    x_repetida = np.repeat(x, longitudes)
+
+    total = len(base.matriz.usuarios)
+    n = np.bincount(filas, minlength=total)
+    respuestas = np.bincount(filas, weights=transpuesta.intentos[posiciones], minlength=total)
+    sx = np.bincount(filas, weights=x_repetida, minlength=total)
+    sy = np.bincount(filas, weights=y, minlength=total)
+    sxy = np.bincount(filas, weights=x_repetida * y, minlength=total)
+    return n, respuestas, sx, sy, sxy
+
+
+def puntuar_filas(base, filas_usuarios, columnas, x):
+    """Las mismas sumas solo para algunas filas de la base, recorriendo sus filas de la matriz"""
+    matriz = base.matriz
+    x_por_columna = np.full(len(matriz.preguntas), -1, dtype=np.int8)
+    x_por_columna[columnas] = x
+
+    posiciones, longitudes = posiciones_de_filas(matriz.indptr, filas_usuarios)
+    locales = np.repeat(np.arange(len(filas_usuarios)), longitudes)
+    xs = x_por_columna[matriz.indices[posiciones]]
+    comunes = xs >= 0
+    locales, posiciones = locales[comunes], posiciones[comunes]
+    xs = xs[comunes].astype(np.float64)
+    y = matriz.valores[posiciones].astype(np.float64)
+
+    total = len(filas_usuarios)
+    n = np.bincount(locales, minlength=total)
+    respuestas = np.bincount(locales, weights=matriz.intentos[posiciones], minlength=total)
+    sx = np.bincount(locales, weights=xs, minlength=total)
+    sy = np.bincount(locales, weights=y, minlength=total)
+    sxy = np.bincount(locales, weights=xs * y, minlength=total)
+    return n, respuestas, sx, sy, sxy
+
+
+class MotorSimilitudUsuarios:
+    """Similitud de Pearson de un usuario contra los demás sobre la matriz base de EstadisticasRespuestas.
+
+    En modo exacto se puntúa a todos los usuarios en una sola pasada vectorizada. En modo aproximado
+    un índice MinHash/LSH propone una lista corta de candidatos que luego se puntúa de forma exacta;
+    el modo auto usa el aproximado a partir de SIMILITUD_USUARIOS_MIN_ANN usuarios. Los usuarios con
+    respuestas posteriores a la base, que son pocos, siempre se recalculan desde su estado en memoria.
+    """
+
+    def __init__(self, estadisticas=None, modo=None, minimo_aproximado=None, intervalo_reconstruccion=None):
+        self.estadisticas = estadisticas or obtener_estadisticas()
+        self.modo = modo or os.getenv('SIMILITUD_USUARIOS_MODO', MODO_AUTO)
+        self.minimo_aproximado = minimo_aproximado or int(os.getenv('SIMILITUD_USUARIOS_MIN_ANN', 200000))
+        self.intervalo_reconstruccion = (intervalo_reconstruccion if intervalo_reconstruccion is not None
+                                         else float(os.getenv('LSH_INTERVALO_RECONSTRUCCION', 300)))
+        self._indice_lsh = None
+        self._base_indice = None
+        self._construyendo = None
+        self._lock = threading.Lock()
+
+    def _usar_aproximado(self, base):
+        if self.modo == MODO_APROXIMADO:
+            return True
+        return self.modo == MODO_AUTO and len(base.matriz.usuarios) >= self.minimo_aproximado
+
+    def _construir_indice(self, base):
+        try:
+            self._indice_lsh = IndiceLSHUsuarios(base.matriz)
+            self._base_indice = base.creada
+        finally:
+            self._construyendo = None
+
+    def obtener_indice_lsh(self, base):
+        """Índice LSH vigente. Si la base ha cambiado se reconstruye en segundo plano, como mucho una vez
+        por intervalo; mientras tanto se sigue usando el anterior (None si aún no hay ninguno)"""
+        indice = self._indice_lsh
+        if self._base_indice == base.creada:
+            return indice
+        if indice is not None and time.monotonic() - indice.creado < self.intervalo_reconstruccion:
+            return indice
+        with self._lock:
+            if self._construyendo is None:
+                self._construyendo = threading.Thread(target=self._construir_indice, args=(base,), daemon=True)
+                self._construyendo.start()
+        return indice
+
+    def preparar(self):
+        """Construye ya el índice LSH si se va a usar (p. ej. antes de hacer fork, para compartirlo)"""
+        base, _ = self.estadisticas.instantanea_usuarios()
+        if self._usar_aproximado(base) and self._base_indice != base.creada:
+            self._construir_indice(base)
+
+    def similitudes(self, usuario_id, respuestas_usuario):
+        """Pearson del usuario contra los demás; devuelve (ids de usuario, similitudes)"""
+        base, cambios = self.estadisticas.instantanea_usuarios()
+        matriz = base.matriz
+
+        columnas, valores = [], []
+        for pregunta, correcta in respuestas_usuario.items():
+            columna = matriz.columna_pregunta.get(pregunta)
+            if columna is not None:
+                columnas.append(columna)
+                valores.append(correcta or 0)
+        columnas = np.asarray(columnas, dtype=np.int64)
+        x = np.asarray(valores, dtype=np.float64)
+
+        indice = self.obtener_indice_lsh(base) if self._usar_aproximado(base) else None
+        if indice is None:
+            usuarios = matriz.usuarios
+            sumas = puntuar_todos(base, columnas, x)
+        else:
+            # Lista corta de candidatos del índice, puntuada de forma exacta con la base actual
+            candidatos = indice.candidatos(respuestas_usuario)
+            filas = np.searchsorted(matriz.usuarios, candidatos)
+            filas = filas[filas < len(matriz.usuarios)]
+            filas = filas[np.isin(matriz.usuarios[filas], candidatos)]
+            usuarios = matriz.usuarios[filas]
+            sumas = puntuar_filas(base, filas, columnas, x)
+
+        n, respuestas, sx, sy, sxy = sumas
+        correlacion = pearson_binaria(n, sx, sy, sxy, minimo=MIN_PREGUNTAS_COMUNES)
+        # Solo cuentan usuarios con al menos MIN_RESPUESTAS respuestas a las preguntas del objetivo
+        correlacion[respuestas < MIN_RESPUESTAS] = 0
+
+        # Usuarios con respuestas posteriores a la matriz base: su estado en memoria sustituye al de la base
+        objetivo = {p: c or 0 for p, c in respuestas_usuario.items()}
+        usuarios_cambiados, correlaciones_cambiadas = [], []
+        for otro_id, respuestas_otro in cambios.items():
+            comunes = objetivo.keys() & respuestas_otro.keys()
+            similitud = 0
+            if sum(respuestas_otro[p][1] for p in comunes) >= MIN_RESPUESTAS:
+                similitud = pearson_respuestas(objetivo, {p: respuestas_otro[p][0] for p in comunes})
+            usuarios_cambiados.append(otro_id)
+            correlaciones_cambiadas.append(similitud)
+
+        if usuarios_cambiados:
+            usuarios_cambiados = np.asarray(usuarios_cambiados, dtype=np.int64)
+            conservar = ~np.isin(usuarios, usuarios_cambiados)
+            usuarios = np.concatenate((usuarios[conservar], usuarios_cambiados))
+            correlacion = np.concatenate((correlacion[conservar], np.asarray(correlaciones_cambiadas, dtype=np.float64)))
+
+        correlacion[usuarios == usuario_id] = 0
+        return usuarios, correlacion
+
+    def usuarios_similares(self, usuario_id, respuestas_usuario, limite=10):
+        """Los `limite` usuarios con similitud positiva más alta, de mayor a menor"""
+        usuarios, correlacion = self.similitudes(usuario_id, respuestas_usuario)
+        mejores = top_k(correlacion, limite)
+        return [(int(usuarios[i]), float(correlacion[i])) for i in mejores]
+
+
+_motor = MotorSimilitudUsuarios()
+
+
+def obtener_motor_similitud_usuarios():
+    """Motor de similitud entre usuarios del proceso"""
+    return _motor
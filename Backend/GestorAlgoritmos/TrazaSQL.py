@@ -0,0 +1,93 @@
+import os
+import re
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from PoolConexiones import medir_consultas
+
+logger = logging.getLogger(__name__)
+
+# Con esta cabecera en la petición, la respuesta incluye el resumen de sus consultas
+CABECERA_DEPURACION = 'X-Debug-SQL'
+
+
+def _presupuesto_consultas():
+    return int(os.getenv('SQL_PRESUPUESTO_CONSULTAS', 25))
+
+
+def _presupuesto_ms():
+    return float(os.getenv('SQL_PRESUPUESTO_MS', 500))
+
+
+def normalizar(sentencia):
+    """Forma de la sentencia sin espacios de más ni listas IN concretas, para agrupar repeticiones"""
+    if isinstance(sentencia, (bytes, bytearray)):
+        sentencia = sentencia.decode('utf-8', 'replace')
+    sentencia = re.sub(r'\s+', ' ', str(sentencia or '')).strip()
+    return re.sub(r'IN \((%s, ?)*%s\)', 'IN (...)', sentencia)
+
+
+def resumen(medicion):
+    """Totales de una medición: consultas, ms en base de datos y filas"""
+    return {
+        'consultas': medicion['consultas'],
+        'db_ms': round(medicion['segundos'] * 1000, 1),
+        'filas': sum(traza['filas'] for traza in medicion.get('sentencias', ()))
+    }
+
+
+def cabeceras(medicion):
+    """Cabeceras de respuesta con el resumen de la medición"""
+    datos = resumen(medicion)
+    return {
+        'X-SQL-Consultas': str(datos['consultas']),
+        'X-SQL-Tiempo-Ms': str(datos['db_ms']),
+        'X-SQL-Filas': str(datos['filas'])
+    }
+
+
+def describir(medicion, limite=5):
+    """Texto con las sentencias más repetidas y las más lentas, para el log"""
+    sentencias = medicion.get('sentencias', [])
+    repetidas = Counter(normalizar(traza['sql']) for traza in sentencias).most_common(limite)
+    lentas = sorted(sentencias, key=lambda traza: traza['segundos'], reverse=True)[:limite]
+    lineas = ['  repetidas:'] + [f'    {veces}x {sql[:200]}' for sql, veces in repetidas if veces > 1]
+    lineas += ['  más lentas:'] + [
+        f"    {traza['segundos'] * 1000:.1f} ms, {traza['filas']} filas: {normalizar(traza['sql'])[:200]}"
+        for traza in lentas
+    ]
+    return '\n'.join(lineas)
+
+
+def revisar_presupuesto(descripcion, medicion):
+    """Registra en el log las peticiones que superan el presupuesto de consultas o de tiempo; True si lo superan"""
+    datos = resumen(medicion)
+    if datos['consultas'] <= _presupuesto_consultas() and datos['db_ms'] <= _presupuesto_ms():
+        return False
+    logger.warning('%s superó el presupuesto de base de datos (%s consultas, %s ms; máximo %s consultas, %s ms)\n%s',
+                   descripcion, datos['consultas'], datos['db_ms'], _presupuesto_consultas(), _presupuesto_ms(),
+                   describir(medicion))
+    return True
+
+
+@contextmanager
+def limite_consultas(maximo, maximo_ms=None):
+    """Para tests: falla con AssertionError si el bloque hace más de `maximo` consultas (o tarda más de maximo_ms).
+
+        with limite_consultas(3):
+            obtener_registro().ejecutar('item-positivo', {'usuario_id': 1})
+    """
+    with medir_consultas(trazar=True) as medicion:
+        yield medicion
+    datos = resumen(medicion)
+    if datos['consultas'] > maximo:
+        raise AssertionError(f"{datos['consultas']} consultas (máximo {maximo})\n{describir(medicion)}")
+    if maximo_ms is not None and datos['db_ms'] > maximo_ms:
+        raise AssertionError(f"{datos['db_ms']} ms en base de datos (máximo {maximo_ms} ms)\n{describir(medicion)}")
+
+
+def comprobar_algoritmo(slug, data, maximo, maximo_ms=None):
+    """Ejecuta un algoritmo del registro y falla si supera el máximo de consultas; devuelve su resultado"""
+    from RegistroAlgoritmos import obtener_registro
+    with limite_consultas(maximo, maximo_ms):
+        return obtener_registro().ejecutar(slug, data)
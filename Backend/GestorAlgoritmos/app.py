@@ -1,209 +1,244 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
-import mysql.connector
 import os
-from AleatorioSimple import AleatorioSimple
-from CategoriaConcreta import CategoriaConcreta
-from PreguntasNoHechas import PreguntasNoHechas
-from CategoriaPeor import CategoriaPeor
-from CategoriaMejor import CategoriaMejor
-from AlgoritmoUsuarioPositivo import AlgoritmoUsuarioPositivo
-from AlgoritmoUsuarioNegativo import AlgoritmoUsuarioNegativo
-from AlgoritmoItemPositivo import AlgoritmoItemPositivo
-from AlgoritmoItemNegativo import AlgoritmoItemNegativo
-from PreguntasMasFalladasPasado import PreguntasMasFalladasPasado
-from PreguntasMasAcertadasPasado import PreguntasMasAcertadasPasado
+import time
+from PoolConexiones import obtener_pool, abrir_medicion, cerrar_medicion
+from CatalogoPreguntas import obtener_catalogo
+from EstadisticasRespuestas import obtener_estadisticas, respuesta_desde_json
+from RegistroAlgoritmos import obtener_registro
+from LoteAlgoritmos import LoteAlgoritmos
+from PrecargaQuizzes import obtener_precarga
+from CacheRankings import obtener_cache_rankings
+from BitmapsRespondidas import obtener_bitmaps_respondidas
+from PreguntasServidas import obtener_preguntas_servidas
+from ColaRepasos import obtener_cola_repasos
+from ManifiestoAudios import obtener_manifiesto_audios
+from PartesQuiz import TIPO_NDJSON, partes_de_resultado, lineas_ndjson
+from Precalentamiento import precalentar, marcar_listo, estado_worker
+from Metricas import observar_ejecucion, observar_peticion, exposicion
+from TrazaSQL import CABECERA_DEPURACION, cabeceras, resumen, revisar_presupuesto
 
 app = Flask(__name__)
 CORS(app, origins="*", supports_credentials=True)
 
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', 'root'),
-    'database': os.getenv('DB_NAME', 'mydb'),
-    'port': int(os.getenv('DB_PORT', 3306))
-}
-
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+# Algoritmos descubiertos a partir de sus clases (slug, criterio, resumen); se importan en el primer uso
+registro = obtener_registro()
+registro.observar(observar_ejecucion)
+obtener_precarga().configurar(registro)
+
+def ejecutar_con_precarga(slug, data):
+    """Sirve el quiz pregenerado del usuario si lo hay y encola la generación del siguiente"""
+    # Solo se pregeneran quizzes sin más parámetros que el usuario
+    if not isinstance(data, dict) or set(data) != {'usuario_id'}:
+        return registro.ejecutar(slug, data)
+    precarga = obtener_precarga()
+    resultado = precarga.tomar(slug, data['usuario_id'])
+    if resultado is None:
+        resultado = registro.ejecutar(slug, data)
+    precarga.servido(data['usuario_id'])
+    return resultado
+
+def partes_con_precarga(slug, data):
+    """Como ejecutar_con_precarga, pero generando las preguntas a medida que están listas (PartesQuiz)"""
+    if not isinstance(data, dict) or set(data) != {'usuario_id'}:
+        yield from registro.ejecutar_por_partes(slug, data)
+        return
+    precarga = obtener_precarga()
+    resultado = precarga.tomar(slug, data['usuario_id'])
+    if resultado is None:
+        yield from registro.ejecutar_por_partes(slug, data)
+    else:
+        yield from partes_de_resultado(resultado)
+    precarga.servido(data['usuario_id'])
+
+@app.before_request
+def abrir_conexion_peticion():
+    # Todas las consultas de una petición comparten una única conexión del pool
+    g.token_ambito_db = obtener_pool().abrir_ambito()
+    g.inicio_peticion = time.perf_counter()
+    g.consultas_peticion, g.token_medicion_db = abrir_medicion(trazar=True)
+
+def registrar_medicion(codigo):
+    endpoint = request.url_rule.rule if request.url_rule else 'desconocido'
+    observar_peticion(endpoint, request.method, codigo, time.perf_counter() - g.inicio_peticion, g.consultas_peticion)
+    revisar_presupuesto(f'{request.method} {request.path}', g.consultas_peticion)
+
+@app.after_request
+def medir_peticion(response):
+    # Las respuestas NDJSON hacen sus consultas después: se miden al terminar (medir_lineas)
+    if 'token_medicion_db' in g and request.endpoint != 'metricas' and not g.get('medicion_diferida'):
+        registrar_medicion(response.status_code)
+        if request.headers.get(CABECERA_DEPURACION):
+            response.headers.update(cabeceras(g.consultas_peticion))
+    return response
+
+def medir_lineas(lineas):
+    """Registra las métricas y el presupuesto de la petición cuando se ha enviado la última línea NDJSON.
+
+    Las cabeceras ya se han enviado para entonces: con X-Debug-SQL el resumen de consultas va en una línea
+    final {'tipo': 'sql', ...}.
+    """
+    try:
+        yield from lineas
+        if request.headers.get(CABECERA_DEPURACION):
+            yield app.json.dumps({'tipo': 'sql', **resumen(g.consultas_peticion)}) + '\n'
+    finally:
+        registrar_medicion(200)
+
+@app.teardown_request
+def cerrar_conexion_peticion(_error):
+    token = g.pop('token_medicion_db', None)
+    if token is not None:
+        cerrar_medicion(token)
+    obtener_pool().cerrar_ambito(g.pop('token_ambito_db', None))
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'service': 'GestorAlgoritmos'})
-
-@app.route('/algoritmos/aleatorio-simple', methods=['POST'])
-def ejecutar_aleatorio_simple():
-    try:
-        data = request.get_json()
-        algoritmo = AleatorioSimple()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/categoria-concreta', methods=['POST'])
-def ejecutar_categoria_concreta():
-    try:
-        data = request.get_json()
-        algoritmo = CategoriaConcreta()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/preguntas-no-hechas', methods=['POST'])
-def ejecutar_preguntas_no_hechas():
-    try:
-        data = request.get_json()
-        algoritmo = PreguntasNoHechas()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/categoria-peor', methods=['POST'])
-def ejecutar_categoria_peor():
-    try:
-        data = request.get_json()
-        algoritmo = CategoriaPeor()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/categoria-mejor', methods=['POST'])
-def ejecutar_categoria_mejor():
-    try:
-        data = request.get_json()
-        algoritmo = CategoriaMejor()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/usuario-positivo', methods=['POST'])
-def ejecutar_usuario_positivo():
+    return jsonify({'status': 'ok', 'service': 'GestorAlgoritmos', 'pool': obtener_pool().estado()})
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    # Cada worker responde por sí mismo: 503 hasta que ha arrancado y tiene el catálogo cargado
+    estado = estado_worker()
+    return jsonify(estado), (200 if estado['listo'] else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    contenido, tipo = exposicion()
+    return Response(contenido, content_type=tipo)
+
+@app.route('/catalogo', methods=['GET'])
+def estado_catalogo():
+    return jsonify(obtener_catalogo().estado())
+
+@app.route('/catalogo/invalidar', methods=['POST'])
+def invalidar_catalogo():
+    # Lo llaman GestionarPreguntas y GestionCategoria tras modificar la tabla Preguntas
+    catalogo = obtener_catalogo()
+    catalogo.invalidar()
+    # Las preguntas nuevas pueden traer audios nuevos: se vuelve a recorrer Audios/ en el siguiente uso
+    obtener_manifiesto_audios().invalidar()
+    return jsonify({'success': True, 'catalogo': catalogo.estado()})
+
+@app.route('/respuestas', methods=['POST'])
+def registrar_respuesta():
+    # Lo llama GestorDatosUsuarioPreguntas tras insertar una respuesta en Usuarios_has_Preguntas
     try:
-        data = request.get_json()
-        algoritmo = AlgoritmoUsuarioPositivo()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/usuario-negativo', methods=['POST'])
-def ejecutar_usuario_negativo():
+        respuesta = respuesta_desde_json(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    nuevas = obtener_estadisticas().registrar([respuesta])
+    obtener_bitmaps_respondidas().registrar([respuesta])
+    obtener_precarga().invalidar([respuesta[1]])
+    obtener_cache_rankings().invalidar([respuesta[1]])
+    return jsonify({'success': True, 'registradas': nuevas})
+
+@app.route('/respuestas/lote', methods=['POST'])
+def registrar_respuestas_lote():
+    data = request.get_json() or {}
+    if not isinstance(data.get('respuestas'), list):
+        return jsonify({'success': False, 'error': 'Se debe proporcionar una lista de respuestas'}), 400
     try:
-        data = request.get_json()
-        algoritmo = AlgoritmoUsuarioNegativo()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/item-positivo', methods=['POST'])
-def ejecutar_item_positivo():
+        respuestas = [respuesta_desde_json(dato) for dato in data['respuestas']]
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    nuevas = obtener_estadisticas().registrar(respuestas)
+    obtener_bitmaps_respondidas().registrar(respuestas)
+    usuarios = {respuesta[1] for respuesta in respuestas}
+    obtener_precarga().invalidar(usuarios)
+    obtener_cache_rankings().invalidar(usuarios)
+    return jsonify({'success': True, 'registradas': nuevas})
+
+@app.route('/respuestas/estado', methods=['GET'])
+def estado_respuestas():
+    return jsonify(obtener_estadisticas().estado())
+
+@app.route('/precarga/estado', methods=['GET'])
+def estado_precarga():
+    return jsonify(obtener_precarga().estado())
+
+@app.route('/rankings/estado', methods=['GET'])
+def estado_rankings():
+    return jsonify(obtener_cache_rankings().estado())
+
+@app.route('/respondidas/estado', methods=['GET'])
+def estado_respondidas():
+    return jsonify(obtener_bitmaps_respondidas().estado())
+
+@app.route('/servidas/estado', methods=['GET'])
+def estado_servidas():
+    return jsonify(obtener_preguntas_servidas().estado())
+
+@app.route('/repasos/estado', methods=['GET'])
+def estado_repasos():
+    return jsonify(obtener_cola_repasos().estado())
+
+@app.route('/audios/manifiesto', methods=['GET'])
+def manifiesto_audios():
+    # Con la versión como ETag el cliente solo vuelve a descargar el manifiesto si ha cambiado algún audio
+    manifiesto = obtener_manifiesto_audios().manifiesto()
+    response = jsonify(manifiesto)
+    response.set_etag(manifiesto['version'] or '')
+    return response.make_conditional(request)
+
+@app.route('/audios/estado', methods=['GET'])
+def estado_audios():
+    return jsonify(obtener_manifiesto_audios().estado())
+
+def con_audio():
+    """Si la petición pide (?audio=1) los datos del audio y la URL versionada en cada pregunta"""
+    return request.args.get('audio', '').lower() in ('1', 'true', 'si')
+
+def crear_ruta_algoritmo(slug):
+    def ejecutar_algoritmo():
+        try:
+            data = request.get_json()
+            if request.accept_mimetypes.best_match(['application/json', TIPO_NDJSON]) == TIPO_NDJSON:
+                # Una línea por pregunta en cuanto está lista y una última con el resumen; la conexión
+                # de la petición sigue abierta hasta que se envía la última línea
+                partes = partes_con_precarga(slug, data)
+                if con_audio():
+                    partes = obtener_manifiesto_audios().anotar_partes(partes)
+                g.medicion_diferida = True
+                lineas = medir_lineas(lineas_ndjson(partes, app.json.dumps))
+                return Response(stream_with_context(lineas), mimetype=TIPO_NDJSON,
+                                headers={'X-Accel-Buffering': 'no'})
+            resultado = ejecutar_con_precarga(slug, data)
+            if con_audio():
+                resultado = obtener_manifiesto_audios().anotar_resultado(resultado)
+            return jsonify({'success': True, 'resultado': resultado})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+    return ejecutar_algoritmo
+
+# Un endpoint POST /algoritmos/<slug> por cada algoritmo del registro
+for slug in registro.slugs():
+    app.add_url_rule(f'/algoritmos/{slug}', f"ejecutar_{slug.replace('-', '_')}",
+                     crear_ruta_algoritmo(slug), methods=['POST'])
+
+@app.route('/algoritmos/batch', methods=['POST'])
+def ejecutar_lote_algoritmos():
+    data = request.get_json() or {}
+    lote = LoteAlgoritmos(registro)
     try:
-        data = request.get_json()
-        algoritmo = AlgoritmoItemPositivo()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/item-negativo', methods=['POST'])
-def ejecutar_item_negativo():
-    try:
-        data = request.get_json()
-        algoritmo = AlgoritmoItemNegativo()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/preguntas-mas-falladas-pasado', methods=['POST'])
-def ejecutar_preguntas_mas_falladas_pasado():
-    try:
-        data = request.get_json()
-        algoritmo = PreguntasMasFalladasPasado()
-        resultado = algoritmo.ejecutar(data)
-        return jsonify({'success': True, 'resultado': resultado})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/algoritmos/preguntas-mas-acertadas-pasado', methods=['POST'])
-def ejecutar_preguntas_mas_acertadas_pasado():
+        lote.validar(data.get('trabajos'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     try:
-        data = request.get_json()
-        algoritmo = PreguntasMasAcertadasPasado()
-        resultado = algoritmo.ejecutar(data)
+        resultado = lote.ejecutar(data['trabajos'])
         return jsonify({'success': True, 'resultado': resultado})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/algoritmos/disponibles', methods=['GET'])
 def obtener_algoritmos_disponibles():
-    algoritmos = [
-        {
-            'nombre': 'AleatorioSimple',
-            'descripcion': 'Algoritmo aleatorio simple',
-            'endpoint': '/algoritmos/aleatorio-simple'
-        },
-        {
-            'nombre': 'CategoriaConcreta',
-            'descripcion': 'Elige aleatoriamente una pregunta de una categoria en concreto',
-            'endpoint': '/algoritmos/categoria-concreta'
-        },
-        {
-            'nombre': 'PreguntasNoHechas',
-            'descripcion': 'Elige aleatoriamente preguntas que no has hecho',
-            'endpoint': '/algoritmos/preguntas-no-hechas'
-        },
-        {
-            'nombre': 'CategoriaPeor',
-            'descripcion': 'Te pone automaticamente preguntas de la categoria que peor se te da',
-            'endpoint': '/algoritmos/categoria-peor'
-        },
-        {
-            'nombre': 'CategoriaMejor',
-            'descripcion': 'Te pone automaticamente preguntas de la categoria que mejor se te da',
-            'endpoint': '/algoritmos/categoria-mejor'
-        },
-        {
-            'nombre': 'PreguntasMasFalladasPasado',
-            'descripcion': 'Te pone preguntas que has fallado previamente en el pasado priorizando las que mas te equivocas',
-            'endpoint': '/algoritmos/preguntas-mas-falladas-pasado'
-        },
-        {
-            'nombre': 'PreguntasMasAcertadasPasado',
-            'descripcion': 'Te pone preguntas que has acertado previamente en el pasado priorizando las que mas aciertas',
-            'endpoint': '/algoritmos/preguntas-mas-acertadas-pasado'
-        },
-        {
-            'nombre': 'AlgoritmoUsuarioPositivo',
-            'descripcion': 'Te pone preguntas que otros usuarios similares a ti han fallado',
-            'endpoint': '/algoritmos/usuario-positivo'
-        },
-        {
-            'nombre': 'AlgoritmoUsuarioNegativo',
-            'descripcion': 'Te pone preguntas que otros usuarios similares a ti han acertado',
-            'endpoint': '/algoritmos/usuario-negativo'
-        },
-        {
-            'nombre': 'AlgoritmoItemPositivo',
-            'descripcion': 'Te recomienda preguntas basándose en la similitud entre preguntas que otros usuarios han fallado juntas',
-            'endpoint': '/algoritmos/item-positivo'
-        },
-        {
-            'nombre': 'AlgoritmoItemNegativo',
-            'descripcion': 'Te recomienda preguntas basándose en la similitud entre preguntas que otros usuarios han acertado juntas',
-            'endpoint': '/algoritmos/item-negativo'
-        }
-    ]
+    algoritmos = registro.disponibles()
     return jsonify({'algoritmos': algoritmos})
 
 
 if __name__ == '__main__':
+    # Servidor de desarrollo; en producción se usa gunicorn -c gunicorn.conf.py wsgi:app
     port = int(os.getenv('PORT', 3014))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    precalentar()
+    marcar_listo()
+    app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_DEBUG', '1') == '1', threaded=True)
\ No newline at end of file
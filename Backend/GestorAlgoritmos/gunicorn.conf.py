@@ -0,0 +1,68 @@
+import os
+import multiprocessing
+
+# Servidor pre-fork de GestorAlgoritmos: gunicorn -c gunicorn.conf.py wsgi:app
+bind = f"0.0.0.0:{os.getenv('PORT', 3014)}"
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# La aplicación (y los datos que precalienta) se carga una vez en el maestro y se comparte al hacer fork
+preload_app = True
+
+# Drenado: al recibir SIGTERM o al recargar, cada worker termina sus peticiones en curso antes de salir
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recicla los workers de vez en cuando para acotar la memoria que dejan de compartir con el maestro
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = '-'
+errorlog = '-'
+
+# Métricas de Prometheus sumadas entre workers: cada proceso escribe sus contadores en este directorio.
+# Tiene que definirse antes de que se importe la aplicación (preload_app la importa en el maestro).
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/gestor_algoritmos_metricas')
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def on_starting(server):
+    # Los ficheros de una ejecución anterior sumarían contadores que ya no existen
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    for fichero in os.listdir(directorio):
+        if fichero.endswith('.db'):
+            os.remove(os.path.join(directorio, fichero))
+
+
+def on_reload(server):
+    # SIGHUP: se vuelve a precalentar en el maestro para que los workers nuevos hereden datos recientes
+    from Precalentamiento import precalentar
+    precalentar()
+
+
+def post_worker_init(worker):
+    from Precalentamiento import marcar_listo
+    marcar_listo()
+    worker.log.info('Worker %s listo', worker.pid)
+
+
+def worker_int(worker):
+    from Precalentamiento import marcar_drenando
+    marcar_drenando()
+
+
+def worker_exit(server, worker):
+    # Escribe las preguntas servidas que el worker aún tenga pendientes antes de salir
+    from PreguntasServidas import obtener_preguntas_servidas
+    try:
+        obtener_preguntas_servidas().vaciar()
+    except Exception as e:
+        worker.log.warning('No se pudieron escribir las preguntas servidas: %s', e)
+
+
+def child_exit(server, worker):
+    # Los contadores del worker se conservan; sus valores "live" dejan de contar
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
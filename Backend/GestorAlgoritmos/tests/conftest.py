@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de GestorAlgoritmos se importan por nombre desde su carpeta, igual que en el contenedor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
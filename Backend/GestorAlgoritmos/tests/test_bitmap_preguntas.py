@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from BitmapsRespondidas import BitmapPreguntas
+
+
+class BitmapPequeno(BitmapPreguntas):
+    # Con un límite bajo los contenedores pasan a mapa de bits enseguida
+    LIMITE_ARRAY = 16
+
+
+def ids_aleatorios(generador, cantidad):
+    # Varios contenedores (16 bits altos distintos), con ids repetidos y concentrados en algunos
+    altos = generador.choice([0, 1, 5, 1000], cantidad)
+    return (altos << 16) | generador.integers(0, 200, cantidad)
+
+
+@pytest.mark.parametrize('clase', [BitmapPreguntas, BitmapPequeno])
+@pytest.mark.parametrize('semilla', range(5))
+def test_operaciones_coinciden_con_un_set(clase, semilla):
+    generador = np.random.default_rng(semilla)
+    bitmap = clase()
+    referencia = set()
+    for _ in range(30):
+        if generador.random() < 0.5:
+            nuevos = ids_aleatorios(generador, int(generador.integers(0, 60)))
+            bitmap.actualizar(nuevos)
+            referencia.update(nuevos.tolist())
+        else:
+            nuevo = int(ids_aleatorios(generador, 1)[0])
+            bitmap.anadir(nuevo)
+            referencia.add(nuevo)
+
+        consultados = np.concatenate((ids_aleatorios(generador, 300), [-1, 1 << 40]))
+        np.testing.assert_array_equal(bitmap.contiene(consultados), [i in referencia for i in consultados.tolist()])
+        assert all((i in bitmap) == (i in referencia) for i in consultados.tolist())
+        assert len(bitmap) == len(referencia)
+        assert bitmap.ids().tolist() == sorted(referencia)
+        assert list(bitmap) == sorted(referencia)
+
+
+def test_contenedor_pasa_a_mapa_al_superar_el_limite():
+    ids = np.arange(0, 2 * (BitmapPreguntas.LIMITE_ARRAY + 1), 2)
+    bitmap = BitmapPreguntas.desde_ids(ids[:-1])
+    assert not bitmap._contenedores[0][0]
+    bitmap.anadir(int(ids[-1]))
+    es_mapa, datos = bitmap._contenedores[0]
+    assert es_mapa and datos.nbytes == 8192
+    assert bitmap.ids().tolist() == ids.tolist()
+    assert bitmap.contiene(ids + 1).sum() == 0
+
+
+def test_copia_no_comparte_cambios():
+    original = BitmapPequeno.desde_ids(range(20))
+    copia = original.copia()
+    copia.anadir(21)
+    copia.actualizar([1 << 16])
+    assert 21 not in original and (1 << 16) not in original
+    assert len(original) == 20 and len(copia) == 22
+
+
+def test_vacio():
+    bitmap = BitmapPreguntas.desde_ids([])
+    assert len(bitmap) == 0 and bitmap.ids().tolist() == [] and 'x' not in bitmap
+    assert bitmap.contiene([1, 2]).tolist() == [False, False]
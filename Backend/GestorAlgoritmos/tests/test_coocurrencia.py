@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from MatrizRespuestas import MatrizRespuestas
+from SimilitudItems import pearson_binaria, MIN_USUARIOS_COMUNES
+from EstadisticasRespuestas import ContadoresCoocurrencia
+
+
+def respuestas_aleatorias(generador, usuarios=40, preguntas=12, total=400):
+    return (generador.integers(1, usuarios + 1, total), generador.integers(1, preguntas + 1, total),
+            generador.integers(0, 2, total))
+
+
+def ultimas_respuestas(usuarios, preguntas, correctas):
+    """{usuario: {pregunta: última respuesta}} recorriendo las respuestas en orden"""
+    ultimas = {}
+    for usuario, pregunta, correcta in zip(usuarios.tolist(), preguntas.tolist(), correctas.tolist()):
+        ultimas.setdefault(usuario, {})[pregunta] = correcta
+    return ultimas
+
+
+def pearson_directa(x, y, minimo=MIN_USUARIOS_COMUNES):
+    if len(x) < minimo or np.std(x) == 0 or np.std(y) == 0:
+        return 0.0
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def sumas_directas(ultimas, preguntas):
+    """n, Σx y Σxy de cada par de preguntas sobre los usuarios que han respondido ambas"""
+    total = len(preguntas)
+    n = np.zeros((total, total), dtype=np.int64)
+    sx = np.zeros((total, total), dtype=np.int64)
+    sxy = np.zeros((total, total), dtype=np.int64)
+    for respuestas in ultimas.values():
+        for i, pi in enumerate(preguntas):
+            for j, pj in enumerate(preguntas):
+                if i != j and pi in respuestas and pj in respuestas:
+                    n[i, j] += 1
+                    sx[i, j] += respuestas[pi]
+                    sxy[i, j] += respuestas[pi] * respuestas[pj]
+    return n, sx, sxy
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_pearson_binaria_coincide_con_corrcoef(semilla):
+    generador = np.random.default_rng(semilla)
+    for _ in range(50):
+        comunes = int(generador.integers(0, 15))
+        x = generador.integers(0, 2, comunes)
+        y = generador.integers(0, 2, comunes)
+        calculada = pearson_binaria(np.array([comunes]), np.array([x.sum()], dtype=np.float64),
+                                    np.array([y.sum()], dtype=np.float64), np.array([(x * y).sum()]))
+        assert calculada[0] == pytest.approx(pearson_directa(x, y))
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_desde_matriz_coincide_con_las_sumas_directas(semilla):
+    usuarios, preguntas, correctas = respuestas_aleatorias(np.random.default_rng(semilla))
+    matriz = MatrizRespuestas.desde_respuestas(usuarios, preguntas, correctas)
+    # Lote pequeño para que los pares se procesen en varios trozos
+    contadores = ContadoresCoocurrencia.desde_matriz(matriz, 100, tamano_lote=50)
+
+    ids = [int(p) for p in matriz.preguntas]
+    n, sx, sxy = sumas_directas(ultimas_respuestas(usuarios, preguntas, correctas), ids)
+    total = len(ids)
+    assert contadores.preguntas == ids
+    np.testing.assert_array_equal(contadores.n[:total, :total], n)
+    np.testing.assert_array_equal(contadores.sx[:total, :total], sx)
+    np.testing.assert_array_equal(contadores.sxy[:total, :total], sxy)
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_registrar_respuesta_a_respuesta_equivale_a_la_carga_completa(semilla):
+    usuarios, preguntas, correctas = respuestas_aleatorias(np.random.default_rng(semilla))
+    contadores = ContadoresCoocurrencia(100)
+    ultimas = {}
+    # Igual que EstadisticasRespuestas._aplicar: cada respuesta con la última del usuario al resto de preguntas
+    for usuario, pregunta, valor in zip(usuarios.tolist(), preguntas.tolist(), correctas.tolist()):
+        respuestas = ultimas.setdefault(usuario, {})
+        otras = [(contadores.columna_pregunta[p], v) for p, v in respuestas.items()
+                 if p != pregunta and p in contadores.columna_pregunta]
+        contadores.registrar(pregunta, valor, respuestas.get(pregunta),
+                             np.array([c for c, _ in otras], dtype=np.int64),
+                             np.array([v for _, v in otras], dtype=np.int32))
+        contadores.columna(pregunta)
+        respuestas[pregunta] = valor
+
+    n, sx, sxy = sumas_directas(ultimas, contadores.preguntas)
+    total = len(contadores.preguntas)
+    np.testing.assert_array_equal(contadores.n[:total, :total], n)
+    np.testing.assert_array_equal(contadores.sx[:total, :total], sx)
+    np.testing.assert_array_equal(contadores.sxy[:total, :total], sxy)
+
+
+def test_similitudes_usa_el_maximo_sobre_las_preguntas_base():
+    usuarios, preguntas, correctas = respuestas_aleatorias(np.random.default_rng(7), usuarios=80, total=900)
+    matriz = MatrizRespuestas.desde_respuestas(usuarios, preguntas, correctas)
+    contadores = ContadoresCoocurrencia.desde_matriz(matriz, 100)
+    ultimas = ultimas_respuestas(usuarios, preguntas, correctas)
+
+    base = [int(matriz.preguntas[0]), int(matriz.preguntas[1])]
+    ids, similitudes = contadores.similitudes(base)
+    for pregunta, similitud in zip(ids.tolist(), similitudes.tolist()):
+        esperadas = []
+        for otra in base:
+            comunes = [r for r in ultimas.values() if otra in r and pregunta in r and otra != pregunta]
+            esperadas.append(pearson_directa(np.array([r[otra] for r in comunes]),
+                                             np.array([r[pregunta] for r in comunes])))
+        assert similitud == pytest.approx(max(esperadas))
+
+
+def test_capacidad_maxima_desborda():
+    contadores = ContadoresCoocurrencia(2)
+    assert contadores.columna(10) == 0
+    assert contadores.columna(11) == 1
+    assert contadores.columna(12) is None
+    assert contadores.desbordado
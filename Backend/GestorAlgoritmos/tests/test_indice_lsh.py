@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from MatrizRespuestas import MatrizRespuestas
+from IndiceLSHUsuarios import IndiceLSHUsuarios
+
+
+def matriz_aleatoria(semilla, usuarios=60, preguntas=15, total=500):
+    generador = np.random.default_rng(semilla)
+    return MatrizRespuestas.desde_respuestas(generador.integers(1, usuarios + 1, total),
+                                             generador.integers(1, preguntas + 1, total),
+                                             generador.integers(0, 2, total))
+
+
+def con_usuarios_vacios(matriz, vacios):
+    """La misma matriz con filas sin respuestas intercaladas para los ids de `vacios`"""
+    usuarios = np.concatenate((matriz.usuarios, vacios))
+    orden = np.argsort(usuarios, kind='stable')
+    longitudes = np.concatenate((np.diff(matriz.indptr), np.zeros(len(vacios), dtype=np.int64)))[orden]
+    indptr = np.zeros(len(usuarios) + 1, dtype=np.int64)
+    np.cumsum(longitudes, out=indptr[1:])
+    return MatrizRespuestas(usuarios[orden], matriz.preguntas, indptr, matriz.indices, matriz.valores,
+                            matriz.intentos, matriz.fallos)
+
+
+def perfil(matriz, fila):
+    inicio, fin = matriz.indptr[fila], matriz.indptr[fila + 1]
+    return {int(matriz.preguntas[c]): int(v) for c, v in zip(matriz.indices[inicio:fin], matriz.valores[inicio:fin])}
+
+
+def candidatos_directos(indice, matriz, respuestas):
+    """Usuarios con alguna banda igual a la del perfil, calculando la firma MinHash de cada uno por separado"""
+    def claves(respuestas):
+        columnas = np.array([matriz.columna_pregunta[p] for p in respuestas])
+        fichas = indice._fichas(columnas, np.array(list(respuestas.values())))
+        return indice._claves(indice._tabla[fichas].min(axis=0)[None, :])[0]
+
+    buscadas = claves(respuestas)
+    return {int(matriz.usuarios[fila]) for fila in range(len(matriz.usuarios))
+            if matriz.indptr[fila + 1] > matriz.indptr[fila] and np.any(claves(perfil(matriz, fila)) == buscadas)}
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_candidatos_coinciden_con_la_comparacion_directa(semilla):
+    matriz = matriz_aleatoria(semilla)
+    # Lote pequeño para que las firmas se calculen en varios trozos
+    indice = IndiceLSHUsuarios(matriz, bandas=8, filas=2, tamano_lote=200)
+    for fila in range(0, len(matriz.usuarios), 7):
+        respuestas = perfil(matriz, fila)
+        encontrados = set(indice.candidatos(respuestas, maximo=10 ** 6).tolist())
+        assert encontrados == candidatos_directos(indice, matriz, respuestas)
+        assert int(matriz.usuarios[fila]) in encontrados
+
+
+def test_los_lotes_no_cambian_el_indice():
+    matriz = matriz_aleatoria(3)
+    grande = IndiceLSHUsuarios(matriz, bandas=8, filas=2)
+    pequeno = IndiceLSHUsuarios(matriz, bandas=8, filas=2, tamano_lote=50)
+    np.testing.assert_array_equal(grande._orden, pequeno._orden)
+    np.testing.assert_array_equal(grande._claves_ordenadas, pequeno._claves_ordenadas)
+
+
+def test_usuarios_sin_respuestas_quedan_fuera_de_los_cubos():
+    vacios = np.array([1000, 1001, 1002], dtype=np.int64)
+    matriz = con_usuarios_vacios(matriz_aleatoria(4), vacios)
+    indice = IndiceLSHUsuarios(matriz, bandas=16, filas=1)
+    for fila in range(len(matriz.usuarios)):
+        respuestas = perfil(matriz, fila)
+        if respuestas:
+            assert not set(indice.candidatos(respuestas, maximo=10 ** 6).tolist()) & set(vacios.tolist())
+    assert indice._orden.shape[1] == len(matriz.usuarios) - len(vacios)
+
+
+def test_maximo_prioriza_los_que_coinciden_en_mas_bandas():
+    matriz = matriz_aleatoria(5)
+    indice = IndiceLSHUsuarios(matriz, bandas=16, filas=1)
+    respuestas = perfil(matriz, 0)
+    # El propio usuario coincide en todas las bandas
+    assert indice.candidatos(respuestas, maximo=1).tolist() == [int(matriz.usuarios[0])]
+
+
+def test_perfil_sin_preguntas_conocidas():
+    indice = IndiceLSHUsuarios(matriz_aleatoria(6), bandas=4, filas=2)
+    assert len(indice.candidatos({99999: 1})) == 0
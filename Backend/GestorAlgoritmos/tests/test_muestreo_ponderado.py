@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+from itertools import permutations
+import pytest
+from MuestreoPonderado import muestrear_sin_reemplazo
+
+
+def probabilidad_secuencial(secuencia, pesos):
+    """Probabilidad de sacar `secuencia` en ese orden yendo de uno en uno y renormalizando los pesos"""
+    restantes = dict(enumerate(pesos))
+    probabilidad = 1.0
+    for indice in secuencia:
+        probabilidad *= restantes[indice] / sum(restantes.values())
+        del restantes[indice]
+    return probabilidad
+
+
+@pytest.mark.parametrize('pesos', [[1, 2, 3, 4], [5, 1, 1, 0.5, 2.5], [1, 1, 1]])
+def test_distribucion_igual_que_sacar_de_uno_en_uno(pesos):
+    rng = random.Random(1234)
+    cantidad, repeticiones = 2, 60000
+    frecuencias = Counter(tuple(muestrear_sin_reemplazo(list(range(len(pesos))), pesos, cantidad, rng))
+                          for _ in range(repeticiones))
+    for secuencia in permutations(range(len(pesos)), cantidad):
+        esperada = probabilidad_secuencial(secuencia, pesos)
+        # Margen de ~5 desviaciones típicas de una binomial
+        margen = 5 * (esperada * (1 - esperada) / repeticiones) ** 0.5
+        assert frecuencias[secuencia] / repeticiones == pytest.approx(esperada, abs=margen)
+
+
+def test_sin_repetidos_y_con_la_cantidad_pedida():
+    rng = random.Random(7)
+    elementos = list('abcdefghij')
+    for _ in range(200):
+        pesos = [rng.random() * 10 for _ in elementos]
+        cantidad = rng.randint(0, 12)
+        elegidos = muestrear_sin_reemplazo(elementos, pesos, cantidad, rng)
+        assert len(elegidos) == min(cantidad, len(elementos))
+        assert len(set(elegidos)) == len(elegidos)
+
+
+def test_pesos_cero_solo_cuando_no_quedan_positivos():
+    rng = random.Random(3)
+    elementos = ['a', 'b', 'c', 'd']
+    pesos = [0, 2, 0, 1e-12]
+    for _ in range(500):
+        elegidos = muestrear_sin_reemplazo(elementos, pesos, 3, rng)
+        assert set(elegidos[:2]) == {'b', 'd'}
+        assert elegidos[2] in {'a', 'c'}
+
+
+def test_pesos_decimales_y_enteros():
+    from decimal import Decimal
+    elegidos = muestrear_sin_reemplazo([1, 2, 3], [Decimal('0.5'), 2, 1.5], 3, random.Random(0))
+    assert sorted(elegidos) == [1, 2, 3]
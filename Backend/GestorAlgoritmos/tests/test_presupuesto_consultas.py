@@ -0,0 +1,274 @@
+import re
+import json
+import time
+import random
+import asyncio
+import sqlite3
+import zlib
+from datetime import date, timedelta
+import mysql.connector
+import pytest
+from PoolConexiones import obtener_pool, registrar_consulta
+from PoolConexionesAsync import obtener_pool_async
+from RegistroAlgoritmos import obtener_registro
+from ResumenesUsuario import obtener_resumenes
+from PreguntasServidas import obtener_preguntas_servidas
+from TrazaSQL import limite_consultas, comprobar_algoritmo
+
+USUARIO = 3
+CATEGORIA = 2
+
+# Consultas máximas de cada algoritmo con las cachés del proceso ya cargadas (el caso normal de una
+# petición); un algoritmo nuevo tiene que declarar aquí su presupuesto
+PRESUPUESTOS = {
+    'aleatorio-simple': 0,
+    'preguntas-no-hechas': 0,
+    'categoria-concreta': 0,
+    'categoria-peor': 1,
+    'categoria-mejor': 1,
+    'preguntas-mas-falladas-pasado': 1,
+    'preguntas-mas-acertadas-pasado': 1,
+    'usuario-positivo': 0,
+    'usuario-negativo': 0,
+    'item-positivo': 0,
+    'item-negativo': 0,
+    'repaso-espaciado': 0,
+}
+
+# ServidorAsync lanza siempre las consultas_precarga, aunque el ranking del algoritmo esté en caché
+PRESUPUESTOS_ASGI = {**PRESUPUESTOS, 'item-positivo': 1, 'item-negativo': 1}
+
+# Primera ejecución en un proceso recién arrancado, cargando catálogo, estadísticas e índices
+PRESUPUESTO_EN_FRIO = 25
+
+FECHA = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+ESQUEMA = """
+    CREATE TABLE Categorias (idCategorias INTEGER PRIMARY KEY, nombreCategoria TEXT);
+    CREATE TABLE Preguntas (idPregunta INTEGER PRIMARY KEY, urlAudio TEXT, respuestaCorrecta TEXT,
+                            Categorias_idCategorias INT NOT NULL);
+    CREATE TABLE Usuarios (idUsuario INTEGER PRIMARY KEY, idCriterioMasUsado INT NOT NULL);
+    CREATE TABLE Usuarios_has_Preguntas (Usuarios_idUsuario INT NOT NULL, Preguntas_idPregunta INT NOT NULL,
+                                         idRespuesta INTEGER PRIMARY KEY, fechaDeContestacion DATE,
+                                         respuestaCorrecta INT);
+    CREATE TABLE SimilitudPreguntas (idPregunta INT NOT NULL, idVecino INT NOT NULL, similitud REAL NOT NULL,
+                                     fechaCalculo TIMESTAMP NOT NULL, PRIMARY KEY (idPregunta, idVecino));
+    CREATE TABLE PreguntasServidas (Usuarios_idUsuario INT NOT NULL, Preguntas_idPregunta INT NOT NULL,
+                                    ultimaVez TIMESTAMP NOT NULL, PRIMARY KEY (Usuarios_idUsuario, Preguntas_idPregunta));
+"""
+
+
+class CursorSqlite:
+    """Lo que usan los algoritmos de un cursor de mysql-connector, sobre sqlite"""
+
+    def __init__(self, db, dictionary=False):
+        self._cursor = db.cursor()
+        self._diccionario = dictionary
+        self.rowcount = -1
+
+    @staticmethod
+    def _traducir(sentencia):
+        # En MySQL la división de enteros da un decimal
+        return sentencia.replace('%s', '?').replace(' / ', ' * 1.0 / ')
+
+    @staticmethod
+    def _valor(valor):
+        # sqlite solo convierte las columnas DATE; MAX(fecha) y similares llegan como texto
+        if isinstance(valor, str) and FECHA.match(valor):
+            return date.fromisoformat(valor)
+        return valor
+
+    def _filas(self, filas):
+        filas = [tuple(self._valor(valor) for valor in fila) for fila in filas]
+        if not self._diccionario:
+            return filas
+        columnas = [descripcion[0] for descripcion in self._cursor.description]
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    @property
+    def with_rows(self):
+        return self._cursor.description is not None
+
+    def execute(self, sentencia, params=None):
+        try:
+            self._cursor.execute(self._traducir(sentencia), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise mysql.connector.errors.ProgrammingError(msg=str(e))
+        self.rowcount = self._cursor.rowcount
+
+    def executemany(self, sentencia, filas):
+        for fila in filas:
+            self.execute(sentencia, fila)
+
+    def fetchall(self):
+        return self._filas(self._cursor.fetchall())
+
+    def fetchmany(self, cantidad=1):
+        return self._filas(self._cursor.fetchmany(cantidad))
+
+    def fetchone(self):
+        filas = self._filas(self._cursor.fetchmany(1))
+        return filas[0] if filas else None
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSqlite:
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self, db):
+        self._db = db
+
+    def cursor(self, dictionary=False, **_opciones):
+        return CursorSqlite(self._db, dictionary)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def start_transaction(self, **_opciones):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def base_de_datos():
+    db = sqlite3.connect(':memory:', check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+    # Funciones de MySQL que aparecen en las consultas
+    db.create_function('CRC32', 1, lambda texto: zlib.crc32(str(texto).encode()))
+    db.create_function('CONCAT_WS', -1, lambda separador, *partes: separador.join(str(p) for p in partes if p is not None))
+    db.create_function('GREATEST', -1, max)
+    db.create_function('LEAST', -1, min)
+    db.create_function('CURDATE', 0, lambda: date.today().isoformat())
+    db.executescript(ESQUEMA)
+
+    rng = random.Random(2024)
+    db.executemany("INSERT INTO Categorias VALUES (?, ?)", [(c, f'Categoria {c}') for c in range(1, 5)])
+    db.executemany("INSERT INTO Preguntas VALUES (?, ?, ?, ?)",
+                   [(p, f'Categoria{p % 4 + 1}/Respuesta{p}.m4a', f'Respuesta {p}', p % 4 + 1) for p in range(1, 61)])
+    db.executemany("INSERT INTO Usuarios VALUES (?, ?)", [(u, 1) for u in range(1, 81)])
+    # Cada usuario acierta más o menos según la categoría, así que hay usuarios parecidos entre sí; el
+    # usuario de las pruebas solo ha respondido las 20 primeras preguntas y las 15 últimas no las ha hecho nadie
+    hoy = date.today()
+    respuestas = []
+    for usuario in range(1, 81):
+        acierto = {categoria: rng.random() for categoria in range(1, 5)}
+        preguntas = range(1, 21) if usuario == USUARIO else rng.sample(range(1, 46), 25)
+        for pregunta in preguntas:
+            for _ in range(rng.randint(1, 3)):
+                respuestas.append((usuario, pregunta, hoy - timedelta(days=rng.randint(0, 90)),
+                                   int(rng.random() < acierto[pregunta % 4 + 1])))
+    rng.shuffle(respuestas)
+    db.executemany("""
+        INSERT INTO Usuarios_has_Preguntas (Usuarios_idUsuario, Preguntas_idPregunta, fechaDeContestacion,
+                                            respuestaCorrecta)
+        VALUES (?, ?, ?, ?)
+    """, respuestas)
+    db.commit()
+    return db
+
+
+def consultar_async(db):
+    """Sustituto de PoolConexionesAsync.consultar sobre sqlite, medido igual que el original"""
+    async def consultar(query, params=None):
+        cursor = CursorSqlite(db, dictionary=True)
+        try:
+            inicio = time.perf_counter()
+            cursor.execute(query, params)
+            filas = cursor.fetchall()
+            registrar_consulta(time.perf_counter() - inicio, query)
+            return filas
+        finally:
+            cursor.close()
+    return consultar
+
+
+@pytest.fixture(scope='module')
+def registro():
+    db = base_de_datos()
+    with pytest.MonkeyPatch.context() as parche:
+        parche.setattr(mysql.connector, 'connect', lambda **_config: ConexionSqlite(db))
+        parche.setattr(obtener_pool_async(), 'consultar', consultar_async(db))
+        # Sin tablas de resúmenes: los algoritmos leen Usuarios_has_Preguntas
+        parche.setattr(obtener_resumenes(), 'activos', False)
+        # La escritura diferida de preguntas servidas no cuenta en la petición
+        parche.setattr(obtener_preguntas_servidas(), 'intervalo', 3600)
+        parche.setattr(obtener_preguntas_servidas(), 'tamano_lote', 10 ** 6)
+        yield obtener_registro()
+    obtener_pool().cerrar_libres()
+
+
+def datos(slug):
+    if slug == 'categoria-concreta':
+        return {'usuario_id': USUARIO, 'categoria_id': CATEGORIA}
+    return {'usuario_id': USUARIO}
+
+
+def test_todos_los_algoritmos_tienen_presupuesto(registro):
+    assert set(registro.slugs()) == set(PRESUPUESTOS)
+
+
+@pytest.mark.parametrize('slug', sorted(PRESUPUESTOS))
+def test_presupuesto_de_consultas(registro, slug):
+    with limite_consultas(PRESUPUESTO_EN_FRIO):
+        registro.ejecutar(slug, datos(slug))
+    resultado = comprobar_algoritmo(slug, datos(slug), PRESUPUESTOS[slug])
+    assert resultado.get('estado') != 'error', resultado
+    assert resultado['preguntas']
+
+
+def peticion_asgi(ruta, cuerpo=None, metodo='POST'):
+    """Petición a la aplicación de ServidorAsync sin servidor HTTP; devuelve (código, JSON de la respuesta)"""
+    from ServidorAsync import app
+    enviados = []
+    contenido = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+
+    async def recibir():
+        return {'type': 'http.request', 'body': contenido, 'more_body': False}
+
+    async def enviar(mensaje):
+        enviados.append(mensaje)
+
+    alcance = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': metodo, 'scheme': 'http',
+        'path': ruta, 'raw_path': ruta.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'test'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(contenido)).encode())],
+        'client': ('test', 1), 'server': ('test', 80)
+    }
+    asyncio.run(app(alcance, recibir, enviar))
+    cuerpo = b''.join(mensaje.get('body', b'') for mensaje in enviados if mensaje['type'] == 'http.response.body')
+    return enviados[0]['status'], json.loads(cuerpo)
+
+
+@pytest.mark.parametrize('slug', sorted(PRESUPUESTOS))
+def test_presupuesto_de_consultas_asgi(registro, slug):
+    ruta = f'/algoritmos/{slug}'
+    with limite_consultas(PRESUPUESTO_EN_FRIO):
+        peticion_asgi(ruta, datos(slug))
+    with limite_consultas(PRESUPUESTOS_ASGI[slug]):
+        codigo, respuesta = peticion_asgi(ruta, datos(slug))
+    assert codigo == 200, respuesta
+    assert respuesta['resultado'].get('estado') != 'error', respuesta
+    assert respuesta['resultado']['preguntas']
+
+
+def test_asgi_sirve_las_rutas_de_flask(registro):
+    codigo, disponibles = peticion_asgi('/algoritmos/disponibles', metodo='GET')
+    assert codigo == 200, disponibles
+    codigo, lote = peticion_asgi('/algoritmos/batch', {'trabajos': [
+        {'algoritmo': 'aleatorio-simple', 'usuario_id': USUARIO},
+        {'algoritmo': 'item-positivo', 'usuario_id': USUARIO}
+    ]})
+    assert codigo == 200, lote
+    assert lote['resultado']['completados'] == 2, lote
+    codigo, registradas = peticion_asgi('/respuestas/lote', {'respuestas': []})
+    assert codigo == 200 and registradas['success'], registradas
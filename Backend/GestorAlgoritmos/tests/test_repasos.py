@@ -0,0 +1,107 @@
+import random
+from datetime import date, timedelta
+import pytest
+from ColaRepasos import repasar, PlanRepasos, ColaRepasos, FACILIDAD_INICIAL, FACILIDAD_MINIMA
+
+HOY = date(2024, 3, 1)
+
+
+class EstadisticasFijas:
+    """Lo que ColaRepasos usa de EstadisticasRespuestas, sin base de datos"""
+
+    def __init__(self):
+        self.metricas = {'cargas_completas': 1}
+        self.suscriptores = []
+        self.sincronizaciones = 0
+
+    def suscribir(self, funcion):
+        self.suscriptores.append(funcion)
+
+    def actualizar(self):
+        self.sincronizaciones += 1
+
+    def avisar(self, respuestas):
+        for funcion in self.suscriptores:
+            funcion(respuestas)
+
+
+def test_secuencia_fija_de_intervalos():
+    # Aciertos: 1, 6 y después intervalo × facilidad; un fallo vuelve a empezar y baja la facilidad 0.54
+    esperadas = [
+        (True, 1, FACILIDAD_INICIAL, 1),
+        (True, 2, FACILIDAD_INICIAL, 6),
+        (True, 3, FACILIDAD_INICIAL, 15),
+        (True, 4, FACILIDAD_INICIAL, 38),
+        (False, 0, 1.96, 1),
+        (True, 1, 1.96, 1),
+        (True, 2, 1.96, 6),
+        (True, 3, 1.96, 12),
+    ]
+    tarjeta, fecha = None, HOY
+    for correcta, repeticiones, facilidad, intervalo in esperadas:
+        tarjeta = repasar(tarjeta, correcta, fecha)
+        assert tarjeta[0] == repeticiones
+        assert tarjeta[1] == pytest.approx(facilidad)
+        assert tarjeta[2] == intervalo
+        assert tarjeta[3] == fecha + timedelta(days=intervalo)
+        fecha = tarjeta[3]
+
+
+def test_facilidad_no_baja_del_minimo():
+    tarjeta = None
+    for _ in range(10):
+        tarjeta = repasar(tarjeta, False, HOY)
+    assert tarjeta[1] == FACILIDAD_MINIMA and tarjeta[2] == 1
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_proximas_coincide_con_ordenar_todas_las_tarjetas(semilla):
+    rng = random.Random(semilla)
+    plan = PlanRepasos()
+    for respuesta_id in range(1, 400):
+        plan.responder(rng.randint(1, 40), rng.random() < 0.7, HOY + timedelta(days=rng.randint(0, 60)), respuesta_id)
+        if respuesta_id % 37 == 0:
+            cantidad = rng.randint(1, 15)
+            valida = (lambda p: p % 3 != 0) if rng.random() < 0.5 else None
+            ordenadas = sorted(plan.tarjetas.items(), key=lambda par: (par[1][3], par[0]))
+            esperadas = [par for par in ordenadas if valida is None or valida(par[0])][:cantidad]
+            assert plan.proximas(cantidad, valida) == esperadas
+    assert plan.ultimo_id == 399
+    # El montículo se compacta en lugar de crecer con cada respuesta
+    assert len(plan._monticulo) <= 2 * len(plan.tarjetas) + 64
+
+
+def test_cola_aplica_solo_respuestas_posteriores_a_la_carga():
+    estadisticas = EstadisticasFijas()
+    cola = ColaRepasos(capacidad=10, estadisticas=estadisticas)
+    historial = [(1, 5, HOY, 1), (2, 5, HOY + timedelta(days=1), 1), (3, 6, HOY, 0)]
+    cola._consultar = lambda usuario_id: historial
+
+    proximas, total = cola.proximas(9, 10)
+    assert total == 2
+    assert [pregunta for pregunta, _ in proximas] == [6, 5]
+
+    # Llegan desde la sincronización de las estadísticas: la 3 ya estaba en la carga; la 4 es nueva y deja
+    # la pregunta 6 con un acierto
+    estadisticas.avisar([(3, 9, 6, False), (4, 9, 6, True)])
+    tarjetas = cola._planes['9'].tarjetas
+    assert tarjetas[6][:3] == repasar(repasar(None, False, HOY), True, date.today())[:3]
+    assert tarjetas[5][0] == 2
+    assert cola.estado()['registradas'] == 1
+
+
+def test_cola_solo_reproduce_el_historial_en_la_primera_carga():
+    estadisticas = EstadisticasFijas()
+    cola = ColaRepasos(capacidad=10, estadisticas=estadisticas)
+    consultas = []
+    cola._consultar = lambda usuario_id: consultas.append(usuario_id) or [(1, 5, HOY, 1)]
+
+    for _ in range(3):
+        cola.proximas(9, 10)
+    assert consultas == [9]
+    assert estadisticas.sincronizaciones == 3
+
+    # Tras una carga completa de las estadísticas el plan se reconstruye
+    estadisticas.metricas['cargas_completas'] += 1
+    cola.proximas(9, 10)
+    assert consultas == [9, 9]
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from MatrizRespuestas import MatrizRespuestas
+from EstadisticasRespuestas import BaseRespuestas
+from SimilitudUsuarios import (MotorSimilitudUsuarios, pearson_respuestas, MODO_EXACTO, MODO_APROXIMADO,
+                               MIN_RESPUESTAS, MIN_PREGUNTAS_COMUNES)
+
+
+class EstadisticasFijas:
+    """Lo único que usa el motor de EstadisticasRespuestas: la matriz base y los usuarios modificados"""
+
+    def __init__(self, base, cambios=None):
+        self.base = base
+        self.cambios = cambios or {}
+
+    def instantanea_usuarios(self):
+        return self.base, self.cambios
+
+
+def historial_aleatorio(semilla, usuarios=50, preguntas=12, total=900):
+    generador = np.random.default_rng(semilla)
+    return (generador.integers(1, usuarios + 1, total), generador.integers(1, preguntas + 1, total),
+            generador.integers(0, 2, total))
+
+
+def perfiles(usuarios, preguntas, correctas):
+    """{usuario: {pregunta: (última respuesta, intentos)}} recorriendo el historial en orden"""
+    resultado = {}
+    for usuario, pregunta, correcta in zip(usuarios.tolist(), preguntas.tolist(), correctas.tolist()):
+        anterior = resultado.setdefault(usuario, {}).get(pregunta, (0, 0))
+        resultado[usuario][pregunta] = (correcta, anterior[1] + 1)
+    return resultado
+
+
+def similitud_directa(objetivo, otro):
+    comunes = sorted(objetivo.keys() & otro.keys())
+    if sum(otro[p][1] for p in comunes) < MIN_RESPUESTAS or len(comunes) < MIN_PREGUNTAS_COMUNES:
+        return 0.0
+    x = np.array([objetivo[p] for p in comunes])
+    y = np.array([otro[p][0] for p in comunes])
+    if np.std(x) == 0 or np.std(y) == 0:
+        return 0.0
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def motor(historial, modo, cambios=None):
+    base = BaseRespuestas(MatrizRespuestas.desde_respuestas(*historial))
+    return MotorSimilitudUsuarios(EstadisticasFijas(base, cambios), modo=modo)
+
+
+@pytest.mark.parametrize('semilla', range(4))
+def test_modo_exacto_coincide_con_pearson_usuario_a_usuario(semilla):
+    historial = historial_aleatorio(semilla)
+    todos = perfiles(*historial)
+    motor_exacto = motor(historial, MODO_EXACTO)
+    for usuario_id in list(todos)[:10]:
+        objetivo = {p: valor for p, (valor, _) in todos[usuario_id].items()}
+        usuarios, correlacion = motor_exacto.similitudes(usuario_id, objetivo)
+        calculadas = dict(zip(usuarios.tolist(), correlacion.tolist()))
+        for otro_id, otro in todos.items():
+            esperada = 0.0 if otro_id == usuario_id else similitud_directa(objetivo, otro)
+            assert calculadas[otro_id] == pytest.approx(esperada)
+
+
+@pytest.mark.parametrize('semilla', range(4))
+def test_modo_aproximado_puntua_de_forma_exacta_a_sus_candidatos(semilla):
+    historial = historial_aleatorio(semilla)
+    todos = perfiles(*historial)
+    motor_aproximado = motor(historial, MODO_APROXIMADO)
+    motor_aproximado.preparar()
+    for usuario_id in list(todos)[:10]:
+        objetivo = {p: valor for p, (valor, _) in todos[usuario_id].items()}
+        usuarios, correlacion = motor_aproximado.similitudes(usuario_id, objetivo)
+        assert usuario_id in usuarios.tolist()
+        for otro_id, similitud in zip(usuarios.tolist(), correlacion.tolist()):
+            esperada = 0.0 if otro_id == usuario_id else similitud_directa(objetivo, todos[otro_id])
+            assert similitud == pytest.approx(esperada)
+
+
+def test_usuarios_modificados_sustituyen_a_la_base():
+    historial = historial_aleatorio(9)
+    todos = perfiles(*historial)
+    usuario_id, modificado, nuevo = 1, 2, 999
+    objetivo = {p: valor for p, (valor, _) in todos[usuario_id].items()}
+    # El modificado contesta lo mismo que el objetivo y el nuevo lo contrario, con intentos de sobra
+    cambios = {
+        modificado: {p: (valor, 2) for p, valor in objetivo.items()},
+        nuevo: {p: (1 - valor, 2) for p, valor in objetivo.items()}
+    }
+    usuarios, correlacion = motor(historial, MODO_EXACTO, cambios).similitudes(usuario_id, objetivo)
+    calculadas = dict(zip(usuarios.tolist(), correlacion.tolist()))
+    assert usuarios.tolist().count(modificado) == 1
+    assert calculadas[modificado] == pytest.approx(pearson_respuestas(objetivo, objetivo))
+    assert calculadas[nuevo] == pytest.approx(-calculadas[modificado])
+
+
+def test_usuarios_similares_ordena_de_mayor_a_menor():
+    historial = historial_aleatorio(11)
+    todos = perfiles(*historial)
+    objetivo = {p: valor for p, (valor, _) in todos[3].items()}
+    similares = motor(historial, MODO_EXACTO).usuarios_similares(3, objetivo, limite=5)
+    similitudes = [similitud for _, similitud in similares]
+    assert similitudes == sorted(similitudes, reverse=True)
+    assert all(similitud > 0 for similitud in similitudes) and 3 not in [u for u, _ in similares]
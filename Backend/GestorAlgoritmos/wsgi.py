@@ -0,0 +1,5 @@
+from app import app
+from Precalentamiento import precalentar
+
+# Con preload_app el módulo se importa en el proceso maestro: lo que se cargue aquí lo heredan todos los workers
+precalentar()
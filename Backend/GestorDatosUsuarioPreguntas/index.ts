@@ -31,6 +31,32 @@ app.use((req: Request, _res: Response, next: NextFunction) => {
     next();
 });
 
+const GESTOR_ALGORITMOS_URL = process.env.GESTOR_ALGORITMOS_URL || 'http://localhost:3014';
+const GESTOR_ALGORITMOS_TIMEOUT_MS = Number(process.env.GESTOR_ALGORITMOS_TIMEOUT_MS) || 2000;
+
+interface RespuestaRegistrada {
+    idRespuesta: number;
+    usuarioId: number;
+    idPregunta: number;
+    acertada: boolean;
+}
+
+// Envía a GestorAlgoritmos las respuestas recién insertadas para que actualice sus estadísticas en memoria.
+// Es solo un aviso: si no llega (o tarda más del timeout), GestorAlgoritmos las recupera en su sincronización
+// periódica por idRespuesta, así que no se espera a que termine para responder al usuario.
+const registrarRespuestasAlgoritmos = async (respuestas: RespuestaRegistrada[]) => {
+    try {
+        await fetch(`${GESTOR_ALGORITMOS_URL}/respuestas/lote`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ respuestas }),
+            signal: AbortSignal.timeout(GESTOR_ALGORITMOS_TIMEOUT_MS)
+        });
+    } catch (error) {
+        console.error('No se pudieron registrar las respuestas en GestorAlgoritmos:', error);
+    }
+};
+
 interface PreguntaResultado {
     id: number;
     acertada: boolean;
@@ -114,16 +140,25 @@ const actualizarDatosUsuarioHandler: express.RequestHandler = async (req, res) =
             [nuevasPreguntasAcertadas, nuevasPreguntasFalladas, nuevasTotalContestadas, nuevaRacha, fechaActual, usuarioId]
         );
 
+        const respuestasRegistradas: RespuestaRegistrada[] = [];
         for (const preguntaResultado of preguntasResultados) {
-            await connection.execute(
+            const [resultadoInsert]: any = await connection.execute(
                 'INSERT INTO Usuarios_has_Preguntas (Usuarios_idUsuario, Preguntas_idPregunta, fechaDeContestacion, respuestaCorrecta) VALUES (?, ?, ?, ?)',
                 [usuarioId, preguntaResultado.id, fechaActual, preguntaResultado.acertada ? 1 : 0]
             );
+            respuestasRegistradas.push({
+                idRespuesta: resultadoInsert.insertId,
+                usuarioId: Number(usuarioId),
+                idPregunta: Number(preguntaResultado.id),
+                acertada: Boolean(preguntaResultado.acertada)
+            });
         }
 
         await connection.commit();
         connection.release();
 
+        void registrarRespuestasAlgoritmos(respuestasRegistradas);
+
         const [usuarioActualizado]: any = await pool.execute(
             'SELECT * FROM Usuarios WHERE idUsuario = ?',
             [usuarioId]
@@ -122,6 +122,296 @@ CREATE TABLE IF NOT EXISTS `mydb`.`Usuarios_has_Preguntas` (
     ON UPDATE NO ACTION)
 ENGINE = InnoDB;
 
+
+-- -----------------------------------------------------
+-- Table `mydb`.`SimilitudPreguntas`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`SimilitudPreguntas` (
+  `idPregunta` INT NOT NULL,
+  `idVecino` INT NOT NULL,
+  `similitud` FLOAT NOT NULL,
+  `fechaCalculo` DATETIME NOT NULL,
+  PRIMARY KEY (`idPregunta`, `idVecino`))
+ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Table `mydb`.`ResumenUsuarioPregunta`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`ResumenUsuarioPregunta` (
+  `Usuarios_idUsuario` INT NOT NULL,
+  `Preguntas_idPregunta` INT NOT NULL,
+  `intentos` INT NOT NULL DEFAULT 0,
+  `aciertos` INT NOT NULL DEFAULT 0,
+  `fallos` INT NOT NULL DEFAULT 0,
+  `primeraFecha` DATE NULL DEFAULT NULL,
+  `ultimaFecha` DATE NULL DEFAULT NULL,
+  `ultimaRespuesta` TINYINT NOT NULL DEFAULT 0,
+  `ultimoIdRespuesta` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`Usuarios_idUsuario`, `Preguntas_idPregunta`),
+  INDEX `idx_resumen_pregunta` (`Preguntas_idPregunta` ASC) VISIBLE)
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `mydb`.`ResumenUsuarioCategoria`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`ResumenUsuarioCategoria` (
+  `Usuarios_idUsuario` INT NOT NULL,
+  `Categorias_idCategorias` INT NOT NULL,
+  `intentos` INT NOT NULL DEFAULT 0,
+  `aciertos` INT NOT NULL DEFAULT 0,
+  `fallos` INT NOT NULL DEFAULT 0,
+  `ultimaFecha` DATE NULL DEFAULT NULL,
+  PRIMARY KEY (`Usuarios_idUsuario`, `Categorias_idCategorias`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `mydb`.`ResumenUsuarioDia`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`ResumenUsuarioDia` (
+  `Usuarios_idUsuario` INT NOT NULL,
+  `fecha` DATE NOT NULL,
+  `intentos` INT NOT NULL DEFAULT 0,
+  `aciertos` INT NOT NULL DEFAULT 0,
+  `fallos` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`Usuarios_idUsuario`, `fecha`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `mydb`.`Usuarios_has_PreguntasArchivo`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`Usuarios_has_PreguntasArchivo` (
+  `Usuarios_idUsuario` INT NOT NULL,
+  `Preguntas_idPregunta` INT NOT NULL,
+  `idRespuesta` INT NOT NULL,
+  `fechaDeContestacion` DATE NULL DEFAULT NULL,
+  `respuestaCorrecta` TINYINT NULL DEFAULT NULL,
+  PRIMARY KEY (`idRespuesta`),
+  INDEX `idx_archivo_usuario_pregunta` (`Usuarios_idUsuario` ASC, `Preguntas_idPregunta` ASC) VISIBLE)
+ENGINE = InnoDB
+ROW_FORMAT = COMPRESSED;
+
+
+-- -----------------------------------------------------
+-- Table `mydb`.`CompactacionRespuestas`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`CompactacionRespuestas` (
+  `idLote` INT NOT NULL AUTO_INCREMENT,
+  `fecha` DATETIME NOT NULL,
+  `limiteFecha` DATE NOT NULL,
+  `filas` INT NOT NULL,
+  `maxIdRespuesta` INT NOT NULL,
+  PRIMARY KEY (`idLote`))
+ENGINE = InnoDB;
+
+-- -----------------------------------------------------
+-- Table `mydb`.`PreguntasServidas`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `mydb`.`PreguntasServidas` (
+  `Usuarios_idUsuario` INT NOT NULL,
+  `Preguntas_idPregunta` INT NOT NULL,
+  `ultimaVez` DATETIME NOT NULL,
+  PRIMARY KEY (`Usuarios_idUsuario`, `Preguntas_idPregunta`))
+ENGINE = InnoDB;
+
+-- Mantienen los resúmenes al insertar, actualizar o borrar respuestas, usuarios y preguntas.
+DELIMITER $$
+DROP TRIGGER IF EXISTS `mydb`.`ResumenUsuario_insertar`$$
+CREATE TRIGGER `mydb`.`ResumenUsuario_insertar` AFTER INSERT ON `mydb`.`Usuarios_has_Preguntas`
+FOR EACH ROW
+BEGIN
+    INSERT INTO ResumenUsuarioPregunta (Usuarios_idUsuario, Preguntas_idPregunta, intentos, aciertos, fallos,
+                                        primeraFecha, ultimaFecha, ultimaRespuesta, ultimoIdRespuesta)
+    VALUES (NEW.Usuarios_idUsuario, NEW.Preguntas_idPregunta, 1,
+            IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0),
+            NEW.fechaDeContestacion, NEW.fechaDeContestacion, COALESCE(NEW.respuestaCorrecta, 0), NEW.idRespuesta)
+    ON DUPLICATE KEY UPDATE
+        intentos = intentos + 1,
+        aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+        fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0),
+        primeraFecha = LEAST(COALESCE(primeraFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, primeraFecha)),
+        ultimaFecha = GREATEST(COALESCE(ultimaFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, ultimaFecha)),
+        -- Las asignaciones se aplican en orden: ultimaRespuesta aún ve el ultimoIdRespuesta anterior
+        ultimaRespuesta = IF(NEW.idRespuesta > ultimoIdRespuesta, COALESCE(NEW.respuestaCorrecta, 0), ultimaRespuesta),
+        ultimoIdRespuesta = GREATEST(ultimoIdRespuesta, NEW.idRespuesta);
+
+    INSERT INTO ResumenUsuarioCategoria (Usuarios_idUsuario, Categorias_idCategorias, intentos, aciertos, fallos, ultimaFecha)
+    SELECT NEW.Usuarios_idUsuario, p.Categorias_idCategorias, 1,
+           IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0), NEW.fechaDeContestacion
+    FROM Preguntas p
+    WHERE p.idPregunta = NEW.Preguntas_idPregunta
+    ON DUPLICATE KEY UPDATE
+        intentos = intentos + 1,
+        aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+        fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0),
+        ultimaFecha = GREATEST(COALESCE(ultimaFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, ultimaFecha));
+
+    IF NEW.fechaDeContestacion IS NOT NULL THEN
+        INSERT INTO ResumenUsuarioDia (Usuarios_idUsuario, fecha, intentos, aciertos, fallos)
+        VALUES (NEW.Usuarios_idUsuario, NEW.fechaDeContestacion, 1,
+                IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0))
+        ON DUPLICATE KEY UPDATE
+            intentos = intentos + 1,
+            aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+            fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0);
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS `mydb`.`ResumenUsuario_actualizar`$$
+CREATE TRIGGER `mydb`.`ResumenUsuario_actualizar` AFTER UPDATE ON `mydb`.`Usuarios_has_Preguntas`
+FOR EACH ROW
+BEGIN
+    UPDATE ResumenUsuarioPregunta
+    SET aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0) - IF(OLD.respuestaCorrecta = 1, 1, 0),
+        fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0) - IF(OLD.respuestaCorrecta = 0, 1, 0),
+        primeraFecha = LEAST(COALESCE(primeraFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, primeraFecha)),
+        ultimaFecha = (SELECT MAX(uhp.fechaDeContestacion) FROM Usuarios_has_Preguntas uhp
+                       WHERE uhp.Usuarios_idUsuario = NEW.Usuarios_idUsuario
+                       AND uhp.Preguntas_idPregunta = NEW.Preguntas_idPregunta),
+        ultimaRespuesta = IF(NEW.idRespuesta = ultimoIdRespuesta, COALESCE(NEW.respuestaCorrecta, 0), ultimaRespuesta)
+    WHERE Usuarios_idUsuario = NEW.Usuarios_idUsuario AND Preguntas_idPregunta = NEW.Preguntas_idPregunta;
+
+    UPDATE ResumenUsuarioCategoria rc
+    INNER JOIN Preguntas p ON p.Categorias_idCategorias = rc.Categorias_idCategorias
+    SET rc.aciertos = rc.aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0) - IF(OLD.respuestaCorrecta = 1, 1, 0),
+        rc.fallos = rc.fallos + IF(NEW.respuestaCorrecta = 0, 1, 0) - IF(OLD.respuestaCorrecta = 0, 1, 0),
+        rc.ultimaFecha = GREATEST(COALESCE(rc.ultimaFecha, NEW.fechaDeContestacion), COALESCE(NEW.fechaDeContestacion, rc.ultimaFecha))
+    WHERE rc.Usuarios_idUsuario = NEW.Usuarios_idUsuario AND p.idPregunta = NEW.Preguntas_idPregunta;
+
+    IF NOT (OLD.fechaDeContestacion <=> NEW.fechaDeContestacion) OR NOT (OLD.respuestaCorrecta <=> NEW.respuestaCorrecta) THEN
+        UPDATE ResumenUsuarioDia
+        SET intentos = intentos - 1,
+            aciertos = aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+            fallos = fallos - IF(OLD.respuestaCorrecta = 0, 1, 0)
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion;
+        DELETE FROM ResumenUsuarioDia
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion AND intentos <= 0;
+        IF NEW.fechaDeContestacion IS NOT NULL THEN
+            INSERT INTO ResumenUsuarioDia (Usuarios_idUsuario, fecha, intentos, aciertos, fallos)
+            VALUES (NEW.Usuarios_idUsuario, NEW.fechaDeContestacion, 1,
+                    IF(NEW.respuestaCorrecta = 1, 1, 0), IF(NEW.respuestaCorrecta = 0, 1, 0))
+            ON DUPLICATE KEY UPDATE
+                intentos = intentos + 1,
+                aciertos = aciertos + IF(NEW.respuestaCorrecta = 1, 1, 0),
+                fallos = fallos + IF(NEW.respuestaCorrecta = 0, 1, 0);
+        END IF;
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS `mydb`.`ResumenUsuario_eliminar`$$
+CREATE TRIGGER `mydb`.`ResumenUsuario_eliminar` AFTER DELETE ON `mydb`.`Usuarios_has_Preguntas`
+FOR EACH ROW
+BEGIN
+    IF COALESCE(@archivando_respuestas, 0) = 0 THEN
+        UPDATE ResumenUsuarioPregunta
+        SET intentos = intentos - 1,
+            aciertos = aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+            fallos = fallos - IF(OLD.respuestaCorrecta = 0, 1, 0),
+            ultimaFecha = COALESCE(
+                (SELECT MAX(uhp.fechaDeContestacion) FROM Usuarios_has_Preguntas uhp
+                 WHERE uhp.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                 AND uhp.Preguntas_idPregunta = OLD.Preguntas_idPregunta),
+                (SELECT MAX(a.fechaDeContestacion) FROM Usuarios_has_PreguntasArchivo a
+                 WHERE a.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                 AND a.Preguntas_idPregunta = OLD.Preguntas_idPregunta)),
+            ultimaRespuesta = IF(OLD.idRespuesta = ultimoIdRespuesta, COALESCE(
+                (SELECT COALESCE(uhp.respuestaCorrecta, 0) FROM Usuarios_has_Preguntas uhp
+                 WHERE uhp.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                 AND uhp.Preguntas_idPregunta = OLD.Preguntas_idPregunta
+                 ORDER BY uhp.idRespuesta DESC LIMIT 1), ultimaRespuesta), ultimaRespuesta),
+            ultimoIdRespuesta = IF(OLD.idRespuesta = ultimoIdRespuesta, COALESCE(
+                (SELECT MAX(uhp.idRespuesta) FROM Usuarios_has_Preguntas uhp
+                 WHERE uhp.Usuarios_idUsuario = OLD.Usuarios_idUsuario
+                 AND uhp.Preguntas_idPregunta = OLD.Preguntas_idPregunta), ultimoIdRespuesta), ultimoIdRespuesta)
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND Preguntas_idPregunta = OLD.Preguntas_idPregunta;
+        DELETE FROM ResumenUsuarioPregunta
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND Preguntas_idPregunta = OLD.Preguntas_idPregunta AND intentos <= 0;
+
+        UPDATE ResumenUsuarioCategoria rc
+        INNER JOIN Preguntas p ON p.Categorias_idCategorias = rc.Categorias_idCategorias
+        SET rc.intentos = rc.intentos - 1,
+            rc.aciertos = rc.aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+            rc.fallos = rc.fallos - IF(OLD.respuestaCorrecta = 0, 1, 0)
+        WHERE rc.Usuarios_idUsuario = OLD.Usuarios_idUsuario AND p.idPregunta = OLD.Preguntas_idPregunta;
+        DELETE FROM ResumenUsuarioCategoria
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND intentos <= 0;
+
+        UPDATE ResumenUsuarioDia
+        SET intentos = intentos - 1,
+            aciertos = aciertos - IF(OLD.respuestaCorrecta = 1, 1, 0),
+            fallos = fallos - IF(OLD.respuestaCorrecta = 0, 1, 0)
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion;
+        DELETE FROM ResumenUsuarioDia
+        WHERE Usuarios_idUsuario = OLD.Usuarios_idUsuario AND fecha = OLD.fechaDeContestacion AND intentos <= 0;
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS `mydb`.`ResumenUsuario_eliminar_usuario`$$
+CREATE TRIGGER `mydb`.`ResumenUsuario_eliminar_usuario` AFTER DELETE ON `mydb`.`Usuarios`
+FOR EACH ROW
+BEGIN
+    DECLARE purgadas INT DEFAULT 0;
+    DELETE FROM Usuarios_has_PreguntasArchivo WHERE Usuarios_idUsuario = OLD.idUsuario;
+    SET purgadas = ROW_COUNT();
+    IF purgadas > 0 THEN
+        INSERT INTO CompactacionRespuestas (fecha, limiteFecha, filas, maxIdRespuesta)
+        VALUES (NOW(), CURDATE(), -purgadas, 0);
+    END IF;
+    DELETE FROM ResumenUsuarioPregunta WHERE Usuarios_idUsuario = OLD.idUsuario;
+    DELETE FROM ResumenUsuarioCategoria WHERE Usuarios_idUsuario = OLD.idUsuario;
+    DELETE FROM ResumenUsuarioDia WHERE Usuarios_idUsuario = OLD.idUsuario;
+END$$
+
+DROP TRIGGER IF EXISTS `mydb`.`ResumenUsuario_eliminar_pregunta`$$
+CREATE TRIGGER `mydb`.`ResumenUsuario_eliminar_pregunta` AFTER DELETE ON `mydb`.`Preguntas`
+FOR EACH ROW
+BEGIN
+    DECLARE purgadas INT DEFAULT 0;
+    UPDATE ResumenUsuarioCategoria rc
+    INNER JOIN (
+        SELECT Usuarios_idUsuario, COUNT(*) AS intentos,
+               SUM(IF(respuestaCorrecta = 1, 1, 0)) AS aciertos, SUM(IF(respuestaCorrecta = 0, 1, 0)) AS fallos
+        FROM Usuarios_has_PreguntasArchivo
+        WHERE Preguntas_idPregunta = OLD.idPregunta
+        GROUP BY Usuarios_idUsuario
+    ) a ON a.Usuarios_idUsuario = rc.Usuarios_idUsuario
+    SET rc.intentos = rc.intentos - a.intentos,
+        rc.aciertos = rc.aciertos - a.aciertos,
+        rc.fallos = rc.fallos - a.fallos
+    WHERE rc.Categorias_idCategorias = OLD.Categorias_idCategorias;
+    DELETE FROM ResumenUsuarioCategoria
+    WHERE Categorias_idCategorias = OLD.Categorias_idCategorias AND intentos <= 0
+    AND Usuarios_idUsuario IN (SELECT Usuarios_idUsuario FROM Usuarios_has_PreguntasArchivo
+                               WHERE Preguntas_idPregunta = OLD.idPregunta);
+
+    UPDATE ResumenUsuarioDia d
+    INNER JOIN (
+        SELECT Usuarios_idUsuario, fechaDeContestacion, COUNT(*) AS intentos,
+               SUM(IF(respuestaCorrecta = 1, 1, 0)) AS aciertos, SUM(IF(respuestaCorrecta = 0, 1, 0)) AS fallos
+        FROM Usuarios_has_PreguntasArchivo
+        WHERE Preguntas_idPregunta = OLD.idPregunta AND fechaDeContestacion IS NOT NULL
+        GROUP BY Usuarios_idUsuario, fechaDeContestacion
+    ) a ON a.Usuarios_idUsuario = d.Usuarios_idUsuario AND a.fechaDeContestacion = d.fecha
+    SET d.intentos = d.intentos - a.intentos,
+        d.aciertos = d.aciertos - a.aciertos,
+        d.fallos = d.fallos - a.fallos;
+    DELETE FROM ResumenUsuarioDia
+    WHERE intentos <= 0
+    AND Usuarios_idUsuario IN (SELECT Usuarios_idUsuario FROM Usuarios_has_PreguntasArchivo
+                               WHERE Preguntas_idPregunta = OLD.idPregunta);
+
+    DELETE FROM Usuarios_has_PreguntasArchivo WHERE Preguntas_idPregunta = OLD.idPregunta;
+    SET purgadas = ROW_COUNT();
+    IF purgadas > 0 THEN
+        INSERT INTO CompactacionRespuestas (fecha, limiteFecha, filas, maxIdRespuesta)
+        VALUES (NOW(), CURDATE(), -purgadas, 0);
+    END IF;
+    DELETE FROM ResumenUsuarioPregunta WHERE Preguntas_idPregunta = OLD.idPregunta;
+END$$
+DELIMITER ;
+
 -- Inserta criterios.
 INSERT INTO `mydb`.`CriterioAlgoritmo` (`idCriterioAlgoritmo`, `textoCriterio`, `tituloCriterio`)
 VALUES (1, 'Elige aleatoriamente las preguntas sin tomar en cuenta datos de otros usuarios o datos personales.', 'Aleatorio simple')
@@ -167,6 +457,10 @@ INSERT INTO `mydb`.`CriterioAlgoritmo` (`idCriterioAlgoritmo`, `textoCriterio`,
 VALUES (11, 'Te recomienda preguntas basandose en la similitud entre preguntas que otros usuarios han acertado juntas.', 'Algoritmo basado en items - Preguntas similares que aciertan')
 ON DUPLICATE KEY UPDATE textoCriterio=VALUES(textoCriterio);
 
+INSERT INTO `mydb`.`CriterioAlgoritmo` (`idCriterioAlgoritmo`, `textoCriterio`, `tituloCriterio`)
+VALUES (12, 'Te pone las preguntas que te toca repasar segun la repeticion espaciada: las que fallas vuelven al dia siguiente y las que aciertas cada vez mas espaciadas.', 'Repaso espaciado')
+ON DUPLICATE KEY UPDATE textoCriterio=VALUES(textoCriterio);
+
 SET SQL_MODE=@OLD_SQL_MODE;
 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;
@@ -141,7 +141,7 @@ const Home: React.FC = () => {
     if (algoritmo.idCriterioAlgoritmo === 1) {
 
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+        const response = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -173,7 +173,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 2) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/preguntas-no-hechas', {
+        const response = await fetch('http://localhost:3014/algoritmos/preguntas-no-hechas?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -210,7 +210,7 @@ const Home: React.FC = () => {
       setIsCategoriaDropdownOpen(true);
     } else if (algoritmo.idCriterioAlgoritmo === 4) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/categoria-peor', {
+        const response = await fetch('http://localhost:3014/algoritmos/categoria-peor?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -233,7 +233,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('CategoriaPeor no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -275,7 +275,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 5) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/categoria-mejor', {
+        const response = await fetch('http://localhost:3014/algoritmos/categoria-mejor?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -298,7 +298,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('CategoriaMejor no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -340,7 +340,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 6) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/preguntas-mas-falladas-pasado', {
+        const response = await fetch('http://localhost:3014/algoritmos/preguntas-mas-falladas-pasado?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -363,7 +363,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('PreguntasMasFalladasPasado no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -405,7 +405,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 7) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/preguntas-mas-acertadas-pasado', {
+        const response = await fetch('http://localhost:3014/algoritmos/preguntas-mas-acertadas-pasado?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -428,7 +428,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('PreguntasMasAcertadasPasado no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -470,7 +470,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 8) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/usuario-positivo', {
+        const response = await fetch('http://localhost:3014/algoritmos/usuario-positivo?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -493,7 +493,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('AlgoritmoUsuarioPositivo no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -535,7 +535,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 9) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/usuario-negativo', {
+        const response = await fetch('http://localhost:3014/algoritmos/usuario-negativo?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -558,7 +558,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('AlgoritmoUsuarioNegativo no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -600,7 +600,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 10) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/item-positivo', {
+        const response = await fetch('http://localhost:3014/algoritmos/item-positivo?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -623,7 +623,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('AlgoritmoItemPositivo no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -665,7 +665,7 @@ const Home: React.FC = () => {
       }
     } else if (algoritmo.idCriterioAlgoritmo === 11) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/item-negativo', {
+        const response = await fetch('http://localhost:3014/algoritmos/item-negativo?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
@@ -688,7 +688,7 @@ const Home: React.FC = () => {
           } else {
             console.warn('AlgoritmoItemNegativo no devolvió preguntas, usando AleatorioSimple como fallback:', data);
             try {
-              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple', {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
                 method: 'POST',
                 headers: {
                   'Content-Type': 'application/json',
@@ -728,6 +728,71 @@ const Home: React.FC = () => {
         console.error('Error de conexión:', error);
         alert('Error de conexión. Verifica que el servicio esté disponible.');
       }
+    } else if (algoritmo.idCriterioAlgoritmo === 12) {
+      try {
+        const response = await fetch('http://localhost:3014/algoritmos/repaso-espaciado?audio=1', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({
+            usuario_id: usuario.id
+          })
+        });
+        
+        if (response.ok) {
+          const data = await response.json();
+          if (data.success && data.resultado && data.resultado.preguntas && data.resultado.preguntas.length > 0) {
+            navigate('/responder-pregunta', { 
+              state: { 
+                usuario, 
+                algoritmoSeleccionado: algoritmo,
+                preguntas: data.resultado.preguntas
+              } 
+            });
+          } else {
+            console.warn('RepasoEspaciado no devolvió preguntas, usando AleatorioSimple como fallback:', data);
+            try {
+              const fallbackResponse = await fetch('http://localhost:3014/algoritmos/aleatorio-simple?audio=1', {
+                method: 'POST',
+                headers: {
+                  'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({})
+              });
+              
+              if (fallbackResponse.ok) {
+                const fallbackData = await fallbackResponse.json();
+                if (fallbackData.success && fallbackData.resultado.preguntas) {
+                  navigate('/responder-pregunta', { 
+                    state: { 
+                      usuario, 
+                      algoritmoSeleccionado: algoritmo,
+                      preguntas: fallbackData.resultado.preguntas,
+                      esFallback: true
+                    } 
+                  });
+                } else {
+                  console.error('Error en la respuesta del algoritmo de fallback:', fallbackData);
+                  alert('No se pudieron generar preguntas. Inténtalo de nuevo.');
+                }
+              } else {
+                console.error('Error al llamar al algoritmo de fallback:', fallbackResponse.statusText);
+                alert('Error de conexión con el servicio de algoritmos.');
+              }
+            } catch (fallbackError) {
+              console.error('Error de conexión con algoritmo de fallback:', fallbackError);
+              alert('Error de conexión. Verifica que el servicio esté disponible.');
+            }
+          }
+        } else {
+          console.error('Error al llamar al algoritmo repaso espaciado:', response.statusText);
+          alert('Error de conexión con el servicio de algoritmos.');
+        }
+      } catch (error) {
+        console.error('Error de conexión:', error);
+        alert('Error de conexión. Verifica que el servicio esté disponible.');
+      }
     } else {
       navigate('/responder-pregunta', { state: { usuario, algoritmoSeleccionado: algoritmo } });
     }
@@ -743,7 +808,7 @@ const Home: React.FC = () => {
     
     if (mostrarCategoriaParaAlgoritmo3 && algoritmoSeleccionado) {
       try {
-        const response = await fetch('http://localhost:3014/algoritmos/categoria-concreta', {
+        const response = await fetch('http://localhost:3014/algoritmos/categoria-concreta?audio=1', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
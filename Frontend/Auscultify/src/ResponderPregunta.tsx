@@ -5,14 +5,27 @@ import copaTrofeoIcon from './assets/copaTrofeoIcon.png';
 import altavozSinReproducir from './assets/AltavozSinReproducir.png';
 import altavozReproduciendo from './assets/AltavozReproduciendo.png';
 
+interface AudioPregunta {
+  url: string;
+  bytes: number;
+  duracion: number | null;
+  hash: string;
+  tipo: string;
+}
+
 interface Pregunta {
   idPregunta: number;
   urlAudio: string;
   respuestaCorrecta: string;
   respuestasIncorrectas: string[];
   Categorias_idCategorias: number;
+  audio?: AudioPregunta | null;
 }
 
+// URL versionada por contenido si GestorAlgoritmos la ha incluido (?audio=1); si no, la ruta sin versión
+const urlDeAudio = (pregunta: Pregunta) =>
+  pregunta.audio?.url ?? `http://localhost:3012/audio/${pregunta.urlAudio}`;
+
 interface LocationState {
   usuario: {
     id: string;
@@ -117,6 +130,20 @@ const ResponderPregunta: React.FC = () => {
     }
   }, [numeroPregunta, preguntas, cargarPregunta]);
 
+  useEffect(() => {
+    // Descarga en paralelo todos los audios versionados del quiz; se guardan en la caché del navegador
+    // (immutable) y cada pregunta se reproduce sin esperar a la red. El reproductor usa crossOrigin para
+    // que su petición coincida con esta en la caché
+    if (!preguntas) return;
+    const controlador = new AbortController();
+    preguntas
+      .filter(pregunta => pregunta.audio)
+      .forEach(pregunta => {
+        fetch(urlDeAudio(pregunta), { signal: controlador.signal }).catch(() => undefined);
+      });
+    return () => controlador.abort();
+  }, [preguntas]);
+
   useEffect(() => {
     const progresoObjetivo = (numeroPregunta / 10) * 100;
     
@@ -163,7 +190,10 @@ const ResponderPregunta: React.FC = () => {
       }
 
       audioRef.current = new Audio();
-      audioRef.current.src = `http://localhost:3012/audio/${preguntaActual.urlAudio}`;
+      // Petición CORS, igual que la precarga con fetch(): el servidor responde con Vary: Origin y una
+      // petición sin Origin no aprovecharía la copia ya descargada
+      audioRef.current.crossOrigin = 'anonymous';
+      audioRef.current.src = urlDeAudio(preguntaActual);
       audioRef.current.volume = 0.7;
 
 